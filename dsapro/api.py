@@ -0,0 +1,105 @@
+# api.py
+# Versioned JSON API (/api/v1) over the same structures as the HTML pages,
+# for integrations that would otherwise scrape them. Read-only: changes still
+# go through the pages and /import.
+# Every response carries an ETag made of the generation counters of the data
+# it reads (see data_structures/generations.py). A request whose
+# If-None-Match still matches gets 304 before anything is looked up, and
+# bodies are kept in an LRU cache under their tag, so a hot query such as one
+# doctor's patients is only rebuilt after that doctor's bucket changes.
+#
+#   curl -i localhost:5000/api/v1/doctors/Dr%20Smith/patients
+#   curl -i -H 'If-None-Match: "<etag>"' localhost:5000/api/v1/doctors/Dr%20Smith/patients
+import json
+from flask import Blueprint, Response, request, jsonify
+from data_structures.generations import doctor_bucket, queue_bucket
+from data_structures.queue import TRIAGE_LEVELS
+
+API_PREFIX = "/api/v1"
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+TRIAGE_NAMES = {v: k for k, v in TRIAGE_LEVELS.items()}
+_to_json = json.JSONEncoder(separators=(",", ":")).encode
+
+
+def appointment_dict(appt, position: int) -> dict:
+    return {"handle": appt.handle, "patient_id": appt.patient_id, "doctor": appt.doctor,
+            "triage": TRIAGE_NAMES.get(appt.priority, appt.priority), "position": position}
+
+
+def create_api(patients_ll, patient_tree, appointments_q, store_lock, queue_lock, generations, cache) -> Blueprint:
+    """The /api/v1 blueprint over the app's structures and locks."""
+    api = Blueprint("api", __name__, url_prefix=API_PREFIX)
+
+    def conditional(buckets, build):
+        # JSON response for build(), tagged with the generations of `buckets`.
+        # Call with the locks guarding those buckets held, so the tag is read
+        # before and with the data it names.
+        tag = generations.etag(buckets)
+        if request.if_none_match.contains_weak(tag):
+            resp = Response(status=304)
+        else:
+            key = (request.path, request.query_string)
+            body = cache.get(key, tag)
+            if body is None:
+                body = _to_json(build()).encode()
+                cache.put(key, tag, tuple(buckets), body)
+            resp = Response(body, mimetype="application/json")
+        resp.set_etag(tag)
+        resp.headers["Cache-Control"] = "no-cache"  # clients may keep it, but must revalidate
+        return resp
+
+    @api.route("/")
+    def status():
+        with store_lock.read(), queue_lock:
+            return jsonify(version=1, patients=len(patients_ll), appointments=len(appointments_q),
+                           cache={"entries": len(cache), "hits": cache.hits, "misses": cache.misses})
+
+    @api.route("/patients")
+    def patients():
+        # ?after=<patient_id>&limit=: cursor pages in roster order, like /patients
+        after = request.args.get("after", type=int)
+        limit = min(max(request.args.get("limit", PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+
+        def build():
+            page = patients_ll.page(after, limit)
+            return {"total": len(patients_ll), "patients": [p.to_dict() for p in page],
+                    "next": page[-1].patient_id if len(page) == limit else None}
+        with store_lock.read():
+            return conditional(("patients",), build)
+
+    @api.route("/patients/<int:pid>")
+    def patient(pid):
+        with store_lock.read():
+            p = patients_ll.find_by_id(pid)
+            if p is None:
+                return jsonify(error="patient not found"), 404
+            return conditional(("patients",), p.to_dict)
+
+    @api.route("/doctors")
+    def doctors():
+        with store_lock.read():
+            return conditional(("patients",), lambda: {"doctors": patient_tree.doctors()})
+
+    @api.route("/doctors/<path:doctor>/patients")
+    def doctor_patients(doctor):
+        # the doctor search of /search; cached until this doctor's patients change
+        def build():
+            found = patient_tree.search(doctor)
+            return {"doctor": doctor, "total": len(found), "patients": [p.to_dict() for p in found]}
+        with store_lock.read():
+            return conditional((doctor_bucket(doctor),), build)
+
+    @api.route("/appointments")
+    def appointments():
+        # ?doctor=: one doctor's queue; in service order either way
+        doctor = request.args.get("doctor", "").strip() or None
+
+        def build():
+            appts = appointments_q.appointments(doctor)
+            return {"doctor": doctor, "total": len(appts),
+                    "appointments": [appointment_dict(a, i) for i, a in enumerate(appts, 1)]}
+        with queue_lock:
+            return conditional((queue_bucket(doctor) if doctor else "appointments",), build)
+
+    return api
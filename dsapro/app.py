@@ -1,34 +1,117 @@
 # app.py
-from flask import Flask, render_template, request, redirect, url_for, flash, session
+from flask import (Flask, render_template, request, redirect, url_for, flash, session,
+                   Response, stream_template, stream_with_context, jsonify, abort)
 from main import (
-    Patient, LinkedList, AppointmentQueue, UndoStack, PatientTree,
+    Patient, LinkedList, AppointmentQueue, PatientTree,
     register_patient, view_patients, schedule_appointment, next_appointment,
-    search_by_doctor, delete_patient, update_patient, undo_action,
-    save_all, load_all, calculate_bill
+    search_by_doctor, delete_patient, update_patient, undo_action, redo_action, reassign_doctor,
+    save_all, load_all, load_sqlite, calculate_bill, TRIAGE_LEVELS, LEDGER_FILE
 )
+from patient import validate, parse_time
+from data_structures.stack import UndoHistories, UNDO_DEPTH, MAX_GROUP_ACTIONS, changed_fields
+from data_structures.search_index import SearchIndex, COUNT_CAP
+from data_structures.range_index import RangeIndex, RANGE_FIELDS
+from data_structures.generations import Generations, ResponseCache, CACHE_SIZE
+from data_structures.calendar import (Scheduler, SlotConflict, SLOT_MINUTES, MAX_LENGTH,
+                                      slot_of, next_slot, time_of)
+from sqlite_store import (SQLiteDB, SQLitePatientStore, SQLitePatientTree, SQLiteAppointmentQueue,
+                          SQLiteScheduler, SQLiteSearchIndex, SQLiteRangeIndex, SQLiteRosterColumns,
+                          SQLiteLedger, SQLiteGenerations)
+from billing import Ledger, SCOPES
+from concurrency import RWLock
+from api import create_api
+import bulk
+import reports
+import io
 import os
-from datetime import datetime
+import threading
+import time as timer
+from datetime import datetime, date, time, timedelta
 
 app = Flask(__name__)
 app.secret_key = "super-secret-key-CHANGE-ME"
 
-# --- Global in-memory data structures ---
-patients_ll = LinkedList()
-appointments_q = AppointmentQueue()
-undo_stack = UndoStack()
-patient_tree = PatientTree()
-
-# Load on startup
 DATA_DIR = "data"
 if not os.path.exists(DATA_DIR):
     os.makedirs(DATA_DIR) 
-load_all(patients_ll, patient_tree, appointments_q)
-
 
-# Helper to refresh session undo state
-def sync_undo_stack():
-    session['undo_stack'] = list(undo_stack.stack)
-  # simple list for session
+# "memory" (default): in-process structures + CSV snapshots and journal
+# "sqlite": same interfaces backed by data/patients.db
+STORAGE_BACKEND = os.environ.get("PMS_STORAGE", "memory")
+# "multiworker": several processes (e.g. gunicorn -w 4 app:app) share one
+# SQLite store; each keeps read caches invalidated by the others' commits
+DEPLOYMENT_MODE = os.environ.get("PMS_MODE", "single")
+if DEPLOYMENT_MODE == "multiworker":
+    STORAGE_BACKEND = "sqlite"
+
+# --- Global data structures ---
+# undo histories live here, one per browser session; the cookie only carries a token
+undo_histories = UndoHistories(depth=int(os.environ.get("PMS_UNDO_DEPTH", UNDO_DEPTH)))
+if STORAGE_BACKEND == "sqlite":
+    db = SQLiteDB(os.path.join(DATA_DIR, "patients.db"), cache=DEPLOYMENT_MODE == "multiworker")
+    patients_ll = SQLitePatientStore(db)
+    appointments_q = SQLiteAppointmentQueue(db)
+    patient_tree = SQLitePatientTree(db)
+    scheduler = SQLiteScheduler(db)
+    load_sqlite(patients_ll, patient_tree, appointments_q, scheduler)
+    search_index = SQLiteSearchIndex(db)
+    range_index = SQLiteRangeIndex(db)
+    roster_columns = SQLiteRosterColumns(db) if reports.available() else None
+    ledger = SQLiteLedger(db)
+    generations = SQLiteGenerations(db)
+else:
+    patients_ll = LinkedList()
+    appointments_q = AppointmentQueue()
+    patient_tree = PatientTree()
+    scheduler = Scheduler()
+    # Load on startup
+    load_all(patients_ll, patient_tree, appointments_q, scheduler)
+    search_index = SearchIndex()
+    range_index = RangeIndex()
+    roster_columns = reports.RosterColumns() if reports.available() else None
+    ledger = Ledger(LEDGER_FILE)
+    ledger.load()
+    generations = Generations()
+# name/disease word index and age/registration-time indexes, kept current as patients change
+search_index.attach(patients_ll, patient_tree)
+range_index.attach(patients_ll)
+if roster_columns is not None:  # NumPy column copy for /reports
+    roster_columns.attach(patients_ll)
+ledger.attach(appointments_q)  # every serve becomes an unbilled visit, billed from /next or /billing
+# change counters for the JSON API's ETags, and its response cache
+generations.attach(patients_ll, appointments_q)
+api_cache = ResponseCache(int(os.environ.get("PMS_API_CACHE", CACHE_SIZE)))
+api_cache.attach(generations)
+
+# Requests may run on several threads. store_lock guards patients_ll and
+# patient_tree (shared for reads, exclusive for writes); queue_lock guards
+# appointments_q and scheduler. When both are needed, take store_lock first.
+store_lock = RWLock()
+queue_lock = threading.Lock()
+if patients_ll.journal and hasattr(patients_ll.journal, 'auto_compact'):
+    patients_ll.journal.auto_compact = False  # compacted in compact_if_due, under both locks
+app.register_blueprint(create_api(patients_ll, patient_tree, appointments_q, store_lock, queue_lock,
+                                  generations, api_cache))
+
+
+def session_undo(create=True):
+    # this session's undo history, started on its first change
+    if 'undo_stack' in session:
+        del session['undo_stack']  # full copy of the stack written by older versions
+    stack = undo_histories.get(session.get('undo'))
+    if stack is None and create:
+        session['undo'], stack = undo_histories.create()
+    return stack
+
+
+@app.after_request
+def compact_if_due(response):
+    journal = patients_ll.journal
+    if getattr(journal, 'due', False):
+        with store_lock.write(), queue_lock:
+            if journal.due:
+                journal.compact()
+    return response
 
 
 @app.context_processor
@@ -48,36 +131,22 @@ def register():
     if request.method == 'POST':
         try:
             # Get and validate fields
-            # Get and validate fields
-            name = request.form.get('name', '').strip()
-            age_str = request.form.get('age', '').strip()
-            disease = request.form.get('disease', '').strip()
-            doctor = request.form.get('doctor', '').strip()
-
-
-            # Check for empty fields
-            if not name or not age_str or not disease or not doctor:
-                flash("All fields are required.", "danger")
-                return redirect(url_for('register'))
-
-            # Validate age conversion
             try:
-                age = int(age_str)
-                if age <= 0:
-                    raise ValueError
-            except ValueError:
-                flash("Age must be a positive number.", "danger")
+                name, age, disease, doctor = validate(*(request.form.get(f, '') for f in
+                                                        ('name', 'age', 'disease', 'doctor')))
+            except ValueError as e:
+                flash(str(e), "danger")
                 return redirect(url_for('register'))
 
             # Create new patient
-            pid = patients_ll.get_max_id() + 1
+            pid = patients_ll.allocate_id()
             p = Patient(patient_id=pid, name=name, age=age, disease=disease, doctor=doctor)
 
             # Add to structures
-            patients_ll.insert_end(p)
-            patient_tree.insert(doctor, p.to_dict())
-            undo_stack.push(("add", p.to_dict()))
-            sync_undo_stack()
+            with store_lock.write():
+                patients_ll.insert_end(p)
+                patient_tree.insert(doctor, p)
+            session_undo().push(("add", pid))
 
             flash(f"Patient registered with ID {pid}", "success")
             return redirect(url_for('view_patients_route'))
@@ -91,10 +160,85 @@ def register():
 
 
 
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+SORTABLE = ("patient_id", "name", "age", "disease", "doctor", "registered_at")
+
+
+def iter_patients(chunk=MAX_PAGE_SIZE):
+    # the roster a chunk at a time, each chunk under the read lock, so a long
+    # stream never holds more than one chunk; edits between chunks (even
+    # deleting the patient the last chunk ended on) do not cut it short
+    return patients_ll.walk(chunk, store_lock.read)
+
+
+def patient_picks(name=''):
+    # suggestions for a patient ID field, never the whole roster: the first
+    # PAGE_SIZE name matches, or the first page of the roster without a name
+    with store_lock.read():
+        if name.strip():
+            return search_index.search(name=name, limit=PAGE_SIZE)[0]
+        return patients_ll.page(None, PAGE_SIZE)
+
+
+def patient_filter(args):
+    # ?age_min=&age_max=&from=&to= -> (age range, registration range, the args to keep
+    # in links), inclusive with None for an open end; None when no filter is set
+    kept = {k: args[k].strip() for k in ('age_min', 'age_max', 'from', 'to') if args.get(k, '').strip()}
+    if not kept:
+        return None
+    age = tuple(int(kept[k]) if k in kept else None for k in ('age_min', 'age_max'))
+    start = parse_time(kept['from']) if 'from' in kept else None
+    end = parse_time(kept['to']) if 'to' in kept else None
+    if end is not None and 'T' not in kept['to'] and ' ' not in kept['to']:
+        end += timedelta(days=1, seconds=-1)  # a bare date includes the whole day
+    return age, (start, end), kept
+
+
 @app.route('/patients')
 def view_patients_route():
-    patient_list = patients_ll.to_list()
-    return render_template('view.html', patients=patient_list)
+    with store_lock.read():
+        total = len(patients_ll)
+    try:
+        flt = patient_filter(request.args)
+    except ValueError:
+        flash("Invalid filter: ages are whole numbers, dates look like YYYY-MM-DD.", "danger")
+        return redirect(url_for('view_patients_route'))
+
+    # ?stream=1: send the whole roster, rendering rows as they are produced
+    if request.args.get('stream') == '1':
+        return Response(stream_with_context(
+            stream_template('view.html', patients=iter_patients(), total=total, pager=None)))
+
+    limit = min(max(request.args.get('limit', PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    sort = request.args.get('sort')
+    if flt:
+        age, registered, kept = flt
+        order = 'desc' if request.args.get('order') == 'desc' else 'asc'
+        offset = max(request.args.get('offset', 0, type=int), 0)
+        with store_lock.read():
+            patients, matched = range_index.filter(age, registered, sort if sort in SORTABLE else None,
+                                                   order == 'desc', offset, limit)
+        pager = {'sort': sort if sort in SORTABLE else None, 'order': order, 'limit': limit, 'filter': kept,
+                 'prev': {'offset': max(offset - limit, 0), **kept} if offset else None,
+                 'next': {'offset': offset + limit, **kept} if offset + limit < matched else None}
+        return render_template('view.html', patients=patients, total=total, matched=matched, pager=pager)
+    if sort in SORTABLE:
+        order = 'desc' if request.args.get('order') == 'desc' else 'asc'
+        offset = max(request.args.get('offset', 0, type=int), 0)
+        index = range_index if sort in RANGE_FIELDS else patients_ll
+        with store_lock.read():
+            patients = index.sorted_page(sort, order == 'desc', offset, limit)
+        pager = {'sort': sort, 'order': order, 'limit': limit,
+                 'prev': {'offset': max(offset - limit, 0)} if offset else None,
+                 'next': {'offset': offset + limit} if offset + limit < total else None}
+    else:
+        with store_lock.read():
+            patients = patients_ll.page(request.args.get('after', type=int), limit)
+        pager = {'sort': None, 'order': 'asc', 'limit': limit,
+                 'prev': {} if request.args.get('after') else None,
+                 'next': {'after': patients[-1].patient_id} if len(patients) == limit else None}
+    return render_template('view.html', patients=patients, total=total, pager=pager)
 
 
 @app.route('/schedule', methods=['GET', 'POST'])
@@ -102,86 +246,237 @@ def schedule():
     if request.method == 'POST':
         try:
             pid = int(request.form['patient_id'])
-            patient = patients_ll.find_by_id(pid)
+            priority = TRIAGE_LEVELS.get(request.form.get('triage', 'routine'), 0)
+            with store_lock.read():
+                patient = patients_ll.find_by_id(pid)
+                if patient:
+                    with queue_lock:
+                        handle = appointments_q.enqueue(pid, priority, patient.doctor)
+                        place = appointments_q.position(handle, per_doctor=True)
             if not patient:
                 flash("Patient ID not found.", "danger")
             else:
-                appointments_q.enqueue(pid)
-                undo_stack.push(("appointment_add", pid))
-                sync_undo_stack()
-                flash(f"Appointment scheduled for {patient.name} (ID {pid})", "success")
+                session_undo().push(("appointment_add", pid, handle))
+                flash(f"Appointment scheduled for {patient.name} (ID {pid}), "
+                      f"#{place} in line for {patient.doctor}", "success")
                 return redirect(url_for('view_patients_route'))
         except:
             flash("Invalid patient ID.", "danger")
 
-    # Show only registered patients for dropdown
-    patient_list = patients_ll.to_list()
-    return render_template('schedule.html', patients=patient_list)
+    name = request.args.get('patient', '')
+    return render_template('schedule.html', patients=patient_picks(name), patient=name,
+                           triage_levels=TRIAGE_LEVELS)
+
+
+FEE_FIELDS = ('base', 'tests', 'meds')
 
 
 @app.route('/next', methods=['GET', 'POST'])
 def next_appt():
-    pid = appointments_q.peek()  # get first patient in queue (but don’t remove yet)
-    patient = patients_ll.find_by_id(pid) if pid else None
+    doctor = request.args.get('doctor', '').strip() or None  # serve one doctor's queue
+    with store_lock.read(), queue_lock:
+        appt = appointments_q.front(doctor)  # first appointment in queue (but don’t remove yet)
+        patient = patients_ll.find_by_id(appt.patient_id) if appt else None
     bill = None
+    fees = {}
 
     # --- Handle bill calculation ---
     if request.method == 'POST' and patient:
+        fees = {k: request.form.get(k, '').strip() or '0' for k in FEE_FIELDS}
         try:
-            base = float(request.form.get('base', 0))
-            tests = float(request.form.get('tests', 0))
-            meds = float(request.form.get('meds', 0))
-            bill = calculate_bill(base, tests, meds)
-        except Exception as e:
-            flash("Error calculating bill. Please check inputs.", "danger")
-            print("Billing error:", e)
-
-    # --- Serve & dequeue patient ---
-    if request.args.get('serve') == '1' and pid:
-        served_pid = appointments_q.dequeue()
-        served_patient = patients_ll.find_by_id(served_pid)
-        flash(f"Served: {served_patient.name} (ID {served_pid})", "success")
-        # reset bill after serving patient
-        bill = None
-        return redirect(url_for('next_appt'))
+            bill = calculate_bill(fees['base'], fees['tests'], fees['meds'])
+        except ValueError as e:
+            flash(f"Error calculating bill: {e}", "danger")
 
     # --- Handle case when queue is empty ---
     if not patient:
         flash("No pending appointments.", "info")
 
-    return render_template('next.html', patient=patient, bill=bill)
+    return render_template('next.html', patient=patient, appt=appt, bill=bill, doctor=doctor, fees=fees)
+
+
+@app.route('/next/serve', methods=['POST'])
+def serve_appt():
+    # serve the appointment shown on /next (by handle, not whoever is in front
+    # now) and invoice its visit; the total is priced here from the fees
+    doctor = request.form.get('doctor', '').strip() or None
+    handle = request.form.get('handle', type=int)
+    try:
+        fees = [request.form.get(k, '').strip() or 0 for k in FEE_FIELDS]
+        calculate_bill(*fees)
+    except ValueError as e:
+        flash(f"Not served: {e}", "danger")
+        return redirect(url_for('next_appt', doctor=doctor))
+    with store_lock.read(), queue_lock:
+        served_pid = appointments_q.serve(handle) if handle is not None else None
+        served_patient = patients_ll.find_by_id(served_pid) if served_pid else None
+    if served_pid is None:
+        flash("That appointment was already served or cancelled.", "warning")
+        return redirect(url_for('next_appt', doctor=doctor))
+    flash(f"Served: {served_patient.name if served_patient else 'unknown patient'} (ID {served_pid})", "success")
+    try:
+        inv = ledger.bill(served_pid, served_patient.doctor if served_patient else "", *fees, handle=handle)
+        flash(f"Invoice #{inv.invoice_id}: ${inv.amount()}", "success")
+    except ValueError as e:
+        flash(f"Visit left unbilled: {e}", "warning")
+    return redirect(url_for('next_appt', doctor=doctor))
+
+
+@app.route('/billing', methods=['GET', 'POST'])
+def billing():
+    # end-of-day billing of unbilled visits, recent invoices and running totals
+    today = date.today().isoformat()
+    if request.method == 'POST':
+        day = request.form.get('day', '').strip() or None
+        try:
+            issued = ledger.bill_pending(day, None, *(request.form.get(k, '').strip() or 0
+                                                      for k in ('base', 'tests', 'meds', 'other')))
+        except ValueError as e:
+            flash(f"Nothing billed: {e}", "danger")
+        else:
+            flash(f"Issued {len(issued)} invoices.", "success" if issued else "info")
+        return redirect(url_for('billing'))
+
+    patient_id = request.args.get('patient_id', type=int)
+    invoices = ledger.for_patient(patient_id) if patient_id else ledger.recent(50)
+    return render_template('billing.html', invoices=invoices, patient_id=patient_id, today=today,
+                           pending=len(ledger.pending()), today_total=ledger.total('day', today),
+                           patient_total=ledger.total('patient', patient_id) if patient_id else None,
+                           tops={scope: ledger.top(scope, 10) for scope in SCOPES})
+
+
+@app.route('/calendar', methods=['GET', 'POST'])
+def calendar():
+    doctor = request.values.get('doctor', '').strip()
+    try:
+        day = date.fromisoformat(request.values.get('date', ''))
+    except ValueError:
+        day = date.today()
+
+    if request.method == 'POST':
+        try:
+            pid = int(request.form['patient_id'])
+            length = min(max(int(request.form.get('minutes', SLOT_MINUTES)) // SLOT_MINUTES, 1), MAX_LENGTH)
+            at = request.form.get('time', '').strip()
+            with store_lock.read():
+                patient = patients_ll.find_by_id(pid)
+            if not patient:
+                flash("Patient ID not found.", "danger")
+                return redirect(url_for('calendar', doctor=doctor, date=day.isoformat()))
+            doctor = doctor or patient.doctor
+            with queue_lock:
+                if at:
+                    start = slot_of(datetime.combine(day, time.fromisoformat(at)))
+                else:
+                    # first opening on that day or later, never in the past
+                    earliest = max(next_slot(datetime.combine(day, time.min)), next_slot(datetime.now()))
+                    start = scheduler.next_free(doctor, earliest, length)
+                b = scheduler.book(pid, doctor, start, length)
+        except (ValueError, KeyError) as e:
+            flash(f"Invalid booking: {e}", "danger")
+        except SlotConflict as e:
+            flash(f"Slot not available. {e}", "danger")
+        else:
+            session_undo().push(("booking_add", b.booking_id))
+            flash(f"Booked {patient.name} with {b.doctor} on {b.starts_at:%Y-%m-%d} "
+                  f"{b.starts_at:%H:%M}-{b.ends_at:%H:%M}", "success")
+            return redirect(url_for('calendar', doctor=b.doctor, date=b.starts_at.date().isoformat()))
+
+    agenda, opening = [], None
+    name = request.args.get('patient', '')
+    patient_list = patient_picks(name)
+    with store_lock.read():
+        doctors = patient_tree.doctors()
+        if doctor:
+            with queue_lock:
+                bookings = scheduler.day(doctor, next_slot(datetime.combine(day, time.min)))
+                opening = time_of(scheduler.next_free(doctor, next_slot(datetime.now())))
+            for b in bookings:
+                p = patients_ll.find_by_id(b.patient_id)
+                agenda.append((b, p.name if p else f"#{b.patient_id}"))
+    return render_template('calendar.html', doctors=doctors, doctor=doctor, day=day.isoformat(),
+                           patients=patient_list, patient=name, agenda=agenda, opening=opening,
+                           slot_minutes=SLOT_MINUTES, max_minutes=MAX_LENGTH * SLOT_MINUTES)
+
+
+@app.route('/calendar/cancel/<int:bid>', methods=['POST'])
+def cancel_booking(bid):
+    with queue_lock:
+        b = scheduler.cancel(bid)
+    if not b:
+        flash("Booking not found.", "danger")
+        return redirect(url_for('calendar'))
+    session_undo().push(("booking_cancel", b))
+    flash(f"Booking #{bid} cancelled.", "success")
+    return redirect(url_for('calendar', doctor=b.doctor, date=b.starts_at.date().isoformat()))
 
 
 @app.route('/search', methods=['GET', 'POST'])
 def search():
     results = []
-    if request.method == 'POST':
+    found = None
+    args = request.args
+    if request.method == 'GET' and any(args.get(k, '').strip() for k in
+                                       ('q', 'name', 'disease', 'doctor', 'age_min', 'age_max')):
+        try:
+            age_min = int(args['age_min']) if args.get('age_min', '').strip() else None
+            age_max = int(args['age_max']) if args.get('age_max', '').strip() else None
+        except ValueError:
+            flash("Age must be a number.", "danger")
+            return render_template('search.html', results=results, found=found)
+        t0 = timer.perf_counter()
+        with store_lock.read():
+            results, total = search_index.search(
+                args.get('q', ''), name=args.get('name', ''), disease=args.get('disease', ''),
+                doctor=args.get('doctor', ''), age_min=age_min, age_max=age_max,
+                fuzzy=2 if args.get('fuzzy') else 0)
+        found = {"total": f"{COUNT_CAP}+" if total > COUNT_CAP else total,
+                 "shown": len(results), "more": total > len(results), "ms": (timer.perf_counter() - t0) * 1000}
+    elif request.method == 'POST':
         doctor = request.form['doctor'].strip()
-        results = patient_tree.search(doctor)
+        mode = request.form.get('mode', 'exact')
+        with store_lock.read():
+            if mode == 'prefix':
+                groups = patient_tree.prefix_search(doctor)
+            elif mode == 'range':
+                doctor_to = request.form.get('doctor_to', '').strip() or doctor
+                groups = patient_tree.range_search(doctor, doctor_to)
+            else:
+                groups = [(doctor, patient_tree.search(doctor))]
+        results = [p for _, patients in groups for p in patients]
         if not results:
             flash("No patients found for this doctor.", "info")
 
-    return render_template('search.html', results=results)
+    return render_template('search.html', results=results, found=found)
 
 
 @app.route('/update/<int:pid>', methods=['GET', 'POST'])
 def update(pid):
-    patient = patients_ll.find_by_id(pid)
+    with store_lock.read():
+        patient = patients_ll.find_by_id(pid)
     if not patient:
         flash("Patient not found.", "danger")
         return redirect(url_for('view_patients_route'))
 
     if request.method == 'POST':
-        old = patient.to_dict()
-        name = request.form['name'].strip() or patient.name
-        age = int(request.form['age']) if request.form['age'].strip() else patient.age
-        disease = request.form['disease'].strip() or patient.disease
-        doctor = request.form['doctor'].strip() or patient.doctor
-
-        patients_ll.update_by_id(pid, name=name, age=age, disease=disease, doctor=doctor)
-        patient_tree.rebuild_from_list(patients_ll.to_list())
-        undo_stack.push(("update", old))
-        sync_undo_stack()
+        # blank fields keep their current value; the rest get the checks /register applies
+        try:
+            name, age, disease, doctor = validate(*(request.form.get(f, '').strip() or getattr(patient, f)
+                                                    for f in ('name', 'age', 'disease', 'doctor')))
+        except ValueError as e:
+            flash(str(e), "danger")
+            return redirect(url_for('update', pid=pid))
+
+        with store_lock.write():
+            patient = patients_ll.find_by_id(pid)
+            if not patient:
+                flash("Patient not found.", "danger")
+                return redirect(url_for('view_patients_route'))
+            old = changed_fields(patient, name=name, age=age, disease=disease, doctor=doctor)
+            patients_ll.update_by_id(pid, name=name, age=age, disease=disease, doctor=doctor)
+            patient_tree.move(old.get('doctor', doctor), doctor, patient)
+        if old:
+            session_undo().push(("update", pid, old))
         flash("Patient updated successfully.", "success")
         return redirect(url_for('view_patients_route'))
 
@@ -190,32 +485,145 @@ def update(pid):
 
 @app.route('/delete/<int:pid>', methods=['POST'])
 def delete(pid):
-    patient = patients_ll.find_by_id(pid)
+    with store_lock.write():
+        patient = patients_ll.delete_by_id(pid)
+        if patient:
+            patient_tree.remove(patient.doctor, pid)
     if not patient:
         flash("Patient not found.", "danger")
     else:
-        undo_stack.push(("delete", patient.to_dict()))
-        patients_ll.delete_by_id(pid)
-        patient_tree.remove(patient.doctor, pid)
-        sync_undo_stack()
+        session_undo().push(("delete", patient))
         flash(f"Patient ID {pid} deleted.", "success")
     return redirect(url_for('view_patients_route'))
 
 
 @app.route('/undo')
 def undo():
-    if undo_stack.is_empty():
+    stack = session_undo(create=False)
+    if not stack or stack.is_empty():
         flash("Nothing to undo.", "info")
     else:
-        undo_action(undo_stack, patients_ll, patient_tree, appointments_q)
-        sync_undo_stack()
-        flash("Last action undone.", "success")
+        try:
+            with store_lock.write(), queue_lock:
+                undo_action(stack, patients_ll, patient_tree, appointments_q, scheduler)
+        except SlotConflict as e:
+            flash(f"Could not restore booking: {e}", "danger")
+        else:
+            flash("Last action undone.", "success")
+    return redirect(request.referrer or url_for('index'))
+
+
+@app.route('/redo')
+def redo():
+    stack = session_undo(create=False)
+    if not stack or not stack.can_redo():
+        flash("Nothing to redo.", "info")
+    else:
+        try:
+            with store_lock.write(), queue_lock:
+                redo_action(stack, patients_ll, patient_tree, appointments_q, scheduler)
+        except SlotConflict as e:
+            flash(f"Could not restore booking: {e}", "danger")
+        else:
+            flash("Action redone.", "success")
     return redirect(request.referrer or url_for('index'))
 
 
+@app.route('/reassign', methods=['POST'])
+def reassign():
+    old = request.form.get('doctor', '').strip()
+    new = request.form.get('new_doctor', '').strip()
+    if not old or not new:
+        flash("Both the current and the new doctor are required.", "danger")
+        return redirect(url_for('search'))
+    with store_lock.write():
+        moved = reassign_doctor(patients_ll, patient_tree, session_undo(), old, new)
+    flash(f"Reassigned {moved} patients from {old} to {new}.", "success" if moved else "info")
+    return redirect(url_for('search'))
+
+
+@app.route('/reports')
+def reports_page():
+    if roster_columns is None:
+        flash("Reports need NumPy (pip install numpy).", "warning")
+        return redirect(url_for('index'))
+    days = min(max(request.args.get('days', reports.DAYS, type=int), 1), 366)
+    age_bin = min(max(request.args.get('age_bin', reports.AGE_BIN, type=int), 1), 100)
+    t0 = timer.perf_counter()
+    with store_lock.read():
+        report = roster_columns.report(days, age_bin)
+    ms = (timer.perf_counter() - t0) * 1000
+    return render_template('reports.html', report=report, days=days, age_bin=age_bin, ms=ms)
+
+
+@app.route('/bulk')
+def bulk_page():
+    return render_template('bulk.html', formats=bulk.FORMATS)
+
+
+@app.route('/import/<kind>', methods=['POST'])
+def bulk_import(kind):
+    # multipart upload from the /bulk form, or the raw file as the request body:
+    #   curl --data-binary @patients.csv -H 'Content-Type: text/csv' .../import/patients
+    if kind not in ('patients', 'appointments'):
+        abort(404)
+    upload = request.files.get('file')
+    if upload:
+        raw, name = upload.stream, upload.filename or ''
+    else:
+        raw, name = request.stream, ''
+    fmt = request.args.get('format') or request.form.get('format') or (
+        'ndjson' if 'ndjson' in (request.mimetype or '') else bulk.format_of(name))
+    if fmt not in bulk.FORMATS:
+        abort(400)
+    rows = bulk.read_rows(io.TextIOWrapper(raw, encoding='utf-8', newline=''), fmt)
+    try:
+        if kind == 'patients':
+            result = bulk.import_patients(rows, patients_ll, patient_tree, session_undo(), store_lock.write)
+        else:
+            with store_lock.read():
+                result = bulk.import_appointments(rows, patients_ll, appointments_q, session_undo(),
+                                                  lambda: queue_lock)
+    except (ValueError, UnicodeDecodeError) as e:
+        # a malformed file (not a bad row); rows already applied stay, and can be
+        # undone unless there were more than MAX_GROUP_ACTIONS of them
+        if not upload:
+            return jsonify(error=str(e)), 400
+        flash(f"Import stopped: {e}", "danger")
+        return redirect(url_for('bulk_page'))
+
+    if not upload:
+        return jsonify(imported=result.imported, rejected=result.rejected, errors=result.errors)
+    flash(f"Imported {result.imported} {kind}, rejected {result.rejected}.",
+          "success" if result.imported else "warning")
+    if result.imported > MAX_GROUP_ACTIONS:
+        flash(f"More than {MAX_GROUP_ACTIONS} changes at once: this import cannot be undone.", "info")
+    for row_no, message in result.errors[:10]:
+        flash(f"Row {row_no}: {message}", "danger")
+    return redirect(url_for('bulk_page'))
+
+
+@app.route('/export/<kind>.<fmt>')
+def bulk_export(kind, fmt):
+    if fmt not in bulk.FORMATS:
+        abort(404)
+    if kind == 'patients':
+        parts = bulk.export_patients(iter_patients(), fmt)
+    elif kind == 'appointments':
+        with queue_lock:
+            appointments = appointments_q.appointments()
+        parts = bulk.export_appointments(appointments, fmt)
+    else:
+        abort(404)
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(stream_with_context(parts), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={kind}.{fmt}'})
+
+
 @app.route('/save')
 def save():
-    save_all(patients_ll, appointments_q)
+    with store_lock.read(), queue_lock:
+        save_all(patients_ll, appointments_q, scheduler, ledger)
     flash("All data saved to disk.", "success")
     return redirect(url_for('index'))
 
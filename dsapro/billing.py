@@ -1,7 +1,274 @@
 # billing.py
+# Visit pricing and the invoice ledger.
+# Amounts are parsed as Decimal and kept as integer cents from then on, so
+# totals are exact (no 0.1 + 0.2 drift) and a batch is priced as plain
+# integer columns. Every served appointment becomes an unbilled visit; an
+# invoice bills one visit (or a walk-in) and is never changed afterwards.
+# Both go to an append-only ledger file, replayed on startup, and running
+# totals per patient, doctor and day are updated as invoices are issued.
+import os
+import json
+import threading
+from datetime import datetime
+from functools import lru_cache
+from heapq import nlargest
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from typing import Dict, Iterable, List, Optional, Tuple
+from patient import TIME_FORMAT
+
+CENT = Decimal("0.01")
+MAX_AMOUNT = Decimal("1000000")  # largest amount accepted for one part of a visit
+PARTS = ("base", "tests", "meds", "other")  # priced components of a visit, in cents
+SCOPES = ("patient", "doctor", "day")       # running totals are kept per patient, doctor and issue day
+_to_json = json.JSONEncoder(separators=(",", ":")).encode
+
+
+@lru_cache(maxsize=4096)  # the same few fees recur across a day's batch
+def to_cents(value) -> int:
+    # "12.5", 12.5 or Decimal("12.50") -> 1250, rounded half up to the cent
+    try:
+        amount = Decimal(str(value if value is not None else "").strip() or "0")
+    except InvalidOperation:
+        raise ValueError(f"{value!r} is not an amount.") from None
+    if not amount.is_finite() or amount < 0:
+        raise ValueError("Amounts must be zero or more.")
+    if amount > MAX_AMOUNT:
+        raise ValueError(f"Amounts must be at most {MAX_AMOUNT}.")
+    try:
+        return int(amount.quantize(CENT, ROUND_HALF_UP).scaleb(2))
+    except ArithmeticError:  # decimal.InvalidOperation: more digits than the context holds
+        raise ValueError(f"{value!r} is not an amount.") from None
+
+
+def from_cents(cents: int) -> Decimal:
+    return Decimal(cents).scaleb(-2)
+
+
 def calculate_bill(base_fee: float, tests_cost: float = 0.0, medicine_cost: float = 0.0, other: float = 0.0) -> float:
     """
     Simple billing calculation. Return total amount.
     """
-    total = float(base_fee) + float(tests_cost) + float(medicine_cost) + float(other)
-    return round(total, 2)
\ No newline at end of file
+    cents = sum(to_cents(v) for v in (base_fee, tests_cost, medicine_cost, other))
+    return float(from_cents(cents))
+
+
+def price_batch(base, tests, meds, other) -> List[int]:
+    # one column of cents per part, one entry per visit -> total cents per visit
+    return [b + t + m + o for b, t, m, o in zip(base, tests, meds, other)]
+
+
+class Visit:
+    __slots__ = ("visit_id", "handle", "patient_id", "doctor", "served_at")
+
+    def __init__(self, visit_id: int, handle: int, patient_id: int, doctor: str, served_at: str):
+        self.visit_id = visit_id
+        self.handle = handle  # the served appointment
+        self.patient_id = patient_id
+        self.doctor = doctor
+        self.served_at = served_at
+
+    def to_dict(self):
+        return {f: getattr(self, f) for f in self.__slots__}
+
+
+class Invoice:
+    __slots__ = ("invoice_id", "patient_id", "doctor", "visit_id", "handle") + PARTS + ("issued_at",)
+
+    def __init__(self, invoice_id: int, patient_id: int, doctor: str, visit_id: Optional[int],
+                 handle: Optional[int], base: int, tests: int = 0, meds: int = 0, other: int = 0,
+                 issued_at: str = None):
+        self.invoice_id = invoice_id
+        self.patient_id = patient_id
+        self.doctor = doctor
+        self.visit_id = visit_id  # None for a walk-in billed without a served appointment
+        self.handle = handle
+        self.base, self.tests, self.meds, self.other = base, tests, meds, other
+        self.issued_at = issued_at or datetime.now().strftime(TIME_FORMAT)
+
+    @property
+    def total(self) -> int:
+        return self.base + self.tests + self.meds + self.other
+
+    def amount(self, part: str = "total") -> Decimal:
+        return from_cents(getattr(self, part))
+
+    def to_dict(self):
+        return {f: getattr(self, f) for f in self.__slots__}
+
+    def __repr__(self):
+        return (f"Invoice(invoice_id={self.invoice_id}, patient_id={self.patient_id}, "
+                f"doctor={self.doctor!r}, total={self.amount()})")
+
+
+class Ledger:
+    """Visits and invoices, with running totals. `path` is the append-only
+    NDJSON ledger file; None keeps everything in memory only."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.f = None
+        self.lock = threading.Lock()
+        self.invoices: Dict[int, Invoice] = {}
+        self.by_patient: Dict[int, List[int]] = {}          # patient_id -> invoice_ids
+        self.unbilled: Dict[int, Visit] = {}                # visit_id -> visit, in serve order
+        self.totals: Dict[str, Dict] = {s: {} for s in SCOPES}  # scope -> key -> [invoices, cents]
+        self.last_visit = 0
+        self.last_invoice = 0
+
+    def __len__(self):
+        return len(self.invoices)
+
+    # --- the ledger file ---
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue  # torn last line of a crashed write
+                if rec.pop("op") == "visit":
+                    self._add_visit(Visit(**rec))
+                else:
+                    self._add_invoice(Invoice(**rec))
+
+    def _write(self, records):
+        if not self.path:
+            return
+        if self.f is None:
+            self.f = open(self.path, "a+", encoding="utf-8")
+            if self.f.tell() > 0:
+                self.f.seek(self.f.tell() - 1)
+                if self.f.read(1) != "\n":
+                    self.f.write("\n")  # terminate a torn record left by a crash
+        self.f.write("".join(_to_json(r) + "\n" for r in records))
+        self.f.flush()
+
+    def sync(self):
+        with self.lock:
+            if self.f:
+                self.f.flush()
+                os.fsync(self.f.fileno())
+
+    # --- in-memory state ---
+
+    def _add_visit(self, v: Visit):
+        self.unbilled[v.visit_id] = v
+        self.last_visit = max(self.last_visit, v.visit_id)
+
+    def _add_invoice(self, inv: Invoice, total: int = None):
+        self.invoices[inv.invoice_id] = inv
+        self.by_patient.setdefault(inv.patient_id, []).append(inv.invoice_id)
+        self.unbilled.pop(inv.visit_id, None)
+        self.last_invoice = max(self.last_invoice, inv.invoice_id)
+        if total is None:
+            total = inv.total
+        for scope, key in zip(SCOPES, (inv.patient_id, inv.doctor, inv.issued_at[:10])):
+            t = self.totals[scope].get(key)
+            if t is None:
+                self.totals[scope][key] = [1, total]
+            else:
+                t[0] += 1
+                t[1] += total
+
+    # --- visits ---
+
+    def attach(self, appts):
+        appts.listeners.append(self.on_appointment)
+
+    def on_appointment(self, event, appt):
+        if event == "dequeue":
+            self.served(appt.handle, appt.patient_id, appt.doctor)
+
+    def served(self, handle: int, patient_id: int, doctor: str, served_at: str = None) -> Visit:
+        with self.lock:
+            v = Visit(self.last_visit + 1, handle, patient_id, doctor or "",
+                      served_at or datetime.now().strftime(TIME_FORMAT))
+            self._add_visit(v)
+            self._write([{"op": "visit", **v.to_dict()}])
+        return v
+
+    def pending(self, day: str = None, patient_id: int = None) -> List[Visit]:
+        # unbilled visits in serve order, optionally only those served on `day` (YYYY-MM-DD)
+        with self.lock:
+            return [v for v in self.unbilled.values()
+                    if (day is None or v.served_at.startswith(day))
+                    and (patient_id is None or v.patient_id == patient_id)]
+
+    # --- invoices ---
+
+    def issue_many(self, rows: Iterable) -> List[Invoice]:
+        # rows: (patient_id, doctor, visit_id or None, base, tests, meds, other), amounts in
+        # any form to_cents takes. Priced as one batch and written with one flush; nothing
+        # is issued if any row is invalid.
+        visits, columns = [], ([], [], [], [])
+        for row in rows:
+            if len(row) != 3 + len(PARTS):
+                raise ValueError(f"Each row needs patient_id, doctor, visit_id, {', '.join(PARTS)}.")
+            visits.append(tuple(row[:3]))
+            for col, amount in zip(columns, row[3:]):
+                col.append(to_cents(amount))
+        return self._issue(visits, columns)
+
+    def _issue(self, visits: List[tuple], columns: Tuple[list, ...]) -> List[Invoice]:
+        # visits: (patient_id, doctor, visit_id); columns: cents per PARTS entry, per visit
+        totals = price_batch(*columns)
+        with self.lock:
+            visit_ids = [v[2] for v in visits if v[2] is not None]
+            if len(set(visit_ids)) < len(visit_ids) or any(v not in self.unbilled for v in visit_ids):
+                raise ValueError("A visit in this batch is unknown or already billed.")
+            stamp = datetime.now().strftime(TIME_FORMAT)
+            issued = []
+            for (pid, doctor, visit_id), amounts, total in zip(visits, zip(*columns), totals):
+                visit = self.unbilled.get(visit_id)
+                inv = Invoice(self.last_invoice + 1, pid, doctor or (visit.doctor if visit else ""), visit_id,
+                              visit.handle if visit else None, *amounts, issued_at=stamp)
+                self._add_invoice(inv, total)
+                issued.append(inv)
+            self._write({"op": "invoice", **inv.to_dict()} for inv in issued)
+        return issued
+
+    def bill(self, patient_id: int, doctor: str, base, tests=0, meds=0, other=0, handle: int = None) -> Invoice:
+        # bill the visit of the served appointment `handle`; without a handle, the
+        # patient's oldest unbilled visit, or a walk-in when there is none
+        visits = self.pending(patient_id=patient_id)
+        if handle is not None:
+            visits = [v for v in visits if v.handle == handle]
+            if not visits:
+                raise ValueError(f"Appointment #{handle} has no unbilled visit.")
+        visit_id = visits[0].visit_id if visits else None
+        return self.issue_many([(patient_id, doctor, visit_id, base, tests, meds, other)])[0]
+
+    def bill_pending(self, day: str = None, fees: Dict[str, object] = None, base=0, tests=0, meds=0,
+                     other=0) -> List[Invoice]:
+        # end-of-day billing: invoice every unbilled visit (of `day`) at the doctor's fee
+        # from `fees`, else `base`, plus the same tests/meds/other amounts
+        fees = {d: to_cents(f) for d, f in (fees or {}).items()}
+        base = to_cents(base)
+        visits = self.pending(day)
+        columns = ([fees.get(v.doctor, base) for v in visits],) + tuple(
+            [to_cents(a)] * len(visits) for a in (tests, meds, other))
+        return self._issue([(v.patient_id, v.doctor, v.visit_id) for v in visits], columns)
+
+    def total(self, scope: str, key) -> Tuple[int, Decimal]:
+        # (invoices, amount) for one patient / doctor / day, from the running totals
+        with self.lock:
+            count, cents = self.totals[scope].get(key, (0, 0))
+        return count, from_cents(cents)
+
+    def top(self, scope: str, limit: int = 20) -> List[Tuple[object, int, Decimal]]:
+        # (key, invoices, amount) for the largest totals of a scope, largest first
+        with self.lock:
+            rows = nlargest(limit, self.totals[scope].items(), key=lambda kv: kv[1][1])
+        return [(key, count, from_cents(cents)) for key, (count, cents) in rows]
+
+    def for_patient(self, patient_id: int) -> List[Invoice]:
+        with self.lock:
+            return [self.invoices[i] for i in self.by_patient.get(patient_id, ())]
+
+    def recent(self, limit: int = 50) -> List[Invoice]:
+        with self.lock:
+            first = max(self.last_invoice - limit, 0)
+            return [self.invoices[i] for i in range(self.last_invoice, first, -1) if i in self.invoices]
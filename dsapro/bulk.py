@@ -0,0 +1,254 @@
+# bulk.py
+# Streaming bulk import/export of patients and appointments as CSV or NDJSON.
+# Input is read and applied CHUNK rows at a time: each chunk is validated with
+# the same rules as /register, gets a block of IDs in one allocation, and is
+# inserted into the roster and the doctor index inside one store batch (one
+# SQLite transaction / one journal flush), all of it or none of it. Export
+# yields text a chunk at a time, so neither direction ever holds the whole file
+# in memory.
+#
+#   python bulk.py import patients new_patients.csv
+#   python bulk.py export appointments queue.ndjson
+#   python bulk.py bench --rows 1000000
+import io
+import csv
+import json
+import time
+import argparse
+from datetime import datetime
+from contextlib import nullcontext, suppress
+from itertools import islice
+from typing import Iterable, Iterator, List, Tuple
+
+from patient import Patient, FIELDS, TIME_FORMAT, validate, parse_time
+from data_structures.queue import TRIAGE_LEVELS
+from data_structures.stack import store_batch
+
+CHUNK = 5000
+MAX_ERRORS = 100  # rejected rows reported back; the rest are only counted
+FORMATS = ("csv", "ndjson")
+APPOINTMENT_FIELDS = ("patient_id", "priority", "doctor", "handle", "position")
+_to_json = json.JSONEncoder(separators=(",", ":")).encode
+
+
+def format_of(filename: str, default: str = "csv") -> str:
+    ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    return {"csv": "csv", "ndjson": "ndjson", "jsonl": "ndjson"}.get(ext, default)
+
+
+def read_rows(stream, fmt: str) -> Iterator[dict]:
+    # text stream -> one dict per record; blank lines are skipped
+    if fmt == "ndjson":
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        yield from csv.DictReader(stream)
+
+
+def _chunks(iterable, size):
+    it = iter(iterable)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class ImportResult:
+    __slots__ = ("imported", "rejected", "errors")
+
+    def __init__(self):
+        self.imported = 0
+        self.rejected = 0
+        self.errors: List[Tuple[int, str]] = []  # (row number, message), first MAX_ERRORS only
+
+    def reject(self, row_no, message):
+        self.rejected += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append((row_no, message))
+
+
+def import_patients(rows: Iterable[dict], linked_list, tree, undo_stack=None, lock=nullcontext,
+                    chunk: int = CHUNK) -> ImportResult:
+    # IDs are always assigned here; a patient_id column in the input is ignored.
+    # `lock` is entered once per chunk, so readers get in between chunks.
+    result = ImportResult()
+    group = undo_stack.group("bulk import of patients") if undo_stack is not None else nullcontext()
+    row_no = 0
+    with group:
+        for batch in _chunks(rows, chunk):
+            # every row is checked and turned into a Patient before anything is
+            # applied; only the IDs are filled in under the lock
+            patients = []
+            stamp = datetime.now().strftime(TIME_FORMAT)  # rows without registered_at
+            for row in batch:
+                row_no += 1
+                try:
+                    registered_at = row.get("registered_at")
+                    registered_at = parse_time(registered_at) if registered_at else stamp
+                    patients.append(Patient(None, *validate(row.get("name"), row.get("age"), row.get("disease"),
+                                                            row.get("doctor")), registered_at))
+                except (ValueError, AttributeError) as e:
+                    result.reject(row_no, str(e))
+            if not patients:
+                continue
+            with lock():
+                for pid, p in enumerate(patients, linked_list.allocate_ids(len(patients))):
+                    p.patient_id = pid
+                try:
+                    with store_batch(linked_list):
+                        linked_list.insert_many(patients)
+                        insert = tree.insert
+                        for p in patients:
+                            insert(p.doctor, p)
+                except BaseException:
+                    _roll_back(patients, linked_list, tree)
+                    raise
+            if undo_stack is not None:
+                for p in patients:
+                    undo_stack.push(("add", p.patient_id))
+            result.imported += len(patients)
+    return result
+
+
+def _roll_back(patients, linked_list, tree):
+    # take a chunk that failed part way (a listener raised) back out of the
+    # store and the doctor index; each step is best effort, the first error is
+    # the one re-raised
+    for p in patients:
+        with suppress(Exception):
+            if linked_list.find_by_id(p.patient_id) is not None:
+                linked_list.delete_by_id(p.patient_id)
+        with suppress(Exception):
+            if tree.contains(p.doctor, p.patient_id):
+                tree.remove(p.doctor, p.patient_id)
+
+
+def import_appointments(rows: Iterable[dict], linked_list, appts, undo_stack=None, lock=nullcontext,
+                        chunk: int = CHUNK) -> ImportResult:
+    # rows: patient_id plus optional triage (level name) or priority (number) and doctor,
+    # which defaults to the patient's own doctor
+    result = ImportResult()
+    group = undo_stack.group("bulk import of appointments") if undo_stack is not None else nullcontext()
+    row_no = 0
+    with group:
+        for batch in _chunks(rows, chunk):
+            with lock():
+                for row in batch:
+                    row_no += 1
+                    try:
+                        pid = int(row.get("patient_id"))
+                        patient = linked_list.find_by_id(pid)
+                        if not patient:
+                            raise ValueError(f"Patient ID {pid} not found.")
+                        triage = str(row.get("triage") or "").strip().lower()
+                        if triage and triage not in TRIAGE_LEVELS:
+                            raise ValueError(f"Unknown triage level {triage!r}.")
+                        priority = TRIAGE_LEVELS[triage] if triage else int(row.get("priority") or 0)
+                    except (ValueError, TypeError) as e:
+                        result.reject(row_no, str(e))
+                        continue
+                    handle = appts.enqueue(pid, priority, str(row.get("doctor") or "").strip() or patient.doctor)
+                    if undo_stack is not None:
+                        undo_stack.push(("appointment_add", pid, handle))
+                    result.imported += 1
+    return result
+
+
+def _encode(records: Iterable, fields, fmt: str, chunk: int) -> Iterator[str]:
+    # rows (tuples in `fields` order) -> text, one string per chunk
+    buf = io.StringIO()
+    if fmt == "ndjson":
+        for batch in _chunks(records, chunk):
+            for rec in batch:
+                buf.write(_to_json(dict(zip(fields, rec))))
+                buf.write("\n")
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+        return
+    writer = csv.writer(buf)
+    writer.writerow(fields)
+    for batch in _chunks(records, chunk):
+        writer.writerows(batch)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()  # header of an empty export
+
+
+def export_patients(patients: Iterable[Patient], fmt: str = "csv", chunk: int = CHUNK) -> Iterator[str]:
+    records = ((p.patient_id, p.name, p.age, p.disease, p.doctor, p.registered_at) for p in patients)
+    return _encode(records, FIELDS, fmt, chunk)
+
+
+def export_appointments(appointments, fmt: str = "csv", chunk: int = CHUNK) -> Iterator[str]:
+    # appointments in service order (AppointmentQueue.appointments())
+    records = ((a.patient_id, a.priority, a.doctor or "", a.handle, i)
+               for i, a in enumerate(appointments, 1))
+    return _encode(records, APPOINTMENT_FIELDS, fmt, chunk)
+
+
+def benchmark(rows: int, chunk: int = CHUNK):
+    # import and export `rows` synthetic patients through in-memory structures
+    # (no journal, no disk), and report rows per second for each direction
+    from data_structures.linked_list import LinkedList
+    from data_structures.tree import PatientTree
+    ll, tree = LinkedList(), PatientTree()
+    source = ({"name": f"Patient {i}", "age": i % 90 + 1, "disease": "flu", "doctor": f"Dr {i % 500}"}
+              for i in range(rows))
+    t0 = time.perf_counter()
+    result = import_patients(source, ll, tree, chunk=chunk)
+    t1 = time.perf_counter()
+    out = {}
+    for fmt in FORMATS:
+        t2 = time.perf_counter()
+        size = sum(len(part) for part in export_patients(ll, fmt, chunk))
+        out[fmt] = (time.perf_counter() - t2, size)
+    print(f"import: {result.imported} rows in {t1 - t0:.2f}s = {result.imported / (t1 - t0):,.0f} rows/s")
+    for fmt, (secs, size) in out.items():
+        print(f"export {fmt}: {rows} rows ({size / 1e6:.0f} MB) in {secs:.2f}s = {rows / secs:,.0f} rows/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import/export of patients and appointments.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name in ("import", "export"):
+        p = sub.add_parser(name)
+        p.add_argument("kind", choices=["patients", "appointments"])
+        p.add_argument("path", help="CSV or NDJSON file (format from the extension)")
+        p.add_argument("--format", choices=FORMATS)
+    p = sub.add_parser("bench", help="measure import/export throughput in memory")
+    p.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        benchmark(args.rows)
+        return
+
+    from main import LinkedList, PatientTree, AppointmentQueue, Scheduler, load_all, save_all
+    ll, tree, appts, scheduler = LinkedList(), PatientTree(), AppointmentQueue(), Scheduler()
+    load_all(ll, tree, appts, scheduler)
+    fmt = args.format or format_of(args.path)
+    if args.command == "import":
+        with open(args.path, newline="", encoding="utf-8") as f:
+            rows = read_rows(f, fmt)
+            if args.kind == "patients":
+                result = import_patients(rows, ll, tree)
+            else:
+                result = import_appointments(rows, ll, appts)
+        for row_no, message in result.errors:
+            print(f"row {row_no}: {message}")
+        print(f"Imported {result.imported} {args.kind}, rejected {result.rejected}.")
+        save_all(ll, appts, scheduler)
+    else:
+        parts = export_patients(ll, fmt) if args.kind == "patients" else export_appointments(appts.appointments(), fmt)
+        with open(args.path, "w", newline="", encoding="utf-8") as f:
+            f.writelines(parts)
+        print(f"Exported {len(ll) if args.kind == 'patients' else len(appts)} {args.kind} to {args.path}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,386 @@
+# columnar.py
+# Optional binary snapshot of the patient roster (data/patients.bin).
+#
+# Layout (native little-endian, every section 8-byte aligned):
+#   header    magic, version, gen, row count, string count, sha256 of the catalog
+#   ids       int64[n]     patient_id, in roster order
+#   ages      int64[n]
+#   doctors   int32[n]     index into the string table
+#   diseases  int32[n]     index into the string table
+#   reg       int64[n]     registered_at as seconds since 1970-01-01 (naive time,
+#                          negative before 1970), UNKNOWN_SECONDS if it isn't a time
+#   reg_text  int32[n]     index into the string table of registered_at text that
+#                          isn't a time (kept as written), else -1
+#   name_off  uint64[n+1]  offsets into the names blob
+#   by_id     int64[n]     ids sorted ascending, for bisect lookups
+#   by_id_row int64[n]     row number for each entry of by_id
+#   str_off   uint64[m+1]  offsets into the strings blob
+#   digests   sha256 of each block of BLOCK_ROWS rows, then of by_id + by_id_row
+#   names, strings         UTF-8 blobs
+# The catalog is str_off, digests and the strings blob.
+#
+# The file is opened with mmap, so a Patient is only built when a row is read,
+# and it is checked as it is read: opening hashes only the catalog, a block of
+# rows is hashed the first time one of its rows is read, and the ID index the
+# first time find() needs it. A damaged block raises ChecksumError from the
+# read that reaches it, before any Patient of that block is returned.
+#
+# Version 1 files (int32 ages, no reg_text, one sha256 over the whole body)
+# are still read; they are checked in full on first access.
+#
+#   python columnar.py import data/patients.csv data/patients.bin
+#   python columnar.py export data/patients.csv data/patients.bin
+#   python columnar.py show data/patients.bin 12 40
+import os
+import sys
+import mmap
+import struct
+import hashlib
+import argparse
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from patient import Patient, UNKNOWN_TIME, parse_time
+from snapshot import install, generations, KEEP_GENERATIONS, SnapshotReader, NoIntactSnapshot, ChecksumError
+
+MAGIC = b"PMSCOL1\0"
+VERSION = 2
+HEADER = struct.Struct("<8sIIQQ32s")
+EPOCH = datetime(1970, 1, 1)
+UNKNOWN_SECONDS = -(1 << 63)  # reg of a patient whose registered_at isn't a time
+BLOCK_ROWS = 65536            # rows per checksummed block
+VERIFY_CHUNK = 1 << 20        # bytes hashed per step, straight from the map
+DIGEST_SIZE = 32
+# the per-row columns of each version, as (attribute, array type code)
+COLUMNS = {
+    1: (("ids", "q"), ("ages", "i"), ("doctors", "i"), ("diseases", "i"), ("reg", "q")),
+    2: (("ids", "q"), ("ages", "q"), ("doctors", "i"), ("diseases", "i"), ("reg", "q"), ("reg_text", "i")),
+}
+
+
+def _to_seconds(when: datetime):
+    if when is UNKNOWN_TIME:
+        return UNKNOWN_SECONDS
+    return (parse_time(when) - EPOCH) // timedelta(seconds=1)  # parse_time makes aware times naive
+
+
+def _from_seconds(secs, version=VERSION):
+    # Patient takes the datetime as is, no text round trip; version 1 wrote
+    # every time before 1970 as -1
+    if secs == UNKNOWN_SECONDS or (version == 1 and secs < 0):
+        return UNKNOWN_TIME
+    return EPOCH + timedelta(seconds=secs)
+
+
+def _pad(n):
+    return (-n) % 8
+
+
+def _block_digest(columns, name_off, names, lo, hi):
+    # sha256 of rows lo..hi-1: their part of every row column, then their names
+    digest = hashlib.sha256()
+    for col in columns:
+        digest.update(col[lo:hi])
+    digest.update(name_off[lo:hi + 1])
+    digest.update(names[name_off[lo]:name_off[hi]])
+    return digest.digest()
+
+
+def write_columnar(path, patients, gen=0, keep=KEEP_GENERATIONS):
+    columns = [array(code) for _, code in COLUMNS[VERSION]]
+    ids, ages, doctors, diseases, reg, reg_text = columns
+    name_off, names = array("Q", [0]), bytearray()
+    strings, str_index = [], {}
+
+    def intern(s):
+        i = str_index.get(s)
+        if i is None:
+            i = str_index[s] = len(strings)
+            strings.append(s)
+        return i
+
+    for p in patients:
+        ids.append(p.patient_id)
+        ages.append(p.age)
+        doctors.append(intern(p.doctor))
+        diseases.append(intern(p.disease))
+        reg.append(_to_seconds(p.registered))
+        reg_text.append(intern(p.registered_at) if p.registered is UNKNOWN_TIME else -1)
+        names += p.name.encode("utf-8")
+        name_off.append(len(names))
+
+    n = len(ids)
+    order = sorted(range(n), key=ids.__getitem__)
+    by_id = array("q", (ids[i] for i in order))
+    by_id_row = array("q", order)
+    str_off, blob = array("Q", [0]), bytearray()
+    for s in strings:
+        blob += s.encode("utf-8")
+        str_off.append(len(blob))
+    digests = bytearray()
+    for lo in range(0, n, BLOCK_ROWS):
+        digests += _block_digest(columns, name_off, names, lo, min(lo + BLOCK_ROWS, n))
+    digests += hashlib.sha256(by_id.tobytes() + by_id_row.tobytes()).digest()
+    catalog = hashlib.sha256(str_off.tobytes() + digests + blob).digest()
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, gen, n, len(strings), catalog))
+        for chunk in columns + [name_off, by_id, by_id_row, str_off, digests, names, blob]:
+            data = chunk.tobytes() if isinstance(chunk, array) else bytes(chunk)
+            f.write(data + b"\0" * _pad(len(data)))
+        f.flush()
+        os.fsync(f.fileno())
+    install(tmp, path, keep)
+
+
+class ColumnarSnapshot:
+    def __init__(self, path, verify=False):
+        # verify=True checks the whole file now instead of as it is read
+        self.path = path
+        self.f = open(path, "rb")
+        try:
+            self.mm = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.f.close()
+            raise ValueError(f"{path}: empty file")
+        try:
+            self._open()
+            if verify:
+                self.verify()
+        except BaseException:
+            self.close()
+            raise
+
+    def _open(self):
+        if len(self.mm) < HEADER.size:
+            raise ValueError(f"{self.path}: truncated")
+        magic, self.version, self.gen, n, m, self.checksum = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or self.version not in COLUMNS or sys.byteorder != "little":
+            raise ValueError(f"{self.path}: not a patient snapshot")
+        self.n = n
+        view = memoryview(self.mm)
+        pos = HEADER.size
+
+        def take(fmt, count):
+            nonlocal pos
+            size = count * struct.calcsize(fmt)
+            if pos + size > len(view):
+                raise ValueError(f"{self.path}: truncated")
+            col = view[pos:pos + size].cast(fmt)
+            pos += size + _pad(size)
+            return col
+
+        self.columns = []
+        for name, fmt in COLUMNS[self.version]:
+            col = take(fmt, n)
+            setattr(self, name, col)
+            self.columns.append(col)
+        self.name_off = take("Q", n + 1)
+        self.by_id = take("q", n)
+        self.by_id_row = take("q", n)
+        self.str_off = take("Q", m + 1)
+        blocks = (n + BLOCK_ROWS - 1) // BLOCK_ROWS
+        self.digests = take("B", (blocks + 1) * DIGEST_SIZE) if self.version > 1 else None
+        self.names = take("B", self.name_off[n])
+        self.blob = take("B", self.str_off[m])
+        self._strings = {}
+        self._checked = bytearray(blocks)  # 1 for each block already hashed
+        self._index_checked = False
+        if self.version > 1:
+            catalog = hashlib.sha256()
+            for part in (self.str_off, self.digests, self.blob):
+                catalog.update(part)
+            if catalog.digest() != self.checksum:
+                raise ChecksumError(f"{self.path}: checksum mismatch")
+
+    def __len__(self):
+        return self.n
+
+    def _verify_body(self):
+        # version 1: sha256 of everything after the header, in chunks of the map
+        digest = hashlib.sha256()
+        with memoryview(self.mm) as view:
+            for pos in range(HEADER.size, len(view), VERIFY_CHUNK):
+                with view[pos:pos + VERIFY_CHUNK] as chunk:
+                    digest.update(chunk)
+        if digest.digest() != self.checksum:
+            raise ChecksumError(f"{self.path}: checksum mismatch")
+        self._checked[:] = b"\1" * len(self._checked)
+        self._index_checked = True
+
+    def _check_block(self, b):
+        if self._checked[b]:
+            return
+        if self.version == 1:
+            self._verify_body()
+            return
+        lo = b * BLOCK_ROWS
+        digest = _block_digest(self.columns, self.name_off, self.names, lo, min(lo + BLOCK_ROWS, self.n))
+        if digest != self.digests[b * DIGEST_SIZE:(b + 1) * DIGEST_SIZE]:
+            raise ChecksumError(f"{self.path}: checksum mismatch in rows {lo}-{lo + BLOCK_ROWS - 1}")
+        self._checked[b] = 1
+
+    def _check_index(self):
+        if self._index_checked:
+            return
+        if self.version == 1:
+            self._verify_body()
+            return
+        digest = hashlib.sha256()
+        digest.update(self.by_id)
+        digest.update(self.by_id_row)
+        if digest.digest() != self.digests[-DIGEST_SIZE:]:
+            raise ChecksumError(f"{self.path}: checksum mismatch in the ID index")
+        self._index_checked = True
+
+    def verify(self):
+        # check every block and the ID index now
+        self._check_index()
+        for b in range(len(self._checked)):
+            self._check_block(b)
+
+    def string(self, i):
+        s = self._strings.get(i)
+        if s is None:
+            s = self._strings[i] = str(self.blob[self.str_off[i]:self.str_off[i + 1]], "utf-8")
+        return s
+
+    def _registered(self, i):
+        if self.version > 1 and self.reg_text[i] >= 0:
+            return self.string(self.reg_text[i])
+        return _from_seconds(self.reg[i], self.version)
+
+    def row(self, i) -> Patient:
+        self._check_block(i // BLOCK_ROWS)
+        return Patient(self.ids[i],
+                       str(self.names[self.name_off[i]:self.name_off[i + 1]], "utf-8"),
+                       self.ages[i],
+                       self.string(self.diseases[i]),
+                       self.string(self.doctors[i]),
+                       self._registered(i))
+
+    def find(self, pid):
+        # Patient with this ID, built from its row alone; None if there is none
+        self._check_index()
+        i = bisect_left(self.by_id, pid)
+        if i < self.n and self.by_id[i] == pid:
+            return self.row(self.by_id_row[i])
+        return None
+
+    def __iter__(self):
+        # whole-roster scan: unpack each block's columns once instead of slicing row by row
+        strings = [self.string(i) for i in range(len(self.str_off) - 1)]
+        times = {}
+        for lo in range(0, self.n, BLOCK_ROWS):
+            hi = min(lo + BLOCK_ROWS, self.n)
+            self._check_block(lo // BLOCK_ROWS)
+            names = bytes(self.names[self.name_off[lo]:self.name_off[hi]])
+            off = [o - self.name_off[lo] for o in self.name_off[lo:hi + 1].tolist()]
+            texts = self.reg_text[lo:hi].tolist() if self.version > 1 else [-1] * (hi - lo)
+            for i, pid, age, doc, dis, reg, text in zip(range(hi - lo), self.ids[lo:hi].tolist(),
+                                                        self.ages[lo:hi].tolist(), self.doctors[lo:hi].tolist(),
+                                                        self.diseases[lo:hi].tolist(), self.reg[lo:hi].tolist(),
+                                                        texts):
+                if text >= 0:
+                    registered = strings[text]
+                else:
+                    registered = times.get(reg)
+                    if registered is None:
+                        registered = times[reg] = _from_seconds(reg, self.version)
+                yield Patient(pid, names[off[i]:off[i + 1]].decode("utf-8"), age, strings[dis], strings[doc],
+                              registered)
+
+    def close(self):
+        # drop exported views before the map can be closed
+        self.__dict__.pop("columns", None)
+        for name in ("ids", "ages", "doctors", "diseases", "reg", "reg_text", "name_off",
+                     "by_id", "by_id_row", "str_off", "digests", "names", "blob"):
+            col = self.__dict__.pop(name, None)
+            if col is not None:
+                col.release()
+        self.mm.close()
+        self.f.close()
+
+
+def load_latest(path, consume):
+    """Feed the newest intact generation of path to consume(snapshot);
+    returns its gen number, or None if there is none. Raises NoIntactSnapshot
+    when every generation is damaged."""
+    # Rows are checked block by block as consume reads them, like the CSV
+    # snapshots whose checksum is only known at the end. consume must not
+    # change anything before it has read all it needs (main._fill takes
+    # list(snap) first), so a damaged generation is skipped with nothing
+    # swapped in.
+    damaged = []
+    for name in generations(path):
+        try:
+            snap = ColumnarSnapshot(name)
+        except (OSError, ValueError, ChecksumError, struct.error) as e:
+            print(f"Skipping damaged snapshot {name}: {e}")
+            damaged.append(name)
+            continue
+        try:
+            consume(snap)
+            return snap.gen
+        except ChecksumError as e:
+            print(f"Skipping damaged snapshot {name}: {e}")
+            damaged.append(name)
+        finally:
+            snap.close()
+    if damaged:
+        raise NoIntactSnapshot(f"No intact snapshot of {path}: {', '.join(damaged)} are all damaged.")
+    return None
+
+
+def csv_to_columnar(csv_path, bin_path):
+    rows = iter(SnapshotReader(csv_path))
+    header = next(rows)
+    col = [header.index(f) for f in ("patient_id", "name", "age", "disease", "doctor", "registered_at")]
+    patients = (Patient(int(r[col[0]]), r[col[1]], int(r[col[2]]), r[col[3]], r[col[4]], r[col[5]])
+                for r in rows if r and r[col[0]])
+    write_columnar(bin_path, patients, keep=0)
+
+
+def columnar_to_csv(bin_path, csv_path):
+    from snapshot import write_snapshot
+    snap = ColumnarSnapshot(bin_path)
+    try:
+        rows = ([p.patient_id, p.name, p.age, p.disease, p.doctor, p.registered_at] for p in snap)
+        write_snapshot(csv_path, ["patient_id", "name", "age", "disease", "doctor", "registered_at"],
+                       rows, snap.gen, keep=0)
+    finally:
+        snap.close()
+
+
+def show(bin_path, pids):
+    # look patients up in a snapshot without loading it
+    snap = ColumnarSnapshot(bin_path)
+    try:
+        for pid in pids:
+            p = snap.find(pid)
+            print(p.to_dict() if p else f"{pid}: not in {bin_path}")
+    finally:
+        snap.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert patient snapshots between CSV and binary columnar "
+                                                 "format, or look patients up in a binary one.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, help in (("import", "CSV -> binary"), ("export", "binary -> CSV")):
+        p = sub.add_parser(name, help=help)
+        p.add_argument("csv_path")
+        p.add_argument("bin_path")
+    p = sub.add_parser("show", help="print patients by ID")
+    p.add_argument("bin_path")
+    p.add_argument("pids", type=int, nargs="+")
+    args = parser.parse_args()
+    if args.command == "show":
+        show(args.bin_path, args.pids)
+    else:
+        if args.command == "import":
+            csv_to_columnar(args.csv_path, args.bin_path)
+        else:
+            columnar_to_csv(args.bin_path, args.csv_path)
+        print("Done.")
@@ -0,0 +1,265 @@
+# data_structures/calendar.py
+# Per-doctor slot calendars for timed bookings.
+# Working time is cut into SLOT_MINUTES slots between DAY_START and DAY_END,
+# and every slot gets one absolute number (day ordinal * SLOTS_PER_DAY + slot
+# of day), so a calendar is just the set of booked slot numbers.
+# Each doctor's set lives in a sparse segment tree of booked counts: only
+# nodes above booked slots are stored, so thousands of doctors and months of
+# slots cost memory per booking, and "is this range free" / "first free slot
+# from here" are O(log n) walks instead of scans.
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict
+
+SLOT_MINUTES = 15
+DAY_START = 9   # first slot starts 09:00
+DAY_END = 17    # last slot ends 17:00
+SLOTS_PER_DAY = (DAY_END - DAY_START) * 60 // SLOT_MINUTES
+MAX_LENGTH = SLOTS_PER_DAY  # a booking never runs past the end of its day
+BITS = 26  # absolute slot numbers stay below 2**26 until the year 5700
+
+
+class SlotConflict(Exception):
+    pass
+
+
+def slot_of(when: datetime) -> int:
+    # absolute slot number of the slot starting at `when`
+    minutes = (when.hour - DAY_START) * 60 + when.minute
+    if when.second or when.microsecond or minutes % SLOT_MINUTES or not 0 <= minutes < (DAY_END - DAY_START) * 60:
+        raise ValueError(f"{when:%Y-%m-%d %H:%M} is not the start of a {SLOT_MINUTES}-minute slot "
+                         f"between {DAY_START:02d}:00 and {DAY_END:02d}:00")
+    return when.toordinal() * SLOTS_PER_DAY + minutes // SLOT_MINUTES
+
+
+def next_slot(when: datetime) -> int:
+    # first slot starting at or after `when`
+    minutes = (when.hour - DAY_START) * 60 + when.minute + (1 if when.second or when.microsecond else 0)
+    i = max(-(-minutes // SLOT_MINUTES), 0)
+    return when.toordinal() * SLOTS_PER_DAY + min(i, SLOTS_PER_DAY)
+
+
+def time_of(slot: int) -> datetime:
+    day, i = divmod(slot, SLOTS_PER_DAY)
+    return datetime.fromordinal(day) + timedelta(minutes=DAY_START * 60 + i * SLOT_MINUTES)
+
+
+def day_start(slot: int) -> int:
+    return slot - slot % SLOTS_PER_DAY
+
+
+class Booking:
+    __slots__ = ("booking_id", "patient_id", "doctor", "start", "length")
+
+    def __init__(self, booking_id: int, patient_id: int, doctor: str, start: int, length: int = 1):
+        self.booking_id = booking_id
+        self.patient_id = patient_id
+        self.doctor = doctor
+        self.start = start    # absolute slot number
+        self.length = length  # in slots
+
+    @property
+    def end(self) -> int:
+        return self.start + self.length
+
+    @property
+    def starts_at(self) -> datetime:
+        return time_of(self.start)
+
+    @property
+    def ends_at(self) -> datetime:
+        return time_of(self.end - 1) + timedelta(minutes=SLOT_MINUTES)
+
+    def to_dict(self):
+        return {f: getattr(self, f) for f in self.__slots__}
+
+    def __repr__(self):
+        return (f"Booking(booking_id={self.booking_id}, patient_id={self.patient_id}, "
+                f"doctor={self.doctor!r}, starts_at='{self.starts_at:%Y-%m-%d %H:%M}', length={self.length})")
+
+
+class SlotTree:
+    """Sparse segment tree over [0, 2**BITS) holding how many slots are booked
+    under each node. Node 1 is the root, node n has children 2n and 2n+1."""
+
+    def __init__(self):
+        self.count: Dict[int, int] = {}
+
+    def add(self, slot: int, delta: int):
+        node = (1 << BITS) + slot
+        while node:
+            n = self.count.get(node, 0) + delta
+            if n:
+                self.count[node] = n
+            else:
+                del self.count[node]
+            node >>= 1
+
+    def _first(self, lo: int, free: bool) -> Optional[int]:
+        # first slot >= lo that is free (or booked): climb until a right sibling
+        # can contain one, then descend to its leftmost such slot
+        count = self.count
+
+        def ok(node, depth):
+            n = count.get(node, 0)
+            return n < (1 << (BITS - depth)) if free else n > 0
+
+        node = (1 << BITS) + lo
+        depth = BITS
+        if ok(node, depth):
+            return lo
+        while node > 1:
+            if node & 1 == 0 and ok(node + 1, depth):
+                node += 1
+                break
+            node >>= 1
+            depth -= 1
+        else:
+            return None
+        while depth < BITS:
+            node <<= 1
+            depth += 1
+            if not ok(node, depth):
+                node += 1
+        return node - (1 << BITS)
+
+    def first_free(self, lo: int) -> Optional[int]:
+        return self._first(lo, True)
+
+    def first_booked(self, lo: int) -> Optional[int]:
+        return self._first(lo, False)
+
+
+class DoctorCalendar:
+    def __init__(self):
+        self.tree = SlotTree()
+        self.at: Dict[int, Booking] = {}  # every booked slot -> its booking
+
+    def __len__(self):
+        return len(self.at)
+
+    def overlapping(self, start: int, length: int) -> List[Booking]:
+        res = []
+        slot = self.tree.first_booked(start)
+        while slot is not None and slot < start + length:
+            b = self.at[slot]
+            res.append(b)
+            slot = self.tree.first_booked(b.end)
+        return res
+
+    def next_free(self, start: int, length: int = 1) -> int:
+        # earliest run of `length` free slots starting at or after `start`, within one day
+        slot = start
+        while True:
+            slot = self.tree.first_free(slot)
+            if slot % SLOTS_PER_DAY + length > SLOTS_PER_DAY:
+                slot = day_start(slot) + SLOTS_PER_DAY
+                continue
+            busy = self.tree.first_booked(slot)
+            if busy is None or busy >= slot + length:
+                return slot
+            slot = self.at[busy].end
+
+    def bookings(self, lo: int, hi: int) -> List[Booking]:
+        # bookings starting in [lo, hi), in time order
+        return [b for b in self.overlapping(lo, hi - lo) if b.start >= lo]
+
+    def add(self, b: Booking):
+        for s in range(b.start, b.end):
+            self.tree.add(s, 1)
+            self.at[s] = b
+
+    def remove(self, b: Booking):
+        for s in range(b.start, b.end):
+            self.tree.add(s, -1)
+            del self.at[s]
+
+
+class Scheduler:
+    """Timed bookings for every doctor, with conflict checks on both the
+    doctor's calendar and the patient's other bookings."""
+
+    def __init__(self):
+        self.calendars: Dict[str, DoctorCalendar] = {}
+        self.bookings: Dict[int, Booking] = {}  # booking_id -> booking
+        self.by_patient: Dict[int, set] = {}    # patient_id -> booking_ids
+        self.last_id = 0
+        # callbacks fn(event, booking) for "book" and "cancel"
+        self.listeners = []
+
+    def __len__(self):
+        return len(self.bookings)
+
+    def _notify(self, event, booking):
+        for fn in self.listeners:
+            fn(event, booking)
+
+    def conflicts(self, patient_id: int, doctor: str, start: int, length: int = 1) -> List[Booking]:
+        cal = self.calendars.get(doctor)
+        res = cal.overlapping(start, length) if cal else []
+        for bid in self.by_patient.get(patient_id, ()):
+            b = self.bookings[bid]
+            if b.start < start + length and start < b.end and b not in res:
+                res.append(b)
+        return res
+
+    def book(self, patient_id: int, doctor: str, start: int, length: int = 1,
+             booking_id: int = None) -> Booking:
+        if not 1 <= length <= MAX_LENGTH or start % SLOTS_PER_DAY + length > SLOTS_PER_DAY:
+            raise SlotConflict("Booking must fit inside one working day.")
+        clash = self.conflicts(patient_id, doctor, start, length)
+        if clash:
+            b = clash[0]
+            raise SlotConflict(f"Overlaps booking #{b.booking_id} (patient {b.patient_id} with "
+                               f"{b.doctor}, {b.starts_at:%Y-%m-%d %H:%M}-{b.ends_at:%H:%M}).")
+        if booking_id is None:
+            booking_id = self.last_id + 1
+        self.last_id = max(self.last_id, booking_id)
+        b = Booking(booking_id, patient_id, doctor, start, length)
+        self.bookings[booking_id] = b
+        self.by_patient.setdefault(patient_id, set()).add(booking_id)
+        self.calendars.setdefault(doctor, DoctorCalendar()).add(b)
+        self._notify("book", b)
+        return b
+
+    def cancel(self, booking_id: int) -> Optional[Booking]:
+        b = self.bookings.pop(booking_id, None)
+        if b is None:
+            return None
+        ids = self.by_patient[b.patient_id]
+        ids.discard(booking_id)
+        if not ids:
+            del self.by_patient[b.patient_id]
+        cal = self.calendars[b.doctor]
+        cal.remove(b)
+        if not cal:
+            del self.calendars[b.doctor]
+        self._notify("cancel", b)
+        return b
+
+    def next_free(self, doctor: str, start: int, length: int = 1) -> int:
+        return self.calendars.get(doctor, DoctorCalendar()).next_free(start, length)
+
+    def day(self, doctor: str, slot: int) -> List[Booking]:
+        # the doctor's bookings on the day containing `slot`
+        cal = self.calendars.get(doctor)
+        if cal is None:
+            return []
+        lo = day_start(slot)
+        return cal.bookings(lo, lo + SLOTS_PER_DAY)
+
+    def for_patient(self, patient_id: int) -> List[Booking]:
+        return sorted((self.bookings[i] for i in self.by_patient.get(patient_id, ())), key=lambda b: b.start)
+
+    def to_list(self) -> List[Booking]:
+        return sorted(self.bookings.values(), key=lambda b: b.booking_id)
+
+    def load_from_list(self, arr: List):
+        # arr: (booking_id, patient_id, doctor, start, length) tuples
+        self.calendars = {}
+        self.bookings = {}
+        self.by_patient = {}
+        self.last_id = 0
+        listeners, self.listeners = self.listeners, []
+        for booking_id, patient_id, doctor, start, length in arr:
+            self.book(patient_id, doctor, start, length, booking_id=booking_id)
+        self.listeners = listeners
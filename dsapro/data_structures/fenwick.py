@@ -0,0 +1,39 @@
+# data_structures/fenwick.py
+# Sparse Fenwick (binary indexed) tree counting items per integer slot.
+# Slots may be anywhere in [0, 2**BITS) and only touched nodes are stored,
+# so the tree can follow ever-growing appointment handles without resizing.
+# add() and count_below() are O(BITS), independent of how many items exist.
+from typing import Dict
+
+BITS = 48
+SIZE = 1 << BITS
+
+
+class CountTree:
+    def __init__(self):
+        self.tree: Dict[int, int] = {}
+        self.total = 0
+
+    def __len__(self):
+        return self.total
+
+    def add(self, slot: int, delta: int = 1):
+        self.total += delta
+        tree = self.tree
+        while slot < SIZE:
+            n = tree.get(slot, 0) + delta
+            if n:
+                tree[slot] = n
+            else:
+                del tree[slot]  # keep the dict the size of the live items
+            slot |= slot + 1
+
+    def count_below(self, slot: int) -> int:
+        # number of items in slots < slot
+        tree = self.tree
+        res = 0
+        slot -= 1
+        while slot >= 0:
+            res += tree.get(slot, 0)
+            slot = (slot & (slot + 1)) - 1
+        return res
@@ -0,0 +1,119 @@
+# data_structures/generations.py
+# Change counters behind the JSON API's ETags, and its response cache.
+# A bucket is one part of the data a response reads: "patients" (the whole
+# roster), "doctor:<name>" (one doctor's patients), "appointments" (the whole
+# queue) and "queue:<name>" (one doctor's queue). Every change bumps the
+# counters of exactly the buckets it touches, from the LinkedList and queue
+# listeners, so undo, bulk import and reassignments count too. A response's
+# ETag is the counters of the buckets it reads: while they are unchanged the
+# response would come out byte for byte the same, so a client holding that
+# tag gets 304 and a cached copy can be served without rebuilding it.
+import secrets
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+CACHE_SIZE = 1024  # cached responses kept, least recently used dropped first
+
+
+def doctor_bucket(doctor: Optional[str]) -> str:
+    return f"doctor:{doctor or ''}"
+
+
+def queue_bucket(doctor: Optional[str]) -> str:
+    return f"queue:{doctor or ''}"
+
+
+class Generations:
+    def __init__(self):
+        # counters restart with the process, so its tags must not match the last one's
+        self.epoch = secrets.token_hex(4)
+        self.values: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.listeners = []  # fn(bucket) after a bucket changed in this process
+
+    def bump(self, *buckets: str):
+        with self.lock:
+            for b in buckets:
+                self.values[b] = self.values.get(b, 0) + 1
+        self._changed(buckets)
+
+    def _changed(self, buckets):
+        for fn in self.listeners:
+            for b in buckets:
+                fn(b)
+
+    def get(self, buckets: Iterable[str]) -> Tuple[int, ...]:
+        with self.lock:
+            return tuple(self.values.get(b, 0) for b in buckets)
+
+    def etag(self, buckets: Iterable[str]) -> str:
+        return ".".join([str(self.epoch)] + [str(v) for v in self.get(buckets)])
+
+    # --- listeners ---
+
+    def attach(self, linked_list, appts):
+        linked_list.listeners.append(self.on_patient)
+        appts.listeners.append(self.on_appointment)
+
+    def on_patient(self, event, patient, old=None):
+        if old and "doctor" in old:
+            self.bump("patients", doctor_bucket(patient.doctor), doctor_bucket(old["doctor"]))
+        else:
+            self.bump("patients", doctor_bucket(patient.doctor))
+
+    def on_appointment(self, event, appt):
+        self.bump("appointments", queue_bucket(appt.doctor))
+
+
+class ResponseCache:
+    """LRU cache of response bodies. An entry is returned only for the ETag it
+    was built under, so it can never outlive a change; entries reading a
+    bucket that changes in this process are also dropped right away."""
+
+    def __init__(self, maxsize: int = CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries: "OrderedDict[tuple, tuple]" = OrderedDict()  # key -> (etag, buckets, body)
+        self.keys_of: Dict[str, Set[tuple]] = {}  # bucket -> keys of the entries reading it
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key: tuple, etag: str) -> Optional[bytes]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] != etag:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key: tuple, etag: str, buckets: Tuple[str, ...], body: bytes):
+        with self.lock:
+            self._drop(key)
+            self.entries[key] = (etag, buckets, body)
+            for b in buckets:
+                self.keys_of.setdefault(b, set()).add(key)
+            while len(self.entries) > self.maxsize:
+                self._drop(next(iter(self.entries)))
+
+    def _drop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for b in entry[1]:
+            keys = self.keys_of[b]
+            keys.discard(key)
+            if not keys:
+                del self.keys_of[b]
+
+    def invalidate(self, bucket: str):
+        with self.lock:
+            for key in list(self.keys_of.get(bucket, ())):
+                self._drop(key)
+
+    def attach(self, generations: Generations):
+        generations.listeners.append(self.invalidate)
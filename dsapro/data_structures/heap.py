@@ -0,0 +1,91 @@
+# data_structures/heap.py
+# Binary min-heap that also tracks where each item sits, so any item can be
+# removed or re-prioritised in O(log n), not just the top one.
+# Items need .key (the priority; smaller comes first) and a unique .handle,
+# which also breaks ties so equal keys come out in insertion order.
+from typing import Dict, List, Optional
+
+
+class IndexedHeap:
+    def __init__(self):
+        self.items: List = []
+        self.pos: Dict[int, int] = {}  # handle -> index in items
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, item):
+        return item.handle in self.pos
+
+    @staticmethod
+    def _less(a, b):
+        return (a.key, a.handle) < (b.key, b.handle)
+
+    def _set(self, i, item):
+        self.items[i] = item
+        self.pos[item.handle] = i
+
+    def _sift_up(self, i):
+        item = self.items[i]
+        while i > 0:
+            parent = (i - 1) // 2
+            if not self._less(item, self.items[parent]):
+                break
+            self._set(i, self.items[parent])
+            i = parent
+        self._set(i, item)
+
+    def _sift_down(self, i):
+        n = len(self.items)
+        item = self.items[i]
+        while True:
+            child = 2 * i + 1
+            if child >= n:
+                break
+            if child + 1 < n and self._less(self.items[child + 1], self.items[child]):
+                child += 1
+            if not self._less(self.items[child], item):
+                break
+            self._set(i, self.items[child])
+            i = child
+        self._set(i, item)
+
+    def push(self, item):
+        self.items.append(item)
+        self.pos[item.handle] = len(self.items) - 1
+        self._sift_up(len(self.items) - 1)
+
+    def peek(self):
+        return self.items[0] if self.items else None
+
+    def pop(self):
+        if not self.items:
+            return None
+        top = self.items[0]
+        self.remove(top)
+        return top
+
+    def remove(self, item) -> bool:
+        i = self.pos.pop(item.handle, None)
+        if i is None:
+            return False
+        last = self.items.pop()
+        if i < len(self.items):
+            self._set(i, last)
+            self.update_at(i)
+        return True
+
+    def update(self, item):
+        # call after changing item.key
+        i = self.pos.get(item.handle)
+        if i is not None:
+            self.update_at(i)
+
+    def update_at(self, i):
+        if i > 0 and self._less(self.items[i], self.items[(i - 1) // 2]):
+            self._sift_up(i)
+        else:
+            self._sift_down(i)
+
+    def ordered(self) -> List:
+        return sorted(self.items, key=lambda a: (a.key, a.handle))
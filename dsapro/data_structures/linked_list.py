@@ -1,25 +1,107 @@
 # data_structures/linked_list.py
+import heapq
+import threading
+from contextlib import nullcontext
+from operator import attrgetter
 from patient import Patient
-from typing import Optional, List
+from typing import Optional, List, Dict
 
 class Node:
     def __init__(self, patient: Patient):
         self.patient = patient
+        self.prev = None
         self.next = None
 
 class LinkedList:
     def __init__(self):
         self.head: Optional[Node] = None
+        self.tail: Optional[Node] = None
+        # patient_id -> node, so lookups don't walk the chain
+        self.index: Dict[int, Node] = {}
+        # highest ID ever handed out; never goes down, so deleted IDs aren't reused
+        self.last_id = 0
+        self._id_lock = threading.Lock()
+        # callbacks fn(event, patient, old) run after each insert/update/delete;
+        # old holds the previous values of the changed fields on "update"
+        self.listeners = []
+        self.journal = None
+
+    def __len__(self):
+        return len(self.index)
 
     def insert_end(self, patient: Patient):
         new_node = Node(patient)
-        if not self.head:
-            self.head = new_node
+        if patient.patient_id > self.last_id:
+            self.last_id = patient.patient_id
+        old = self.index.get(patient.patient_id)
+        if old:
+            # a patient with this ID already exists: it is replaced, and listeners
+            # see it go before the new one arrives, so they never index both
+            self._unlink(old)
+            del self.index[patient.patient_id]
+            if self.listeners:
+                self._notify("delete", old.patient)
+        self.index[patient.patient_id] = new_node
+        if not self.tail:
+            self.head = self.tail = new_node
+        else:
+            new_node.prev = self.tail
+            self.tail.next = new_node
+            self.tail = new_node
+        if self.listeners:
+            self._notify("insert", patient)
+
+    def insert_many(self, patients):
+        insert = self.insert_end
+        for p in patients:
+            insert(p)
+
+    def restore(self, patient: Patient):
+        # put a deleted patient back where it was: before the first patient
+        # with a higher ID, which registration order keeps true. The search
+        # starts at the tail, so undoing a recent delete costs next to nothing
+        if patient.patient_id in self.index:
+            self.insert_end(patient)
+            return
+        after = self.tail
+        while after and after.patient.patient_id > patient.patient_id:
+            after = after.prev
+        if after is self.tail:
+            self.insert_end(patient)
             return
+        node = Node(patient)
+        node.prev, node.next = after, (after.next if after else self.head)
+        node.next.prev = node
+        if after:
+            after.next = node
+        else:
+            self.head = node
+        self.index[patient.patient_id] = node
+        if self.listeners:
+            self._notify("insert", patient)
+
+    def _notify(self, event, patient, old=None):
+        for fn in self.listeners:
+            fn(event, patient, old)
+
+    def _unlink(self, node: Node):
+        if node.prev:
+            node.prev.next = node.next
+        else:
+            self.head = node.next
+        if node.next:
+            node.next.prev = node.prev
+        else:
+            self.tail = node.prev
+        # a removed node keeps `prev`, so a walk() whose cursor it was can find
+        # its way back into the list
+        node.next = None
+
+    def __iter__(self):
         temp = self.head
-        while temp.next:
+        while temp:
+            yield temp.patient
             temp = temp.next
-        temp.next = new_node
 
     def display(self):
         temp = self.head
@@ -35,37 +117,75 @@ class LinkedList:
         print("-" * 60)
 
     def find_by_id(self, pid: int) -> Optional[Patient]:
-        temp = self.head
-        while temp:
-            if temp.patient.patient_id == pid:
-                return temp.patient
-            temp = temp.next
-        return None
+        node = self.index.get(pid)
+        return node.patient if node else None
 
     def delete_by_id(self, pid: int) -> Optional[Patient]:
-        prev = None
-        curr = self.head
-        while curr:
-            if curr.patient.patient_id == pid:
-                if prev:
-                    prev.next = curr.next
-                else:
-                    self.head = curr.next
-                return curr.patient
-            prev = curr
-            curr = curr.next
-        return None
+        node = self.index.pop(pid, None)
+        if not node:
+            return None
+        self._unlink(node)
+        self._notify("delete", node.patient)
+        return node.patient
 
     def update_by_id(self, pid: int, **kwargs) -> bool:
-        temp = self.head
-        while temp:
-            if temp.patient.patient_id == pid:
-                for k, v in kwargs.items():
-                    if hasattr(temp.patient, k):
-                        setattr(temp.patient, k, v)
-                return True
-            temp = temp.next
-        return False
+        node = self.index.get(pid)
+        if not node:
+            return False
+        old = {}
+        for k, v in kwargs.items():
+            if hasattr(node.patient, k) and getattr(node.patient, k) != v:
+                old[k] = getattr(node.patient, k)
+                setattr(node.patient, k, v)
+        if old:
+            self._notify("update", node.patient, old)
+        return True
+
+    def page(self, after: Optional[int] = None, limit: int = 50) -> List[Patient]:
+        # up to `limit` patients following patient_id `after` in list order;
+        # the index makes the cursor seek O(1), so every page costs O(limit).
+        # If `after` has been deleted since, the page starts at the first patient
+        # with a higher ID (an O(n) scan, only for such stale cursors)
+        if after is None:
+            node = self.head
+        elif after in self.index:
+            node = self.index[after].next
+        else:
+            node = self.head
+            while node and node.patient.patient_id <= after:
+                node = node.next
+        res = []
+        while node and len(res) < limit:
+            res.append(node.patient)
+            node = node.next
+        return res
+
+    def walk(self, chunk: int = 500, lock=nullcontext):
+        # every patient in list order, read `chunk` at a time inside lock(), so
+        # changes can happen between chunks. The cursor is the last node read:
+        # if that patient is deleted meanwhile, the walk goes on from the
+        # nearest patient before it that is still there
+        node = None
+        while True:
+            with lock():
+                if node is None:
+                    cur = self.head
+                else:
+                    while node is not None and self.index.get(node.patient.patient_id) is not node:
+                        node = node.prev
+                    cur = node.next if node is not None else self.head
+                res = []
+                while cur and len(res) < chunk:
+                    res.append(cur.patient)
+                    node, cur = cur, cur.next
+            yield from res
+            if cur is None:
+                return
+
+    def sorted_page(self, field: str, descending: bool = False, offset: int = 0, limit: int = 50) -> List[Patient]:
+        # partial sort: O(n log(offset + limit)) instead of sorting the whole roster
+        pick = heapq.nlargest if descending else heapq.nsmallest
+        return pick(offset + limit, self, key=attrgetter(field, "patient_id"))[offset:]
 
     def to_list(self) -> List[dict]:
         arr = []
@@ -75,17 +195,28 @@ class LinkedList:
             temp = temp.next
         return arr
 
+    def clear(self):
+        self.head = self.tail = None
+        self.index = {}
+        self.last_id = 0
+
     def load_from_list(self, patients: List[dict]):
-        self.head = None
+        self.clear()
         for d in patients:
             p = Patient(**d)
             self.insert_end(p)
 
     def get_max_id(self) -> int:
-        m = 0
-        temp = self.head
-        while temp:
-            if temp.patient.patient_id > m:
-                m = temp.patient.patient_id
-            temp = temp.next
-        return m
+        return self.last_id
+
+    def allocate_id(self) -> int:
+        with self._id_lock:
+            self.last_id += 1
+            return self.last_id
+
+    def allocate_ids(self, count: int) -> int:
+        # reserve `count` consecutive IDs in one step; returns the first
+        with self._id_lock:
+            first = self.last_id + 1
+            self.last_id += count
+            return first
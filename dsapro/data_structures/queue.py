@@ -1,25 +1,188 @@
 # data_structures/queue.py
-from collections import deque
-from typing import Optional, List
+# Triage appointment scheduler: an indexed heap over all appointments plus
+# one per doctor. Appointments are ordered by
+#     key = arrival number - priority * AGING_STEP
+# so an urgent case jumps ahead of up to AGING_STEP routine arrivals per
+# triage level, but a routine patient still moves forward as newer patients
+# arrive and can't be starved. With every priority equal this is plain FIFO.
+# Alongside the heaps, count trees over the same order answer "how many
+# appointments are ahead of this one" without walking the queue.
+from typing import Optional, List, Dict
+from data_structures.heap import IndexedHeap
+from data_structures.fenwick import CountTree
+
+TRIAGE_LEVELS = {"routine": 0, "urgent": 1, "emergency": 2}
+AGING_STEP = 50
+MAX_PRIORITY = max(TRIAGE_LEVELS.values())
+
+
+def clamp_priority(priority: int) -> int:
+    return min(max(int(priority), 0), MAX_PRIORITY)
+
+
+class Appointment:
+    __slots__ = ("handle", "patient_id", "priority", "doctor", "key")
+
+    def __init__(self, handle: int, patient_id: int, priority: int = 0, doctor: str = None):
+        self.handle = handle  # arrival number; unique for the life of the queue
+        self.patient_id = patient_id
+        self.priority = clamp_priority(priority)
+        self.doctor = doctor
+        self.key = handle - self.priority * AGING_STEP
+
+    def __repr__(self):
+        return (f"Appointment(handle={self.handle}, patient_id={self.patient_id}, "
+                f"priority={self.priority}, doctor={self.doctor!r})")
+
+    @property
+    def slot(self) -> int:
+        # (key, handle) order as one non-negative int: handle = key + priority*AGING_STEP,
+        # so among equal keys the higher priority is also the later handle
+        return (self.key + MAX_PRIORITY * AGING_STEP) * (MAX_PRIORITY + 1) + self.priority
+
 
 class AppointmentQueue:
     def __init__(self):
-        self.q = deque()
+        self.heap = IndexedHeap()
+        self.by_doctor: Dict[str, IndexedHeap] = {}
+        self.entries: Dict[int, Appointment] = {}  # handle -> appointment
+        self.ranks = CountTree()
+        self.ranks_by_doctor: Dict[str, CountTree] = {}
+        self.last_handle = 0
+        # callbacks fn(event, appointment) for "enqueue", "dequeue", "cancel" and "reschedule"
+        self.listeners = []
+
+    def _notify(self, event, appt):
+        for fn in self.listeners:
+            fn(event, appt)
 
-    def enqueue(self, patient_id: int):
-        self.q.append(patient_id)
+    def __len__(self):
+        return len(self.entries)
 
-    def dequeue(self) -> Optional[int]:
-        return self.q.popleft() if self.q else None
+    def enqueue(self, patient_id: int, priority: int = 0, doctor: str = None, handle: int = None) -> int:
+        if handle is None:
+            handle = self.last_handle + 1
+        self.last_handle = max(self.last_handle, handle)
+        appt = Appointment(handle, patient_id, priority, doctor)
+        self.entries[handle] = appt
+        self.heap.push(appt)
+        self.ranks.add(appt.slot)
+        if doctor is not None:
+            self.by_doctor.setdefault(doctor, IndexedHeap()).push(appt)
+            self.ranks_by_doctor.setdefault(doctor, CountTree()).add(appt.slot)
+        self._notify("enqueue", appt)
+        return handle
 
-    def peek(self) -> Optional[int]:
-        return self.q[0] if self.q else None
+    def _take(self, appt):
+        del self.entries[appt.handle]
+        self.heap.remove(appt)
+        self.ranks.add(appt.slot, -1)
+        sub = self.by_doctor.get(appt.doctor)
+        if sub is not None:
+            sub.remove(appt)
+            self.ranks_by_doctor[appt.doctor].add(appt.slot, -1)
+            if not sub:
+                del self.by_doctor[appt.doctor]
+                del self.ranks_by_doctor[appt.doctor]
+
+    def _front(self, doctor: str = None) -> Optional[Appointment]:
+        if doctor is None:
+            return self.heap.peek()
+        sub = self.by_doctor.get(doctor)
+        return sub.peek() if sub else None
+
+    def dequeue(self, doctor: str = None) -> Optional[int]:
+        appt = self._front(doctor)
+        if appt is None:
+            return None
+        self._take(appt)
+        self._notify("dequeue", appt)
+        return appt.patient_id
+
+    def serve(self, handle: int) -> Optional[int]:
+        # dequeue one specific appointment (journal replay of a doctor-specific dequeue)
+        appt = self.entries.get(handle)
+        if appt is None:
+            return None
+        self._take(appt)
+        self._notify("dequeue", appt)
+        return appt.patient_id
+
+    def peek(self, doctor: str = None) -> Optional[int]:
+        appt = self._front(doctor)
+        return appt.patient_id if appt else None
+
+    def front(self, doctor: str = None) -> Optional[Appointment]:
+        # the appointment dequeue would take next, without taking it
+        return self._front(doctor)
+
+    def cancel(self, handle: int) -> Optional[Appointment]:
+        appt = self.entries.get(handle)
+        if appt is None:
+            return None
+        self._take(appt)
+        self._notify("cancel", appt)
+        return appt
+
+    def reschedule(self, handle: int, priority: int) -> bool:
+        appt = self.entries.get(handle)
+        if appt is None:
+            return False
+        ranks = [self.ranks]
+        if appt.doctor in self.ranks_by_doctor:
+            ranks.append(self.ranks_by_doctor[appt.doctor])
+        for r in ranks:
+            r.add(appt.slot, -1)
+        appt.priority = clamp_priority(priority)
+        appt.key = appt.handle - appt.priority * AGING_STEP
+        for r in ranks:
+            r.add(appt.slot)
+        self.heap.update(appt)
+        sub = self.by_doctor.get(appt.doctor)
+        if sub is not None:
+            sub.update(appt)
+        self._notify("reschedule", appt)
+        return True
+
+    def position(self, handle: int, per_doctor: bool = False) -> Optional[int]:
+        # 1-based place in the whole queue, or in the appointment's doctor queue;
+        # None if the handle isn't booked. O(log) via the count trees.
+        appt = self.entries.get(handle)
+        if appt is None:
+            return None
+        ranks = self.ranks_by_doctor.get(appt.doctor, self.ranks) if per_doctor else self.ranks
+        return ranks.count_below(appt.slot) + 1
+
+    def remove_last(self, patient_id: int) -> Optional[Appointment]:
+        # drop the most recent appointment for this patient (undo entries without a handle)
+        handles = [h for h, a in self.entries.items() if a.patient_id == patient_id]
+        return self.cancel(max(handles)) if handles else None
 
     def is_empty(self) -> bool:
-        return len(self.q) == 0
+        return len(self.entries) == 0
+
+    def appointments(self, doctor: str = None) -> List[Appointment]:
+        # service order; O(n log n), meant for snapshots and listings
+        if doctor is None:
+            return self.heap.ordered()
+        sub = self.by_doctor.get(doctor)
+        return sub.ordered() if sub else []
 
     def to_list(self) -> List[int]:
-        return list(self.q)
+        return [a.patient_id for a in self.appointments()]
 
-    def load_from_list(self, arr: List[int]):
-        self.q = deque(arr)
\ No newline at end of file
+    def load_from_list(self, arr: List):
+        # arr: patient IDs (FIFO) or (patient_id, priority, doctor, handle) tuples
+        self.heap = IndexedHeap()
+        self.by_doctor = {}
+        self.entries = {}
+        self.ranks = CountTree()
+        self.ranks_by_doctor = {}
+        self.last_handle = 0
+        listeners, self.listeners = self.listeners, []
+        for item in arr:
+            if isinstance(item, int):
+                self.enqueue(item)
+            else:
+                self.enqueue(*item)
+        self.listeners = listeners
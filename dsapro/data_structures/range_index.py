@@ -0,0 +1,207 @@
+# data_structures/range_index.py
+# Sorted secondary indexes on age and registration time.
+# Each index is a sorted list of (value, patient_id) keys cut into blocks of
+# at most 2 * LOAD keys, with the last key of every block kept in `maxes`:
+# bisect on maxes finds the block, bisect in the block finds the key, and an
+# insert or delete only shifts one block, so keeping it in step with the
+# roster costs O(log n + LOAD) per change instead of O(n).
+# A range query is two bisects plus the k keys it returns; counting a range
+# only adds up block lengths in between, so it never looks at patients.
+from bisect import bisect_left, insort
+from heapq import nsmallest, nlargest
+from itertools import islice
+from operator import attrgetter
+from typing import Dict, List, Optional, Tuple
+
+LOAD = 1000
+INF = float("inf")  # sorts after every patient_id, for inclusive upper bounds
+# indexed field -> patient attribute holding its comparable value
+RANGE_FIELDS = {"age": "age", "registered_at": "registered"}
+
+
+class SortedKeys:
+    def __init__(self, keys=()):
+        keys = sorted(keys)
+        self.blocks: List[list] = [keys[i:i + LOAD] for i in range(0, len(keys), LOAD)]
+        self.maxes = [b[-1] for b in self.blocks]
+        self.size = len(keys)
+
+    def __len__(self):
+        return self.size
+
+    def add(self, key):
+        self.size += 1
+        if not self.blocks:
+            self.blocks.append([key])
+            self.maxes.append(key)
+            return
+        i = bisect_left(self.maxes, key)
+        if i == len(self.maxes):
+            i -= 1
+            self.blocks[i].append(key)
+            self.maxes[i] = key
+        else:
+            insort(self.blocks[i], key)
+        block = self.blocks[i]
+        if len(block) > 2 * LOAD:
+            self.blocks[i:i + 1] = [block[:LOAD], block[LOAD:]]
+            self.maxes[i:i + 1] = [block[LOAD - 1], block[-1]]
+
+    def remove(self, key) -> bool:
+        i = bisect_left(self.maxes, key)
+        if i == len(self.maxes):
+            return False
+        block = self.blocks[i]
+        j = bisect_left(block, key)
+        if block[j] != key:
+            return False
+        del block[j]
+        self.size -= 1
+        if block:
+            self.maxes[i] = block[-1]
+        else:
+            del self.blocks[i]
+            del self.maxes[i]
+        return True
+
+    def _locate(self, key, end=False) -> Tuple[int, int]:
+        # (block, offset) of the first key >= key; key None is the start (or the end)
+        if key is None:
+            return (len(self.blocks), 0) if end else (0, 0)
+        i = bisect_left(self.maxes, key)
+        if i == len(self.maxes):
+            return i, 0
+        return i, bisect_left(self.blocks[i], key)
+
+    def count(self, lo, hi) -> int:
+        # keys with lo <= key < hi (None = unbounded)
+        i, j = self._locate(lo)
+        k, l = self._locate(hi, end=True)
+        if (i, j) >= (k, l):
+            return 0
+        if i == k:
+            return l - j
+        return len(self.blocks[i]) - j + sum(map(len, islice(self.blocks, i + 1, k))) + l
+
+    def irange(self, lo, hi, reverse: bool = False):
+        # keys with lo <= key < hi, ascending (descending when reverse)
+        i, j = self._locate(lo)
+        k, l = self._locate(hi, end=True)
+        blocks = self.blocks
+        if not reverse:
+            while (i, j) < (k, l):
+                block = blocks[i]
+                yield from block[j:l] if i == k else block[j:]
+                i, j = i + 1, 0
+        else:
+            while (k, l) > (i, j):
+                if l == 0:
+                    k -= 1
+                    l = len(blocks[k])
+                    continue
+                yield from reversed(blocks[k][j if k == i else 0:l])
+                l = 0
+
+    def from_position(self, pos: int, reverse: bool = False):
+        # keys from rank `pos` on (counted from the end when reverse); whole
+        # blocks are skipped, so reaching a deep page costs O(n / LOAD)
+        blocks = reversed(self.blocks) if reverse else iter(self.blocks)
+        for block in blocks:
+            if pos >= len(block):
+                pos -= len(block)
+                continue
+            if reverse:
+                yield from reversed(block[:len(block) - pos])
+            else:
+                yield from block[pos:]
+            pos = 0
+
+
+def bounds(lo, hi) -> Tuple[Optional[tuple], Optional[tuple]]:
+    # inclusive value range -> half-open key range over (value, patient_id)
+    return (None if lo is None else (lo,)), (None if hi is None else (hi, INF))
+
+
+class RangeIndex:
+    """Age and registration-time indexes over a LinkedList, kept current as a
+    listener like the search index."""
+
+    def __init__(self):
+        self.sorted: Dict[str, SortedKeys] = {f: SortedKeys() for f in RANGE_FIELDS}
+        self.values: Dict[int, tuple] = {}  # patient_id -> indexed values, in RANGE_FIELDS order
+        self.linked_list = None
+
+    def attach(self, linked_list):
+        self.linked_list = linked_list
+        self.values = {p.patient_id: tuple(getattr(p, a) for a in RANGE_FIELDS.values()) for p in linked_list}
+        self.sorted = {f: SortedKeys((v[n], pid) for pid, v in self.values.items())
+                       for n, f in enumerate(RANGE_FIELDS)}
+        linked_list.listeners.append(self.on_patient)
+
+    def add(self, patient):
+        pid = patient.patient_id
+        self.remove(pid)  # insert_end replaces a patient with the same ID
+        values = tuple(getattr(patient, a) for a in RANGE_FIELDS.values())
+        self.values[pid] = values
+        for f, v in zip(RANGE_FIELDS, values):
+            self.sorted[f].add((v, pid))
+
+    def remove(self, pid: int):
+        values = self.values.pop(pid, None)
+        if values is not None:
+            for f, v in zip(RANGE_FIELDS, values):
+                self.sorted[f].remove((v, pid))
+
+    def on_patient(self, event, patient, old=None):
+        if event == "insert":
+            self.add(patient)
+        elif event == "delete":
+            self.remove(patient.patient_id)
+        elif event == "update" and any(f in old for f in RANGE_FIELDS):
+            self.add(patient)
+
+    def count(self, field: str, lo=None, hi=None) -> int:
+        return self.sorted[field].count(*bounds(lo, hi))
+
+    def ids(self, field: str, lo=None, hi=None, reverse: bool = False):
+        # patient IDs with lo <= field <= hi, in field order
+        return (pid for _, pid in self.sorted[field].irange(*bounds(lo, hi), reverse))
+
+    def sorted_page(self, field: str, descending: bool = False, offset: int = 0, limit: int = 50) -> List:
+        # same result as LinkedList.sorted_page for an indexed field, without touching the rest
+        find = self.linked_list.find_by_id
+        keys = islice(self.sorted[field].from_position(offset, descending), limit)
+        return [find(pid) for _, pid in keys]
+
+    def filter(self, age: Tuple = (None, None), registered: Tuple = (None, None),
+               sort: Optional[str] = None, descending: bool = False,
+               offset: int = 0, limit: int = 50) -> Tuple[List, int]:
+        # patients with age and registration time inside the given inclusive
+        # ranges (None = open end); returns (the requested page, total matches).
+        # The narrower range supplies candidates, the other is checked on them.
+        ranges = {f: r for f, r in zip(RANGE_FIELDS, (age, registered)) if r != (None, None)}
+        if not ranges:
+            ranges = {"age": (None, None)}
+        counts = {f: self.count(f, *r) for f, r in ranges.items()}
+        field = min(counts, key=counts.get)
+        others = [(list(RANGE_FIELDS).index(f), r) for f, r in ranges.items() if f != field]
+        values = self.values
+        find = self.linked_list.find_by_id
+        in_order = sort in (None, field)
+
+        ids = self.ids(field, *ranges[field], reverse=descending and in_order)
+        if others:
+            ids = (pid for pid in ids
+                   if all((lo is None or values[pid][n] >= lo) and (hi is None or values[pid][n] <= hi)
+                          for n, (lo, hi) in others))
+        if in_order:
+            if not others:
+                page = list(islice(ids, offset, offset + limit))
+                return [find(pid) for pid in page], counts[field]
+            ids = list(ids)
+            return [find(pid) for pid in ids[offset:offset + limit]], len(ids)
+        # another sort order: partial sort of the matches only
+        matches = [find(pid) for pid in ids]
+        pick = nlargest if descending else nsmallest
+        key = attrgetter(RANGE_FIELDS.get(sort, sort), "patient_id")
+        return pick(offset + limit, matches, key=key)[offset:], len(matches)
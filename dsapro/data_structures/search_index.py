@@ -0,0 +1,233 @@
+# data_structures/search_index.py
+# Inverted index over patient name and disease words.
+# Every word maps to the set of patient IDs that contain it, and the words of
+# each field also sit in a trie, so a query word is expanded to matching index
+# words (exact, prefix, or within an edit distance) without looking at any
+# patient. A query ANDs its words and the doctor/age filters: candidates come
+# from whichever condition matches the fewest patients, and the remaining
+# conditions are checked on those candidates only.
+# Attached as a LinkedList listener, so register/update/delete/undo and
+# journal replay all keep it current.
+import re
+import heapq
+from typing import Dict, List, Optional, Set, Tuple
+
+INDEXED = ("name", "disease")
+COUNT_CAP = 1000  # matches are counted up to this many, then reported as "more than"
+END = ""  # trie key marking "a word ends here"
+_word = re.compile(r"\w+")
+
+
+def words(text) -> List[str]:
+    return _word.findall(str(text or "").lower())
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    # Levenshtein distance, cut off at limit + 1
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        if min(cur) > limit:
+            return limit + 1
+        prev = cur
+    return prev[-1]
+
+
+def fuzziness(word: str, fuzzy: int) -> int:
+    # edits allowed for this query word: short words stay exact so "al" doesn't match everything
+    return 0 if len(word) < 3 else min(fuzzy, 1 if len(word) < 6 else 2)
+
+
+class Trie:
+    def __init__(self):
+        self.root: Dict = {}
+
+    def add(self, word: str):
+        node = self.root
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[END] = True
+
+    def remove(self, word: str):
+        path = [self.root]
+        for ch in word:
+            node = path[-1].get(ch)
+            if node is None:
+                return
+            path.append(node)
+        path[-1].pop(END, None)
+        # prune nodes that no longer lead to any word
+        for i in range(len(word), 0, -1):
+            if path[i]:
+                break
+            del path[i - 1][word[i - 1]]
+
+    def _collect(self, node, prefix, res):
+        stack = [(node, prefix)]
+        while stack:
+            node, prefix = stack.pop()
+            for ch, child in node.items():
+                if ch == END:
+                    res.append(prefix)
+                else:
+                    stack.append((child, prefix + ch))
+
+    def with_prefix(self, prefix: str) -> List[str]:
+        node = self.root
+        for ch in prefix:
+            node = node.get(ch)
+            if node is None:
+                return []
+        res = []
+        self._collect(node, prefix, res)
+        return res
+
+    def within(self, word: str, limit: int) -> List[str]:
+        # words at edit distance <= limit: walk the trie carrying one DP row per
+        # node and skip subtrees whose best entry already exceeds the limit
+        res = []
+        stack = [(self.root, "", list(range(len(word) + 1)))]
+        while stack:
+            node, prefix, row = stack.pop()
+            if END in node and row[-1] <= limit:
+                res.append(prefix)
+            for ch, child in node.items():
+                if ch == END:
+                    continue
+                cur = [row[0] + 1]
+                for j, wc in enumerate(word, 1):
+                    cur.append(min(row[j] + 1, cur[j - 1] + 1, row[j - 1] + (wc != ch)))
+                if min(cur) <= limit:
+                    stack.append((child, prefix + ch, cur))
+        return res
+
+
+class SearchIndex:
+    def __init__(self):
+        self.tries = {f: Trie() for f in INDEXED}
+        self.postings: Dict[str, Dict[str, Set[int]]] = {f: {} for f in INDEXED}
+        self.linked_list = None
+        self.tree = None
+
+    def attach(self, linked_list, tree):
+        # index what is there now and follow every later change
+        self.linked_list = linked_list
+        self.tree = tree
+        self.clear()
+        for p in linked_list:
+            self.add(p)
+        linked_list.listeners.append(self.on_patient)
+
+    def clear(self):
+        self.tries = {f: Trie() for f in INDEXED}
+        self.postings = {f: {} for f in INDEXED}
+
+    def _add_field(self, field, value, pid):
+        postings = self.postings[field]
+        for w in set(words(value)):
+            ids = postings.get(w)
+            if ids is None:
+                ids = postings[w] = set()
+                self.tries[field].add(w)
+            ids.add(pid)
+
+    def _remove_field(self, field, value, pid):
+        postings = self.postings[field]
+        for w in set(words(value)):
+            ids = postings.get(w)
+            if ids is None:
+                continue
+            ids.discard(pid)
+            if not ids:
+                del postings[w]
+                self.tries[field].remove(w)
+
+    def add(self, patient):
+        for f in INDEXED:
+            self._add_field(f, getattr(patient, f), patient.patient_id)
+
+    def remove(self, patient):
+        for f in INDEXED:
+            self._remove_field(f, getattr(patient, f), patient.patient_id)
+
+    def on_patient(self, event, patient, old=None):
+        if event == "insert":
+            self.add(patient)
+        elif event == "delete":
+            self.remove(patient)
+        elif event == "update":
+            for f in INDEXED:
+                if f in old:
+                    self._remove_field(f, old[f], patient.patient_id)
+                    self._add_field(f, getattr(patient, f), patient.patient_id)
+
+    def expand(self, field: str, word: str, fuzzy: int = 0) -> List[str]:
+        # index words that a query word matches: prefix matches, plus near misses when fuzzy
+        found = self.tries[field].with_prefix(word)
+        k = fuzziness(word, fuzzy)
+        if k:
+            found = list(set(found).union(self.tries[field].within(word, k)))
+        return found
+
+    @staticmethod
+    def _matches(value, word, fuzzy) -> bool:
+        k = fuzziness(word, fuzzy)
+        return any(w.startswith(word) or (k and edit_distance(w, word, k) <= k) for w in words(value))
+
+    def search(self, text: str = "", name: str = "", disease: str = "", doctor: str = "",
+               age_min: Optional[int] = None, age_max: Optional[int] = None,
+               fuzzy: int = 0, limit: int = 50) -> Tuple[List, int]:
+        # (first `limit` matches by patient ID, number of matches up to COUNT_CAP + 1).
+        # text words may match name or disease; name/disease words only that field.
+        terms = [(INDEXED, w) for w in words(text)]
+        terms += [(("name",), w) for w in words(name)]
+        terms += [(("disease",), w) for w in words(disease)]
+
+        # candidate source: the most selective word, or the doctor's bucket if smaller
+        best, best_size, best_term = None, None, None
+        for term in terms:
+            fields, w = term
+            ids_by_word = [self.postings[f][t] for f in fields for t in self.expand(f, w, fuzzy)]
+            size = sum(len(ids) for ids in ids_by_word)
+            if best_size is None or size < best_size:
+                best, best_size, best_term = ids_by_word, size, term
+        doctor = doctor.strip()
+        if doctor:
+            bucket = self.tree.search(doctor)
+            if best_size is None or len(bucket) < best_size:
+                best, best_term = None, None
+        rest = [t for t in terms if t is not best_term]
+        if best is not None:
+            ids = set().union(*best)
+            find = self.linked_list.find_by_id
+            if not rest and not doctor and age_min is None and age_max is None:
+                # nothing left to check: no need to look at the patients at all
+                return [find(pid) for pid in heapq.nsmallest(limit, ids)], min(len(ids), COUNT_CAP + 1)
+            candidates = (find(pid) for pid in sorted(ids))
+        elif not doctor:
+            candidates = iter(self.linked_list)
+        else:
+            candidates = iter(bucket)
+
+        res, total = [], 0
+        for p in candidates:
+            if p is None:
+                continue
+            if doctor and p.doctor != doctor:
+                continue
+            if age_min is not None and p.age < age_min:
+                continue
+            if age_max is not None and p.age > age_max:
+                continue
+            if not all(any(self._matches(getattr(p, f), w, fuzzy) for f in fields) for fields, w in rest):
+                continue
+            total += 1
+            if len(res) < limit:
+                res.append(p)
+            elif total > COUNT_CAP:
+                break
+        return res, total
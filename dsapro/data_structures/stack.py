@@ -1,70 +1,220 @@
 # data_structures/stack.py
-from typing import List, Tuple, Optional
+import secrets
+import threading
+from collections import deque, OrderedDict
+from contextlib import contextmanager, nullcontext
+from typing import Optional
+
+# Undo stack actions (only what is needed to reverse the change):
+# ("add", patient_id) -> remove this patient on undo
+# ("delete", patient) -> put the removed Patient object back in its place on undo
+# ("update", patient_id, old_fields) -> put back the previous values of the changed fields
+# ("appointment_add", patient_id, handle) -> cancel that appointment
+# ("appointment_cancel", appointment) -> put the removed Appointment back in its place
+# ("booking_add", booking_id) -> cancel that time-slot booking
+# ("booking_cancel", booking) -> book the removed Booking's slot again
+# ("group", name, actions) -> a named transaction, undone/redone as one unit
+# Reversing an action yields its opposite (add <-> delete, update -> update
+# with the values it overwrote, ...), which is what goes on the redo stack.
+
+UNDO_DEPTH = 50       # actions kept per history; older ones fall off the bottom
+MAX_HISTORIES = 1000  # per-session histories kept on the server, least recently used dropped
+MAX_GROUP_ACTIONS = 10000  # a bigger group is not kept: it and everything before it can't be undone
+
+
+def changed_fields(patient, **new) -> dict:
+    # previous values of the fields that `new` would change
+    return {k: getattr(patient, k) for k, v in new.items() if getattr(patient, k) != v}
 
-# Undo stack actions:
-# ("add", patient_dict) -> remove this patient on undo
-# ("delete", patient_dict) -> re-add this patient on undo
-# ("update", old_patient_dict, new_patient_dict) -> revert to old on undo
-# ("appointment_add", patient_id) -> remove last appointment
 
 class UndoStack:
-    def __init__(self):
-        self.stack: List = []
+    def __init__(self, depth: int = UNDO_DEPTH):
+        self.stack = deque(maxlen=depth)
+        self.redo_stack = deque(maxlen=depth)
+        self.open_groups = []  # action lists of groups still being recorded, innermost last
 
     def push(self, item):
+        if self.open_groups:
+            actions = self.open_groups[-1]
+            if actions is not None:
+                if len(actions) < MAX_GROUP_ACTIONS:
+                    actions.append(item)
+                else:
+                    self.open_groups[-1] = None  # too big to keep; dropped when it closes
+            return
         self.stack.append(item)
+        self.redo_stack.clear()  # a new change invalidates anything undone before it
 
     def pop(self):
         return self.stack.pop() if self.stack else None
 
-    def undo(self, patients_linked_list, patient_tree, appointments_queue):
+    def is_empty(self) -> bool:
+        return len(self.stack) == 0
+
+    def can_redo(self) -> bool:
+        return len(self.redo_stack) > 0
+
+    @contextmanager
+    def group(self, name: str):
+        # everything pushed inside the block becomes one ("group", name, actions)
+        # entry; nested groups fold into the outermost one. A group of more than
+        # MAX_GROUP_ACTIONS is dropped along with the history before it, since
+        # undoing older actions past changes that stay could not be trusted
+        self.open_groups.append([])
+        try:
+            yield
+        finally:
+            actions = self.open_groups.pop()
+            if self.open_groups:
+                outer = self.open_groups[-1]
+                if actions is None or outer is None or len(outer) + len(actions) > MAX_GROUP_ACTIONS:
+                    self.open_groups[-1] = None
+                else:
+                    outer.extend(actions)
+            elif actions is None:
+                self.stack.clear()
+                self.redo_stack.clear()
+            elif actions:
+                self.push(("group", name, actions))
+
+    def undo(self, patients_linked_list, patient_tree, appointments_queue, scheduler=None):
         if not self.stack:
             print("Nothing to undo.")
             return
         action = self.pop()
-        typ = action[0]
-
-        if typ == "add":
-            patient_dict = action[1]
-            pid = patient_dict["patient_id"]
-            removed = patients_linked_list.delete_by_id(pid)
-            if removed:
-                # also remove from tree
-                patient_tree.remove(patient_dict["doctor"], pid)
-            print(f"Undo: removed patient ID {pid}")
-
-        elif typ == "delete":
-            patient_dict = action[1]
-            from patient import Patient
-            p = Patient(**patient_dict)
-            patients_linked_list.insert_end(p)
-            patient_tree.insert(p.doctor, patient_dict)
-            print(f"Undo: restored patient ID {p.patient_id}")
-
-        elif typ == "update":
-            old = action[1]
-            pid = old["patient_id"]
-            patients_linked_list.update_by_id(pid,
-                                             name=old["name"],
-                                             age=int(old["age"]),
-                                             disease=old["disease"],
-                                             doctor=old["doctor"])
-            # For simplicity, rebuild tree entries by deleting then re-inserting
-            patient_tree.rebuild_from_list(patients_linked_list.to_list())
-            print(f"Undo: reverted update for patient ID {pid}")
-
-        elif typ == "appointment_add":
-            pid = action[1]
-            # remove last occurrence of pid in queue (reverse search)
-            lst = appointments_queue.to_list()
-            if pid in lst:
-                # remove last occurrence
-                for i in range(len(lst)-1, -1, -1):
-                    if lst[i] == pid:
-                        lst.pop(i)
-                        break
-                appointments_queue.load_from_list(lst)
-                print(f"Undo: removed appointment for patient ID {pid}")
+        inverse = _reverse(action, patients_linked_list, patient_tree, appointments_queue, scheduler)
+        if inverse:
+            self.redo_stack.append(inverse)
+
+    def redo(self, patients_linked_list, patient_tree, appointments_queue, scheduler=None):
+        if not self.redo_stack:
+            print("Nothing to redo.")
+            return
+        action = self.redo_stack.pop()
+        inverse = _reverse(action, patients_linked_list, patient_tree, appointments_queue, scheduler, "Redo")
+        if inverse:
+            self.stack.append(inverse)
+
+
+def store_batch(store):
+    # one transaction (SQLite) or one journal flush for a whole group
+    if hasattr(store, "db"):
+        return store.db.batch()
+    if store.journal is not None:
+        return store.journal.batch()
+    return nullcontext()
+
+
+def _reverse(action, patients_linked_list, patient_tree, appointments_queue, scheduler=None,
+             label="Undo", quiet=False):
+    # apply the opposite of `action` and return the action that reverses that again
+    typ = action[0]
+    say = (lambda msg: None) if quiet else (lambda msg: print(f"{label}: {msg}"))
 
+    if typ == "group":
+        name, actions = action[1], action[2]
+        inverses = []
+        with store_batch(patients_linked_list):
+            for a in reversed(actions):
+                inv = _reverse(a, patients_linked_list, patient_tree, appointments_queue, scheduler,
+                               label, quiet=True)
+                if inv:
+                    inverses.append(inv)
+        say(f"{name} ({len(actions)} changes)")
+        return ("group", name, inverses)
+
+    if typ == "add":
+        pid = action[1]
+        removed = patients_linked_list.delete_by_id(pid)
+        if not removed:
+            return None
+        # also remove from tree
+        patient_tree.remove(removed.doctor, pid)
+        say(f"removed patient ID {pid}")
+        return ("delete", removed)
+
+    if typ == "delete":
+        p = action[1]
+        patients_linked_list.restore(p)
+        patient_tree.insert(p.doctor, p)
+        say(f"restored patient ID {p.patient_id}")
+        return ("add", p.patient_id)
+
+    if typ == "update":
+        pid, old = action[1], action[2]
+        current = patients_linked_list.find_by_id(pid)
+        if not current:
+            say(f"patient ID {pid} no longer exists")
+            return None
+        new = changed_fields(current, **old)
+        new_doctor = current.doctor
+        patients_linked_list.update_by_id(pid, **old)
+        patient_tree.move(new_doctor, old.get("doctor", new_doctor), current)
+        say(f"reverted update for patient ID {pid}")
+        return ("update", pid, new)
+
+    if typ == "appointment_add":
+        pid = action[1]
+        if len(action) > 2:
+            removed = appointments_queue.cancel(action[2])
         else:
-            print("Unknown undo action.")
\ No newline at end of file
+            removed = appointments_queue.remove_last(pid)
+        if not removed:
+            return None
+        say(f"removed appointment for patient ID {pid}")
+        return ("appointment_cancel", removed)
+
+    if typ == "appointment_cancel":
+        a = action[1]
+        handle = appointments_queue.enqueue(a.patient_id, a.priority, a.doctor, handle=a.handle)
+        say(f"restored appointment for patient ID {a.patient_id}")
+        return ("appointment_add", a.patient_id, handle)
+
+    if typ == "booking_add" and scheduler is not None:
+        b = scheduler.cancel(action[1])
+        if not b:
+            return None
+        say(f"cancelled booking #{b.booking_id}")
+        return ("booking_cancel", b)
+
+    if typ == "booking_cancel" and scheduler is not None:
+        b = action[1]
+        scheduler.book(b.patient_id, b.doctor, b.start, b.length, booking_id=b.booking_id)
+        say(f"restored booking #{b.booking_id}")
+        return ("booking_add", b.booking_id)
+
+    print("Unknown undo action.")
+    return None
+
+
+class UndoHistories:
+    """One UndoStack per browser session, looked up by an opaque token that is
+    all the session cookie has to carry. At most max_histories stacks of
+    `depth` actions are kept, so memory stays bounded however many sessions
+    come and go."""
+
+    def __init__(self, depth: int = UNDO_DEPTH, max_histories: int = MAX_HISTORIES):
+        self.depth = depth
+        self.max_histories = max_histories
+        self.histories: "OrderedDict[str, UndoStack]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.histories)
+
+    def get(self, token: Optional[str]) -> Optional[UndoStack]:
+        with self.lock:
+            stack = self.histories.get(token)
+            if stack is not None:
+                self.histories.move_to_end(token)
+            return stack
+
+    def create(self):
+        # new (token, stack); evicts the least recently used history when full
+        token = secrets.token_urlsafe(16)
+        stack = UndoStack(self.depth)
+        with self.lock:
+            self.histories[token] = stack
+            while len(self.histories) > self.max_histories:
+                self.histories.popitem(last=False)
+        return token, stack
@@ -1,67 +1,159 @@
-# data_structures/tree.py
-# A simple BST keyed by doctor name; each node contains a list of patient dicts for that doctor
+# A self-balancing (AVL) BST keyed by doctor name; each node contains the Patient records for that doctor
+# Height stays O(log d) even when doctors arrive in sorted order.
 
 class TreeNode:
     def __init__(self, doctor):
         self.doctor = doctor
-        self.patients = []  # list of patient dicts
+        # patient_id -> Patient (the same objects the linked list holds), kept in registration order
+        self.patients = {}
+        self.unsorted = False
         self.left = None
         self.right = None
+        self.height = 1
+
+def _height(node):
+    return node.height if node else 0
+
+def _fix_height(node):
+    node.height = 1 + max(_height(node.left), _height(node.right))
+
+def _rotate_right(node):
+    pivot = node.left
+    node.left = pivot.right
+    pivot.right = node
+    _fix_height(node)
+    _fix_height(pivot)
+    return pivot
+
+def _rotate_left(node):
+    pivot = node.right
+    node.right = pivot.left
+    pivot.left = node
+    _fix_height(node)
+    _fix_height(pivot)
+    return pivot
+
+def _rebalance(node):
+    _fix_height(node)
+    balance = _height(node.left) - _height(node.right)
+    if balance > 1:
+        if _height(node.left.left) < _height(node.left.right):
+            node.left = _rotate_left(node.left)
+        return _rotate_right(node)
+    if balance < -1:
+        if _height(node.right.right) < _height(node.right.left):
+            node.right = _rotate_right(node.right)
+        return _rotate_left(node)
+    return node
+
+def _add(node, patient):
+    bucket = node.patients
+    if bucket and not node.unsorted and patient.patient_id < next(reversed(bucket)):
+        # an older patient coming back (undo, reassignment); re-sort lazily on read
+        node.unsorted = True
+    bucket[patient.patient_id] = patient
+
+def _ordered(node):
+    if node.unsorted:
+        node.patients = dict(sorted(node.patients.items()))
+        node.unsorted = False
+    return list(node.patients.values())
+
+def _pop_min(node):
+    # detach the leftmost node of a subtree, returning (new subtree, detached node)
+    if not node.left:
+        return node.right, node
+    node.left, smallest = _pop_min(node.left)
+    return _rebalance(node), smallest
 
 class PatientTree:
     def __init__(self):
         self.root = None
 
-    def insert(self, doctor: str, patient_dict: dict):
-        if not self.root:
-            node = TreeNode(doctor)
-            node.patients.append(patient_dict)
-            self.root = node
+    def insert(self, doctor: str, patient):
+        node = self._find(doctor)
+        if node:
+            # known doctor: no structural change, skip the rebalancing walk
+            _add(node, patient)
             return
+        self.root = self._insert(self.root, doctor, patient)
 
-        cur = self.root
-        while True:
-            if doctor == cur.doctor:
-                cur.patients.append(patient_dict)
-                return
-            elif doctor < cur.doctor:
-                if cur.left:
-                    cur = cur.left
-                else:
-                    cur.left = TreeNode(doctor)
-                    cur.left.patients.append(patient_dict)
-                    return
-            else:
-                if cur.right:
-                    cur = cur.right
-                else:
-                    cur.right = TreeNode(doctor)
-                    cur.right.patients.append(patient_dict)
-                    return
+    def _insert(self, node, doctor, patient):
+        if not node:
+            node = TreeNode(doctor)
+            _add(node, patient)
+            return node
+        if doctor == node.doctor:
+            _add(node, patient)
+            return node
+        elif doctor < node.doctor:
+            node.left = self._insert(node.left, doctor, patient)
+        else:
+            node.right = self._insert(node.right, doctor, patient)
+        return _rebalance(node)
 
-    def search(self, doctor: str):
+    def _find(self, doctor: str):
         cur = self.root
         while cur:
             if doctor == cur.doctor:
-                return cur.patients.copy()
+                return cur
             elif doctor < cur.doctor:
                 cur = cur.left
             else:
                 cur = cur.right
-        return []
+        return None
+
+    def search(self, doctor: str):
+        node = self._find(doctor)
+        return _ordered(node) if node else []
+
+    def contains(self, doctor: str, patient_id: int) -> bool:
+        node = self._find(doctor)
+        return bool(node) and patient_id in node.patients
 
     def remove(self, doctor: str, patient_id: int):
-        # find node
-        cur = self.root
-        while cur:
-            if doctor == cur.doctor:
-                cur.patients = [p for p in cur.patients if p["patient_id"] != patient_id]
-                return True
-            elif doctor < cur.doctor:
-                cur = cur.left
-            else:
-                cur = cur.right
-        return False
+        cur = self._find(doctor)
+        if not cur or cur.patients.pop(patient_id, None) is None:
+            return False
+        if not cur.patients:
+            # don't leave dead doctor keys behind
+            self.root = self._delete(self.root, doctor)
+        return True
+
+    def _delete(self, node, doctor):
+        if not node:
+            return None
+        if doctor < node.doctor:
+            node.left = self._delete(node.left, doctor)
+        elif doctor > node.doctor:
+            node.right = self._delete(node.right, doctor)
+        else:
+            if not node.left:
+                return node.right
+            if not node.right:
+                return node.left
+            right, successor = _pop_min(node.right)
+            successor.left = node.left
+            successor.right = right
+            node = successor
+        return _rebalance(node)
+
+    def refresh(self, doctor: str, patient):
+        # buckets hold references, so field edits show up on their own;
+        # this only swaps in a different object that reuses the same ID
+        cur = self._find(doctor)
+        if not cur or patient.patient_id not in cur.patients:
+            return False
+        cur.patients[patient.patient_id] = patient
+        return True
+
+    def move(self, old_doctor: str, new_doctor: str, patient):
+        if old_doctor == new_doctor:
+            if not self.refresh(new_doctor, patient):
+                self.insert(new_doctor, patient)
+            return
+        self.remove(old_doctor, patient.patient_id)
+        self.insert(new_doctor, patient)
 
     def inorder(self, node=None, res=None):
         if res is None:
@@ -72,13 +164,52 @@ class PatientTree:
             return res
         if node.left:
             self.inorder(node.left, res)
-        res.append((node.doctor, node.patients.copy()))
+        res.append((node.doctor, _ordered(node)))
         if node.right:
             self.inorder(node.right, res)
         return res
 
+    def doctors(self):
+        # doctor names in order, without touching the patient buckets
+        res = []
+        stack, node = [], self.root
+        while stack or node:
+            while node:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            res.append(node.doctor)
+            node = node.right
+        return res
+
+    def range_search(self, low: str, high: str):
+        # all (doctor, patients) with low <= doctor <= high, in name order;
+        # high also matches names it prefixes, so ("A", "F") includes "Fatima"
+        res = []
+        self._range(self.root, low, high + "\uffff", res)
+        return res
+
+    def _range(self, node, low, high, res):
+        if not node:
+            return
+        if low < node.doctor:
+            self._range(node.left, low, high, res)
+        if low <= node.doctor <= high:
+            res.append((node.doctor, _ordered(node)))
+        if node.doctor < high:
+            self._range(node.right, low, high, res)
+
+    def prefix_search(self, prefix: str):
+        return self.range_search(prefix, prefix)
+
+    def depth(self):
+        return _height(self.root)
+
+    def clear(self):
+        self.root = None
+
     def rebuild_from_list(self, patient_list):
-        # patient_list: list of patient dicts
+        # patient_list: iterable of Patient objects
         self.root = None
         for p in patient_list:
-            self.insert(p["doctor"], p)
\ No newline at end of file
+            self.insert(p.doctor, p)
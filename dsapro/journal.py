@@ -0,0 +1,194 @@
+# journal.py
+# Append-only write-ahead log of every change made since the last snapshot.
+# patients.csv / appointments.csv / bookings.csv are the snapshot; on startup the journal
+# tail is replayed on top of them, so a crash loses nothing that was logged.
+import os
+import io
+import json
+import threading
+from contextlib import contextmanager
+from patient import Patient
+
+COMPACT_EVERY = 5000  # records before the journal is folded into a fresh snapshot
+
+
+class Journal:
+    def __init__(self, path: str, compact_every: int = COMPACT_EVERY):
+        self.path = path
+        self.compact_every = compact_every
+        self.records = 0
+        self.gen = 0  # bumped on every compaction; snapshots record the gen they were cut at
+        self.skipped = False
+        self.snapshot = None  # callable snapshot(gen) that writes a full snapshot
+        self.linked_list = None
+        # compact inline once due; callers that guard the structures with their own
+        # locks turn this off and call compact() themselves when `due` is set
+        self.auto_compact = True
+        self.f = None
+        self.lock = threading.Lock()  # patient and queue events may come from different threads
+        self.deferred = 0  # > 0 inside batch(): records are flushed once at the end
+
+    @property
+    def due(self) -> bool:
+        return self.snapshot is not None and self.records >= self.compact_every
+
+    def _write(self, record):
+        with self.lock:
+            self._append(record)
+        if self.auto_compact and self.due:
+            self.compact()
+
+    def _append(self, record):
+        if self.f is None:
+            self.f = open(self.path, "a+", encoding="utf-8")
+            if self.f.tell() > 0:
+                self.f.seek(self.f.tell() - 1)
+                if self.f.read(1) != "\n":
+                    self.f.write("\n")  # terminate a torn record left by a crash
+        self.f.write(json.dumps(record, separators=(",", ":")) + "\n")
+        # flush to the OS on every record: a killed process loses nothing
+        if not self.deferred:
+            self.f.flush()
+        self.records += 1
+
+    @contextmanager
+    def batch(self):
+        # many records for one operation (e.g. undoing a group): flush them together
+        self.deferred += 1
+        try:
+            yield
+        finally:
+            self.deferred -= 1
+            if not self.deferred:
+                with self.lock:
+                    if self.f:
+                        self.f.flush()
+
+    def on_patient(self, event, patient, old=None):
+        if event == "insert":
+            self._write(["reg", patient.patient_id, patient.name, patient.age,
+                         patient.disease, patient.doctor, patient.registered_at])
+        elif event == "update":
+            self._write(["upd", patient.patient_id, {k: getattr(patient, k) for k in old}])
+        elif event == "delete":
+            self._write(["del", patient.patient_id])
+
+    def on_appointment(self, event, appt):
+        if event == "enqueue":
+            self._write(["book", appt.patient_id, appt.handle, appt.priority, appt.doctor])
+        elif event == "dequeue":
+            self._write(["serve", appt.handle])
+        elif event == "cancel":
+            self._write(["drop", appt.handle])
+        elif event == "reschedule":
+            self._write(["prio", appt.handle, appt.priority])
+
+    def on_booking(self, event, booking):
+        if event == "book":
+            self._write(["slot", booking.booking_id, booking.patient_id, booking.doctor,
+                         booking.start, booking.length])
+        elif event == "cancel":
+            self._write(["unslot", booking.booking_id])
+
+    def attach(self, linked_list, appts, snapshot=None, scheduler=None):
+        self.snapshot = snapshot
+        self.linked_list = linked_list
+        linked_list.listeners.append(self.on_patient)
+        linked_list.journal = self
+        appts.listeners.append(self.on_appointment)
+        if scheduler is not None:
+            scheduler.listeners.append(self.on_booking)
+
+    def sync(self):
+        # make everything logged so far durable on disk
+        with self.lock:
+            if self.f:
+                self.f.flush()
+                os.fsync(self.f.fileno())
+
+    def compact(self):
+        with self.lock:
+            gen = self.gen + 1
+            self.snapshot(gen)
+            self.reset(gen)
+
+    def reset(self, gen: int = None):
+        if self.f:
+            self.f.close()
+            self.f = None
+        if gen is not None:
+            self.gen = gen
+        # the header also carries the highest patient ID handed out: a snapshot only
+        # holds the patients still there, and deleted IDs must not be handed out again
+        header = ["gen", self.gen]
+        if self.linked_list is not None:
+            header.append(self.linked_list.last_id)
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(header) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.records = 0
+        self.skipped = False
+
+    def replay(self, linked_list, appts, patients_gen: int = 0, appts_gen: int = 0,
+               scheduler=None, bookings_gen: int = 0) -> int:
+        # apply the logged tail to freshly loaded structures (before attach);
+        # records are only replayed onto a snapshot cut at the journal's own gen
+        count = 0
+        try:
+            f = open(self.path, encoding="utf-8")
+        except FileNotFoundError:
+            f = io.StringIO()
+        with f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue  # torn write from a crash
+                op = rec[0]
+                if op == "gen":
+                    self.gen = rec[1]
+                    if len(rec) > 2:
+                        linked_list.last_id = max(linked_list.last_id, rec[2])
+                    continue
+                if op in ("reg", "upd", "del"):
+                    base = patients_gen
+                elif op in ("slot", "unslot"):
+                    if scheduler is None:
+                        continue
+                    base = bookings_gen
+                else:
+                    base = appts_gen
+                if base != self.gen:
+                    continue
+                if op == "reg":
+                    # new IDs append; an undone delete goes back in its place
+                    linked_list.restore(Patient(*rec[1:]))
+                elif op == "upd":
+                    linked_list.update_by_id(rec[1], **rec[2])
+                elif op == "del":
+                    linked_list.delete_by_id(rec[1])
+                elif op == "book":
+                    appts.enqueue(rec[1], rec[3], rec[4], handle=rec[2])
+                elif op == "serve":
+                    appts.serve(rec[1])
+                elif op == "drop":
+                    appts.cancel(rec[1])
+                elif op == "prio":
+                    appts.reschedule(rec[1], rec[2])
+                elif op == "slot":
+                    scheduler.book(*rec[2:], booking_id=rec[1])
+                elif op == "unslot":
+                    scheduler.cancel(rec[1])
+                # records written before appointments had handles
+                elif op == "enq":
+                    appts.enqueue(rec[1])
+                elif op == "deq":
+                    appts.dequeue()
+                elif op == "cnl":
+                    appts.remove_last(rec[1])
+                count += 1
+        self.records = count
+        self.skipped = patients_gen != self.gen or appts_gen != self.gen or (
+            scheduler is not None and bookings_gen != self.gen)
+        return count
@@ -1,16 +1,39 @@
 # main.py
+# Interactive menu over the data files, plus in-memory benchmarks:
+#
+#   python main.py
+#   python main.py bench tree --rows 100000
 import os
 import csv
-from patient import Patient
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+from datetime import datetime
+from patient import Patient, validate
 from data_structures.linked_list import LinkedList
-from data_structures.queue import AppointmentQueue
-from data_structures.stack import UndoStack
+from data_structures.queue import AppointmentQueue, TRIAGE_LEVELS
+from data_structures.stack import UndoStack, changed_fields, store_batch
 from data_structures.tree import PatientTree
-from billing import calculate_bill
+from data_structures.search_index import SearchIndex, COUNT_CAP
+from data_structures.calendar import Scheduler, SlotConflict, slot_of, next_slot
+from billing import calculate_bill, Ledger
+from journal import Journal
+from snapshot import write_snapshot, load_latest
+import columnar
 
 DATA_DIR = "data"
 PATIENTS_FILE = os.path.join(DATA_DIR, "patients.csv")
 APPTS_FILE = os.path.join(DATA_DIR, "appointments.csv")
+BOOKINGS_FILE = os.path.join(DATA_DIR, "bookings.csv")
+BOOKING_FIELDS = ["booking_id", "patient_id", "doctor", "starts_at", "length"]
+JOURNAL_FILE = os.path.join(DATA_DIR, "journal.log")
+LEDGER_FILE = os.path.join(DATA_DIR, "ledger.ndjson")
+PATIENTS_BIN = os.path.join(DATA_DIR, "patients.bin")
+PATIENT_FIELDS = ["patient_id","name","age","disease","doctor","registered_at"]
+# "csv" (default) or "binary": which format snapshots of the roster are written in
+SNAPSHOT_FORMAT = os.environ.get("PMS_SNAPSHOT_FORMAT", "csv")
 
 def ensure_data_files():
     os.makedirs(DATA_DIR, exist_ok=True)
@@ -23,68 +46,96 @@ def ensure_data_files():
             writer = csv.writer(f)
             writer.writerow(["patient_id"])  # header
 
-def save_patients(linked_list: LinkedList):
-    arr = linked_list.to_list()
-    with open(PATIENTS_FILE, "w", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=["patient_id","name","age","disease","doctor","registered_at"])
-        writer.writeheader()
-        for d in arr:
-            writer.writerow(d)
+def save_patients(linked_list: LinkedList, gen: int = 0):
+    if SNAPSHOT_FORMAT == "binary":
+        columnar.write_columnar(PATIENTS_BIN, linked_list, gen)
+        return
+    rows = ([p.patient_id, p.name, p.age, p.disease, p.doctor, p.registered_at] for p in linked_list)
+    write_snapshot(PATIENTS_FILE, PATIENT_FIELDS, rows, gen)
 
-def load_patients(linked_list: LinkedList):
-    arr = []
-    try:
-        with open(PATIENTS_FILE, newline="") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if row and row["patient_id"]:
-                    row["patient_id"] = int(row["patient_id"])
-                    row["age"] = int(row["age"])
-                    arr.append(row)
-    except FileNotFoundError:
-        return
-    linked_list.load_from_list(arr)
-
-def save_appointments(appts: AppointmentQueue):
-    lst = appts.to_list()
-    with open(APPTS_FILE, "w", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow(["patient_id"])
-        for pid in lst:
-            writer.writerow([pid])
+def _fill(linked_list: LinkedList, tree: PatientTree, patients):
+    # swap a fully read snapshot in; the live structures are only touched once
+    # every row has parsed, so a damaged generation leaves nothing half-loaded
+    linked_list.clear()
+    if tree:
+        tree.clear()
+    linked_list.insert_many(patients)
+    if tree:
+        for p in patients:
+            tree.insert(p.doctor, p)
+
+def load_patients(linked_list: LinkedList, tree: PatientTree = None):
+    # one pass over the snapshot: each row becomes one Patient (no list of dicts
+    # in between), collected into a list that _fill swaps in once the whole
+    # generation has read and verified, so peak memory is one roster of Patients
+    # plus the structures being replaced. The Patients are shared by the list and
+    # the doctor index. Returns the snapshot generation that was loaded (None if
+    # there is none)
+    if SNAPSHOT_FORMAT == "binary" and os.path.exists(PATIENTS_BIN):
+        return columnar.load_latest(PATIENTS_BIN, lambda snap: _fill(linked_list, tree, list(snap)))
+
+    def consume(reader):
+        rows = iter(reader)
+        header = next(rows, None)
+        if not header:
+            _fill(linked_list, tree, [])
+            return
+        col = [header.index(f) for f in PATIENT_FIELDS]
+        i_id, i_name, i_age, i_disease, i_doctor, i_reg = col
+        patients = [Patient(int(row[i_id]), row[i_name], int(row[i_age]), row[i_disease], row[i_doctor], row[i_reg])
+                    for row in rows if row and row[i_id]]
+        _fill(linked_list, tree, patients)
+    return load_latest(PATIENTS_FILE, consume)
+
+def save_appointments(appts: AppointmentQueue, gen: int = 0):
+    rows = ([a.patient_id, a.priority, a.doctor or "", a.handle] for a in appts.appointments())
+    write_snapshot(APPTS_FILE, ["patient_id", "priority", "doctor", "handle"], rows, gen)
 
 def load_appointments(appts: AppointmentQueue):
-    arr = []
-    try:
-        with open(APPTS_FILE, newline="") as f:
-            reader = csv.reader(f)
-            header = next(reader, None)
-            for row in reader:
-                if row:
-                    arr.append(int(row[0]))
-    except FileNotFoundError:
-        return
-    appts.load_from_list(arr)
+    def consume(reader):
+        arr = []
+        rows = iter(reader)
+        header = next(rows, None)
+        for row in rows:
+            if not row:
+                continue
+            if len(row) >= 4:
+                arr.append((int(row[0]), int(row[1]), row[2] or None, int(row[3])))
+            else:
+                arr.append(int(row[0]))  # older snapshot: patient IDs only, FIFO
+        appts.load_from_list(arr)
+    return load_latest(APPTS_FILE, consume)
+
+def save_bookings(scheduler: Scheduler, gen: int = 0):
+    rows = ([b.booking_id, b.patient_id, b.doctor, b.starts_at.strftime("%Y-%m-%d %H:%M"), b.length]
+            for b in scheduler.to_list())
+    write_snapshot(BOOKINGS_FILE, BOOKING_FIELDS, rows, gen)
+
+def load_bookings(scheduler: Scheduler):
+    def consume(reader):
+        rows = iter(reader)
+        next(rows, None)
+        scheduler.load_from_list([
+            (int(row[0]), int(row[1]), row[2], slot_of(datetime.strptime(row[3], "%Y-%m-%d %H:%M")), int(row[4]))
+            for row in rows if row])
+    return load_latest(BOOKINGS_FILE, consume)
 
 def next_id(linked_list: LinkedList):
-    m = linked_list.get_max_id()
-    return m + 1
+    return linked_list.allocate_id()
 
 def register_patient(linked_list: LinkedList, tree: PatientTree, undo_stack: UndoStack):
     try:
-        name = input("Enter patient name: ").strip()
-        age = int(input("Enter age: ").strip())
-        disease = input("Enter disease: ").strip()
-        doctor = input("Enter assigned doctor: ").strip()
-    except Exception as e:
-        print("Invalid input. Registration cancelled.")
+        name, age, disease, doctor = validate(input("Enter patient name: "), input("Enter age: "),
+                                              input("Enter disease: "), input("Enter assigned doctor: "))
+    except ValueError as e:
+        print(f"{e} Registration cancelled.")
         return
 
     pid = next_id(linked_list)
     p = Patient(patient_id=pid, name=name, age=age, disease=disease, doctor=doctor)
     linked_list.insert_end(p)
-    tree.insert(doctor, p.to_dict())
-    undo_stack.push(("add", p.to_dict()))
+    tree.insert(doctor, p)
+    undo_stack.push(("add", p.patient_id))
     print(f"✅ Patient registered with ID {p.patient_id}")
 
 def view_patients(linked_list: LinkedList):
@@ -105,11 +156,37 @@ def schedule_appointment(appts: AppointmentQueue, linked_list: LinkedList, undo_
     if not patient:
         print("Patient ID not found.")
         return
-    appts.enqueue(pid)
-    undo_stack.push(("appointment_add", pid))
-    print(f"Appointment scheduled for {patient.name} (ID {pid})")
+    level = input(f"Triage level {list(TRIAGE_LEVELS)} [routine]: ").strip().lower() or "routine"
+    priority = TRIAGE_LEVELS.get(level, 0)
+    handle = appts.enqueue(pid, priority, patient.doctor)
+    undo_stack.push(("appointment_add", pid, handle))
+    print(f"Appointment scheduled for {patient.name} (ID {pid}), "
+          f"#{appts.position(handle, per_doctor=True)} in line for {patient.doctor}")
 
-def next_appointment(appts: AppointmentQueue, linked_list: LinkedList):
+def book_slot(scheduler: Scheduler, linked_list: LinkedList, undo_stack: UndoStack):
+    try:
+        pid = int(input("Enter patient ID to book: ").strip())
+    except:
+        print("Invalid ID.")
+        return
+    patient = linked_list.find_by_id(pid)
+    if not patient:
+        print("Patient ID not found.")
+        return
+    when = input("Start (YYYY-MM-DD HH:MM) [next free slot]: ").strip()
+    try:
+        if when:
+            start = slot_of(datetime.strptime(when, "%Y-%m-%d %H:%M"))
+        else:
+            start = scheduler.next_free(patient.doctor, next_slot(datetime.now()))
+        b = scheduler.book(pid, patient.doctor, start)
+    except (ValueError, SlotConflict) as e:
+        print(f"Could not book: {e}")
+        return
+    undo_stack.push(("booking_add", b.booking_id))
+    print(f"Booked #{b.booking_id}: {patient.name} with {b.doctor} at {b.starts_at:%Y-%m-%d %H:%M}")
+
+def next_appointment(appts: AppointmentQueue, linked_list: LinkedList, ledger: Ledger = None):
     pid = appts.dequeue()
     if pid is None:
         print("No appointments.")
@@ -117,12 +194,17 @@ def next_appointment(appts: AppointmentQueue, linked_list: LinkedList):
     p = linked_list.find_by_id(pid)
     if p:
         print(f"➡️ Next appointment: {p.name} (ID {pid}), Doctor: {p.doctor}")
-        # quick billing demo
-        base = float(input("Enter base fee for billing (or 0): ") or 0)
-        tests = float(input("Tests cost (or 0): ") or 0)
-        meds = float(input("Medicine cost (or 0): ") or 0)
-        total = calculate_bill(base, tests, meds)
-        print(f"Total bill: {total}")
+        base = input("Enter base fee for billing (or 0): ").strip() or 0
+        tests = input("Tests cost (or 0): ").strip() or 0
+        meds = input("Medicine cost (or 0): ").strip() or 0
+        try:
+            if ledger is None:
+                print(f"Total bill: {calculate_bill(base, tests, meds)}")
+            else:
+                inv = ledger.bill(pid, p.doctor, base, tests, meds)
+                print(f"Invoice #{inv.invoice_id}: {inv.amount()}")
+        except ValueError as e:
+            print(f"Not billed: {e}")
     else:
         print(f"Patient ID {pid} not found in records.")
 
@@ -134,7 +216,19 @@ def search_by_doctor(tree: PatientTree):
         return
     print(f"Patients under Dr. {doc}:")
     for p in res:
-        print(f"ID: {p['patient_id']} | Name: {p['name']} | Age: {p['age']} | Disease: {p['disease']} | Registered: {p['registered_at']}")
+        print(f"ID: {p.patient_id} | Name: {p.name} | Age: {p.age} | Disease: {p.disease} | Registered: {p.registered_at}")
+
+def find_patients(index: SearchIndex):
+    text = input("Name/disease words (end with ~ to allow typos): ").strip()
+    doc = input("Doctor (optional): ").strip()
+    fuzzy = 2 if text.endswith("~") else 0
+    res, total = index.search(text.rstrip("~"), doctor=doc, fuzzy=fuzzy, limit=20)
+    if not res:
+        print("No matching patients.")
+        return
+    print(f"{f'{COUNT_CAP}+' if total > COUNT_CAP else total} matching patients, showing {len(res)}:")
+    for p in res:
+        print(f"ID: {p.patient_id} | Name: {p.name} | Age: {p.age} | Disease: {p.disease} | Doctor: {p.doctor}")
 
 def delete_patient(linked_list: LinkedList, tree: PatientTree, undo_stack: UndoStack):
     try:
@@ -146,10 +240,9 @@ def delete_patient(linked_list: LinkedList, tree: PatientTree, undo_stack: UndoS
     if not patient:
         print("ID not found.")
         return
-    # store for undo
-    undo_stack.push(("delete", patient.to_dict()))
     removed = linked_list.delete_by_id(pid)
     tree.remove(removed.doctor, pid)
+    undo_stack.push(("delete", removed))
     print(f"Patient ID {pid} deleted.")
 
 def update_patient(linked_list: LinkedList, tree: PatientTree, undo_stack: UndoStack):
@@ -162,37 +255,103 @@ def update_patient(linked_list: LinkedList, tree: PatientTree, undo_stack: UndoS
     if not p:
         print("Patient not found.")
         return
-    old = p.to_dict()
     print("Press enter to keep current value.")
-    name = input(f"Name [{p.name}]: ").strip() or p.name
-    age_in = input(f"Age [{p.age}]: ").strip()
-    age = int(age_in) if age_in else p.age
-    disease = input(f"Disease [{p.disease}]: ").strip() or p.disease
-    doctor = input(f"Doctor [{p.doctor}]: ").strip() or p.doctor
+    try:
+        name, age, disease, doctor = validate(input(f"Name [{p.name}]: ").strip() or p.name,
+                                              input(f"Age [{p.age}]: ").strip() or p.age,
+                                              input(f"Disease [{p.disease}]: ").strip() or p.disease,
+                                              input(f"Doctor [{p.doctor}]: ").strip() or p.doctor)
+    except ValueError as e:
+        print(f"{e} Update cancelled.")
+        return
 
+    old = changed_fields(p, name=name, age=age, disease=disease, doctor=doctor)
+    if not old:
+        print("Nothing changed.")
+        return
     linked_list.update_by_id(pid, name=name, age=age, disease=disease, doctor=doctor)
-    # rebuild tree safely
-    tree.rebuild_from_list(linked_list.to_list())
-    undo_stack.push(("update", old))
+    tree.move(old.get("doctor", doctor), doctor, p)
+    undo_stack.push(("update", pid, old))
     print("Patient updated.")
 
     
 
-def undo_action(undo_stack: UndoStack, linked_list: LinkedList, tree: PatientTree, appts: AppointmentQueue):
-    undo_stack.undo(linked_list, tree, appts)
+def undo_action(undo_stack: UndoStack, linked_list: LinkedList, tree: PatientTree, appts: AppointmentQueue,
+                scheduler: Scheduler = None):
+    undo_stack.undo(linked_list, tree, appts, scheduler)
+
+def redo_action(undo_stack: UndoStack, linked_list: LinkedList, tree: PatientTree, appts: AppointmentQueue,
+                scheduler: Scheduler = None):
+    undo_stack.redo(linked_list, tree, appts, scheduler)
+
+def reassign_doctor(linked_list: LinkedList, tree: PatientTree, undo_stack: UndoStack, old: str, new: str) -> int:
+    # move every patient of `old` to `new` as one undoable group; returns how many moved
+    patients = tree.search(old)
+    with undo_stack.group(f"reassign {old} -> {new}"), store_batch(linked_list):
+        for p in patients:
+            changed = changed_fields(p, doctor=new)
+            if changed:
+                linked_list.update_by_id(p.patient_id, doctor=new)
+                tree.move(old, new, p)
+                undo_stack.push(("update", p.patient_id, changed))
+    return len(patients)
 
    
 
 
-def save_all(linked_list: LinkedList, appts: AppointmentQueue):
-    save_patients(linked_list)
-    save_appointments(appts)
+def save_snapshot(linked_list: LinkedList, appts: AppointmentQueue, gen: int = 0, scheduler: Scheduler = None):
+    save_patients(linked_list, gen)
+    save_appointments(appts, gen)
+    if scheduler is not None:
+        save_bookings(scheduler, gen)
+
+def save_all(linked_list: LinkedList, appts: AppointmentQueue, scheduler: Scheduler = None, ledger: Ledger = None):
+    # with a journal attached every change is already on disk; just make it durable
+    if linked_list.journal:
+        linked_list.journal.sync()
+    else:
+        save_snapshot(linked_list, appts, scheduler=scheduler)
+    if ledger is not None:
+        ledger.sync()
     print("Data saved to disk.")
 
-def load_all(linked_list: LinkedList, tree: PatientTree, appts: AppointmentQueue):
-    load_patients(linked_list)
-    tree.rebuild_from_list(linked_list.to_list())
-    load_appointments(appts)
+def load_all(linked_list: LinkedList, tree: PatientTree, appts: AppointmentQueue, scheduler: Scheduler = None):
+    patients_gen = load_patients(linked_list, tree)
+    appts_gen = load_appointments(appts)
+    bookings_gen = load_bookings(scheduler) if scheduler is not None else None
+    journal = Journal(JOURNAL_FILE)
+
+    # keep the doctor index in step while the journal tail is replayed
+    def index(event, patient, old):
+        if event == "insert":
+            tree.insert(patient.doctor, patient)
+        elif event == "delete":
+            tree.remove(patient.doctor, patient.patient_id)
+        elif "doctor" in old:
+            tree.move(old["doctor"], patient.doctor, patient)
+    linked_list.listeners.append(index)
+    journal.replay(linked_list, appts, patients_gen or 0, appts_gen or 0, scheduler, bookings_gen or 0)
+    linked_list.listeners.remove(index)
+    journal.attach(linked_list, appts, snapshot=lambda gen: save_snapshot(linked_list, appts, gen, scheduler),
+                   scheduler=scheduler)
+    if journal.skipped:
+        # a snapshot and the journal disagree (crash mid-compaction or a damaged file);
+        # write a consistent pair now so new records aren't replayed onto the wrong base
+        journal.compact()
+
+def load_sqlite(linked_list, tree, appts, scheduler=None):
+    # first start on a new database: import the existing snapshots and journal once.
+    # Runs inside one write transaction, so with several workers starting together
+    # only the first does the import and the rest see the flag.
+    with linked_list.db.batch() as conn:
+        if conn.execute("SELECT value FROM meta WHERE key = 'imported'").fetchone()[0]:
+            return
+        conn.execute("UPDATE meta SET value = 1 WHERE key = 'imported'")
+        patients_gen = load_patients(linked_list, tree)
+        appts_gen = load_appointments(appts)
+        bookings_gen = load_bookings(scheduler) if scheduler is not None else None
+        Journal(JOURNAL_FILE).replay(linked_list, appts, patients_gen or 0, appts_gen or 0,
+                                     scheduler, bookings_gen or 0)
 
 def main():
     ensure_data_files()
@@ -200,8 +359,14 @@ def main():
     appointments = AppointmentQueue()
     undo_stack = UndoStack()
     patient_tree = PatientTree()
+    scheduler = Scheduler()
 
-    load_all(patients, patient_tree, appointments)
+    load_all(patients, patient_tree, appointments, scheduler)
+    search_index = SearchIndex()
+    search_index.attach(patients, patient_tree)
+    ledger = Ledger(LEDGER_FILE)
+    ledger.load()
+    ledger.attach(appointments)  # every serve becomes an unbilled visit
 
     while True:
         print("\n---  Patient Management System ---")
@@ -214,6 +379,10 @@ def main():
         print("7. Delete Patient")
         print("8. Undo Last Action")
         print("9. Save Data")
+        print("10. Book Time Slot")
+        print("11. Redo")
+        print("12. Reassign Doctor's Patients")
+        print("13. Find Patients by Name/Disease")
         print("0. Exit")
         choice = input("Choice: ").strip()
 
@@ -224,7 +393,7 @@ def main():
         elif choice == "3":
             schedule_appointment(appointments, patients, undo_stack)
         elif choice == "4":
-            next_appointment(appointments, patients)
+            next_appointment(appointments, patients, ledger)
         elif choice == "5":
             search_by_doctor(patient_tree)
         elif choice == "6":
@@ -232,15 +401,90 @@ def main():
         elif choice == "7":
             delete_patient(patients, patient_tree, undo_stack)
         elif choice == "8":
-            undo_action(undo_stack, patients, patient_tree, appointments)
+            undo_action(undo_stack, patients, patient_tree, appointments, scheduler)
         elif choice == "9":
-            save_all(patients, appointments)
+            save_all(patients, appointments, scheduler, ledger)
+        elif choice == "10":
+            book_slot(scheduler, patients, undo_stack)
+        elif choice == "11":
+            redo_action(undo_stack, patients, patient_tree, appointments, scheduler)
+        elif choice == "12":
+            old = input("Current doctor: ").strip()
+            new = input("New doctor: ").strip()
+            if old and new:
+                print(f"Reassigned {reassign_doctor(patients, patient_tree, undo_stack, old, new)} patients.")
+        elif choice == "13":
+            find_patients(search_index)
         elif choice == "0":
-            save_all(patients, appointments)
+            save_all(patients, appointments, scheduler, ledger)
             print("Goodbye.")
             break
         else:
             print("Invalid choice.")
 
+def bench_tree(rows: int, lookups: int = 100_000):
+    # doctor index depth and per-operation time with `rows` doctors (one patient
+    # each) arriving in name order, as from a CSV sorted by doctor, and shuffled
+    names = [f"Dr {i:07d}" for i in range(rows)]
+    for label, order in (("sorted", names), ("random", random.sample(names, rows))):
+        patients = [Patient(i, "Patient", 30, "Flu", doctor) for i, doctor in enumerate(order, 1)]
+        tree = PatientTree()
+        t0 = time.perf_counter()
+        for p in patients:
+            tree.insert(p.doctor, p)
+        t1 = time.perf_counter()
+        for doctor in random.choices(names, k=lookups):
+            tree.search(doctor)
+        t2 = time.perf_counter()
+        print(f"{label}: {rows} doctors, depth {tree.depth()}, "
+              f"insert {(t1 - t0) / rows * 1e6:.1f} us, search {(t2 - t1) / lookups * 1e6:.1f} us")
+
+def bench_memory(rows: int):
+    # bytes per patient held by `rows` patients in the list and doctor index
+    # (Patient objects and their strings included), as load_patients leaves them
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    patients = [Patient(i, f"Patient {i}", i % 90 + 1, f"Disease {i % 40}", f"Dr {i % 500}",
+                        "2024-01-01 10:00:00") for i in range(1, rows + 1)]
+    records = tracemalloc.get_traced_memory()[0]
+    linked_list, tree = LinkedList(), PatientTree()
+    _fill(linked_list, tree, patients)
+    del patients
+    total = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"{rows} patients: {(total - base) / rows:.0f} B each "
+          f"({(records - base) / rows:.0f} B records, {(total - records) / rows:.0f} B list and index)")
+
+def bench_load(rows: int):
+    # cold-start time of load_patients for a `rows` patient snapshot, in each format
+    global SNAPSHOT_FORMAT
+    patients = [Patient(i, f"Patient {i}", i % 90 + 1, f"Disease {i % 40}", f"Dr {i % 500}",
+                        "2024-01-01 10:00:00") for i in range(1, rows + 1)]
+    cwd, fmt = os.getcwd(), SNAPSHOT_FORMAT
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            os.makedirs(DATA_DIR)
+            for SNAPSHOT_FORMAT in ("csv", "binary"):
+                save_patients(patients)
+                t0 = time.perf_counter()
+                load_patients(LinkedList(), PatientTree())
+                secs = time.perf_counter() - t0
+                print(f"load {SNAPSHOT_FORMAT}: {rows} patients in {secs:.2f}s = {rows / secs:,.0f} rows/s")
+        finally:
+            SNAPSHOT_FORMAT = fmt
+            os.chdir(cwd)
+
+BENCHMARKS = {"tree": bench_tree, "memory": bench_memory, "load": bench_load}
+
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Patient Management System (interactive menu).")
+    sub = parser.add_subparsers(dest="command")
+    p = sub.add_parser("bench", help="measure the in-memory structures")
+    p.add_argument("what", choices=list(BENCHMARKS))
+    p.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+    if args.command == "bench":
+        BENCHMARKS[args.what](args.rows)
+    else:
+        main()
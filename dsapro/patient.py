@@ -1,19 +1,96 @@
-# patient.py
-from dataclasses import dataclass, asdict
 from datetime import datetime
 
-@dataclass
+FIELDS = ("patient_id", "name", "age", "disease", "doctor", "registered_at")
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+MAX_AGE = 150  # oldest age validate accepts
+# `registered` of a patient whose registered_at text isn't a time (free text kept
+# from files written before times were checked); sorts before every real time
+UNKNOWN_TIME = datetime.min
+
+def parse_time(value) -> datetime:
+    # registered_at text ("YYYY-MM-DD HH:MM:SS", or just the date) -> datetime;
+    # raises ValueError for anything else
+    if not isinstance(value, datetime):
+        try:
+            value = datetime.fromisoformat(value.strip())
+        except (AttributeError, ValueError):
+            raise ValueError("Registration time must look like YYYY-MM-DD HH:MM:SS.") from None
+    if value.tzinfo is not None:
+        # stored times are naive local time (datetime.now()), and can't be compared
+        # with aware ones: a time with a UTC offset becomes the same instant locally
+        try:
+            value = value.astimezone().replace(tzinfo=None)
+        except OverflowError:  # e.g. 0001-01-01 with a positive offset
+            raise ValueError("Registration time is out of range.") from None
+    return value
+
+def registered_time(value) -> datetime:
+    # parse_time for stored data: text that isn't a time gives UNKNOWN_TIME
+    try:
+        return parse_time(value)
+    except ValueError:
+        return UNKNOWN_TIME
+
+def validate(name, age, disease, doctor):
+    # the checks /register applies, shared with bulk import; returns the cleaned
+    # (name, age, disease, doctor) or raises ValueError with a user-facing message
+    name = str(name or "").strip()
+    disease = str(disease or "").strip()
+    doctor = str(doctor or "").strip()
+    age = str(age if age is not None else "").strip()
+    if not name or not age or not disease or not doctor:
+        raise ValueError("All fields are required.")
+    try:
+        age = int(age)
+    except ValueError:
+        age = 0
+    if age <= 0:
+        raise ValueError("Age must be a positive number.")
+    if age > MAX_AGE:
+        raise ValueError(f"Age must be at most {MAX_AGE}.")
+    return name, age, disease, doctor
+
 class Patient:
-    patient_id: int
-    name: str
-    age: int
-    disease: str
-    doctor: str
-    registered_at: str = None
+    # __slots__ keeps each record to a fixed handful of pointers (no per-instance __dict__);
+    # the linked list and the doctor index both hold a reference to this one object.
+    # registered_at is also kept parsed (`registered`, a datetime) so it compares
+    # and range-queries as a time; setting either form goes through the setter
+    __slots__ = FIELDS[:-1] + ("_registered_at", "registered")
 
-    def __post_init__(self):
-        if not self.registered_at:
-            self.registered_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    def __init__(self, patient_id: int, name: str, age: int, disease: str, doctor: str, registered_at: str = None):
+        self.patient_id = patient_id
+        self.name = name
+        self.age = age
+        self.disease = disease
+        self.doctor = doctor
+        self.registered_at = registered_at or datetime.now().replace(microsecond=0)
+
+    @property
+    def registered_at(self) -> str:
+        return self._registered_at
+
+    @registered_at.setter
+    def registered_at(self, value):
+        try:
+            self.registered = parse_time(value)
+        except ValueError:
+            # older data: keep the text as it was instead of rejecting the patient
+            self.registered = UNKNOWN_TIME
+            self._registered_at = str(value)
+            return
+        if isinstance(value, str) and len(value) == 19 and value[10] == " ":
+            self._registered_at = value  # already TIME_FORMAT text
+        else:
+            self._registered_at = self.registered.isoformat(" ", "seconds")  # == strftime(TIME_FORMAT), faster
 
     def to_dict(self):
-        return asdict(self)
\ No newline at end of file
+        return {f: getattr(self, f) for f in FIELDS}
+
+    def __eq__(self, other):
+        if not isinstance(other, Patient):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return (f"Patient(patient_id={self.patient_id!r}, name={self.name!r}, age={self.age!r}, "
+                f"disease={self.disease!r}, doctor={self.doctor!r}, registered_at={self.registered_at!r})")
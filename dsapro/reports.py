@@ -0,0 +1,237 @@
+# reports.py
+# Daily roster reports: patients per doctor and per disease, an age histogram
+# and registrations per day.
+# The reports run over a columnar copy of the roster held in NumPy arrays,
+# one row per patient: age, doctor and disease as dictionary codes (index into
+# a list of distinct names) and the registration day. Every aggregate is then
+# one bincount over a column instead of a loop over Patient objects. The copy
+# follows the roster as a LinkedList listener, so it is built once and each
+# change afterwards only writes one row.
+#
+#   python reports.py --days 7
+#   python reports.py bench --rows 1000000
+import time
+import argparse
+from datetime import date
+from typing import Dict, List
+from patient import MAX_AGE  # ages outside 0..MAX_AGE are counted as "unknown" rather than binned
+
+try:
+    import numpy as np
+except ImportError:  # reports are optional; everything else runs without NumPy
+    np = None
+
+AGE_BIN = 10    # years per age histogram bar
+DAYS = 30       # registrations per day: this many days up to the last registration
+COMPACT_AT = 0.5  # rebuild the arrays when this share of rows belongs to deleted patients
+
+
+def available() -> bool:
+    return np is not None
+
+
+def _age(age: int) -> int:
+    # the int32 age column only needs to tell an age in 0..MAX_AGE from one outside
+    return min(max(age, -1), MAX_AGE + 1)
+
+
+class Dictionary:
+    # string <-> small integer code; codes are never reused, so a name nobody
+    # has any more just counts 0 and is left out of the reports
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+        self.names: List[str] = []
+
+    def __len__(self):
+        return len(self.names)
+
+    def code(self, name: str) -> int:
+        c = self.codes.get(name)
+        if c is None:
+            c = self.codes[name] = len(self.names)
+            self.names.append(name)
+        return c
+
+
+class RosterColumns:
+    """Columnar view of the roster. Deleted patients leave a dead row (alive
+    is False) until they make up COMPACT_AT of the arrays."""
+
+    COLUMNS = (("ages", "int32"), ("doctors", "int32"), ("diseases", "int32"), ("days", "int32"))
+
+    def __init__(self):
+        if np is None:
+            raise RuntimeError("Reports need NumPy: pip install numpy")
+        self.doctor_names = Dictionary()
+        self.disease_names = Dictionary()
+        self.row_of: Dict[int, int] = {}  # patient_id -> row
+        self.n = 0                         # rows in use, dead ones included
+        self._allocate(0)
+
+    def __len__(self):
+        return len(self.row_of)
+
+    def _allocate(self, capacity):
+        self.capacity = capacity
+        for name, dtype in self.COLUMNS:
+            setattr(self, name, np.zeros(capacity, dtype))
+        self.alive = np.zeros(capacity, bool)
+
+    def _grow(self, need):
+        capacity = max(need, 2 * self.capacity, 1024)
+        for name, dtype in self.COLUMNS + (("alive", bool),):
+            col = np.zeros(capacity, dtype)
+            col[:self.n] = getattr(self, name)[:self.n]
+            setattr(self, name, col)
+        self.capacity = capacity
+
+    def load(self, rows):
+        # rows: (patient_id, age, doctor, disease, registration date) for the whole roster
+        self.doctor_names, self.disease_names, self.row_of = Dictionary(), Dictionary(), {}
+        ages, doctors, diseases, days = [], [], [], []
+        doctor, disease = self.doctor_names.code, self.disease_names.code
+        for pid, age, doc, dis, registered in rows:
+            self.row_of[pid] = len(ages)
+            ages.append(_age(age))
+            doctors.append(doctor(doc))
+            diseases.append(disease(dis))
+            days.append(registered.toordinal())
+        self.n = len(ages)
+        self._allocate(self.n)
+        for (name, _), values in zip(self.COLUMNS, (ages, doctors, diseases, days)):
+            getattr(self, name)[:] = values
+        self.alive[:] = True
+
+    def put(self, pid: int, age: int, doctor: str, disease: str, registered):
+        row = self.row_of.get(pid)
+        if row is None:
+            if self.n == self.capacity:
+                self._grow(self.n + 1)
+            row = self.row_of[pid] = self.n
+            self.n += 1
+        self.ages[row] = _age(age)
+        self.doctors[row] = self.doctor_names.code(doctor)
+        self.diseases[row] = self.disease_names.code(disease)
+        self.days[row] = registered.toordinal()
+        self.alive[row] = True
+
+    def drop(self, pid: int):
+        row = self.row_of.pop(pid, None)
+        if row is not None:
+            self.alive[row] = False
+            if self.n - len(self.row_of) > COMPACT_AT * self.n:
+                self.compact()
+
+    def compact(self):
+        keep = np.flatnonzero(self.alive[:self.n])
+        for name, _ in self.COLUMNS:
+            setattr(self, name, getattr(self, name)[keep])
+        self.n = self.capacity = len(keep)
+        self.alive = np.ones(self.n, bool)
+        position = {row: i for i, row in enumerate(keep.tolist())}
+        self.row_of = {pid: position[row] for pid, row in self.row_of.items()}
+
+    # --- patients as a LinkedList listener ---
+
+    def attach(self, linked_list):
+        self.load((p.patient_id, p.age, p.doctor, p.disease, p.registered) for p in linked_list)
+        linked_list.listeners.append(self.on_patient)
+
+    def on_patient(self, event, patient, old=None):
+        if event == "delete":
+            self.drop(patient.patient_id)
+        else:
+            self.put(patient.patient_id, patient.age, patient.doctor, patient.disease, patient.registered)
+
+    # --- reports ---
+
+    @staticmethod
+    def _counts(codes, names: Dictionary):
+        # (name, patients) for every name with patients, most patients first
+        counts = np.bincount(codes, minlength=len(names))
+        order = np.argsort(-counts, kind="stable")
+        order = order[counts[order] > 0]
+        return [(names.names[i], int(counts[i])) for i in order.tolist()]
+
+    def report(self, days: int = DAYS, age_bin: int = AGE_BIN, end: date = None) -> dict:
+        alive = self.alive[:self.n]
+        ages = self.ages[:self.n][alive]
+        reg_days = self.days[:self.n][alive]
+        # rows stored before ages were validated everywhere may hold anything;
+        # bincount rejects negatives and would allocate a bar per bin up to the largest
+        in_range = (ages >= 0) & (ages <= MAX_AGE)
+        by_age = np.bincount(ages[in_range] // age_bin) if in_range.any() else np.zeros(0, np.int64)
+        unknown_age = int(len(ages) - in_range.sum())
+        if end is None:
+            end = date.fromordinal(int(reg_days.max())) if len(reg_days) else date.today()
+        first = end.toordinal() - days + 1
+        recent = reg_days[(reg_days >= first) & (reg_days <= end.toordinal())] - first
+        per_day = np.bincount(recent, minlength=days)
+        return {
+            "patients": int(len(ages)),
+            "by_doctor": self._counts(self.doctors[:self.n][alive], self.doctor_names),
+            "by_disease": self._counts(self.diseases[:self.n][alive], self.disease_names),
+            "by_age": [(f"{i * age_bin}-{(i + 1) * age_bin - 1}", int(c))
+                       for i, c in enumerate(by_age.tolist()) if c] + ([("unknown", unknown_age)] if unknown_age else []),
+            "per_day": [(date.fromordinal(first + i), int(c)) for i, c in enumerate(per_day.tolist())],
+            "mean_age": float(ages[in_range].mean()) if in_range.any() else 0.0,
+        }
+
+
+def print_report(r: dict):
+    print(f"Patients: {r['patients']} (mean age {r['mean_age']:.1f})")
+    for title, key in (("Per doctor", "by_doctor"), ("Per disease", "by_disease"), ("Ages", "by_age"),
+                       ("Registrations per day", "per_day")):
+        print(f"\n{title}:")
+        for label, count in r[key]:
+            print(f"  {label}: {count}")
+
+
+def benchmark(rows: int):
+    # build the view over `rows` synthetic patients, then time reports and single-row updates
+    from patient import Patient
+    from data_structures.linked_list import LinkedList
+    ll = LinkedList()
+    start = date(2024, 1, 1).toordinal()
+    ll.insert_many(Patient(i, f"Patient {i}", i % 90 + 1, f"Disease {i % 40}", f"Dr {i % 500}",
+                           f"{date.fromordinal(start + i % 700)} 10:00:00") for i in range(1, rows + 1))
+    cols = RosterColumns()
+    t0 = time.perf_counter()
+    cols.attach(ll)
+    t1 = time.perf_counter()
+    for _ in range(5):
+        cols.report()
+    t2 = time.perf_counter()
+    for i in range(1, 10001):
+        ll.update_by_id(i, doctor="Dr new", age=50)
+    t3 = time.perf_counter()
+    print(f"build: {rows} patients in {t1 - t0:.2f}s")
+    print(f"report: {(t2 - t1) / 5 * 1000:.0f} ms")
+    print(f"updates: {(t3 - t2) / 10000 * 1e6:.1f} us each")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Roster reports (needs NumPy).")
+    parser.add_argument("--days", type=int, default=DAYS, help="days of registrations to show")
+    parser.add_argument("--age-bin", type=int, default=AGE_BIN)
+    sub = parser.add_subparsers(dest="command")
+    p = sub.add_parser("bench", help="measure report latency in memory")
+    p.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+    if np is None:
+        parser.exit(1, "Reports need NumPy: pip install numpy\n")
+
+    if args.command == "bench":
+        benchmark(args.rows)
+        return
+
+    from main import LinkedList, PatientTree, AppointmentQueue, Scheduler, load_all
+    ll = LinkedList()
+    load_all(ll, PatientTree(), AppointmentQueue(), Scheduler())
+    cols = RosterColumns()
+    cols.attach(ll)
+    print_report(cols.report(args.days, args.age_bin))
+
+
+if __name__ == "__main__":
+    main()
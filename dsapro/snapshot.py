@@ -0,0 +1,129 @@
+# snapshot.py
+# Crash-safe CSV snapshots: rows go to a temp file in batches, the file ends
+# with a "# gen=<n> sha256=<hex>" trailer, is fsynced, and is then renamed
+# over the live file. The previous KEEP_GENERATIONS files stay as name.1,
+# name.2, ... and loading falls back to them if the checksum doesn't match.
+import os
+import io
+import csv
+import hashlib
+
+KEEP_GENERATIONS = 3
+BATCH_ROWS = 10000
+TRAILER = b"# gen="
+
+
+class ChecksumError(Exception):
+    pass
+
+
+class NoIntactSnapshot(Exception):
+    # every generation of a snapshot is damaged; starting empty would let the
+    # next compaction overwrite what is left, so loading stops instead
+    pass
+
+
+def _flush(buf, f, digest):
+    data = buf.getvalue().encode("utf-8")
+    digest.update(data)
+    f.write(data)
+    buf.seek(0)
+    buf.truncate()
+
+
+def _fsync_dir(path):
+    try:
+        fd = os.open(path or ".", os.O_RDONLY)
+    except OSError:
+        return  # not supported on this platform (e.g. Windows)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def generations(path, keep=KEEP_GENERATIONS):
+    # live file first, then older generations that still exist
+    for name in [path] + [f"{path}.{i}" for i in range(1, keep + 1)]:
+        if os.path.exists(name):
+            yield name
+
+
+def write_snapshot(path, header, rows, gen=0, keep=KEEP_GENERATIONS):
+    tmp = path + ".tmp"
+    digest = hashlib.sha256()
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    with open(tmp, "wb") as f:
+        writer.writerow(header)
+        for i, row in enumerate(rows, 1):
+            writer.writerow(row)
+            if i % BATCH_ROWS == 0:
+                _flush(buf, f, digest)
+        _flush(buf, f, digest)
+        f.write(TRAILER + f"{gen} sha256={digest.hexdigest()}\n".encode("ascii"))
+        f.flush()
+        os.fsync(f.fileno())
+    install(tmp, path, keep)
+
+
+def install(tmp, path, keep=KEEP_GENERATIONS):
+    # move a fully written, fsynced temp file into place, keeping older generations;
+    # shift name -> name.1 -> name.2 ...; if we die in between, loading falls back to name.1
+    if keep > 0 and os.path.exists(path):
+        for i in range(keep - 1, 0, -1):
+            if os.path.exists(f"{path}.{i}"):
+                os.replace(f"{path}.{i}", f"{path}.{i + 1}")
+        os.replace(path, f"{path}.1")
+    os.replace(tmp, path)
+    _fsync_dir(os.path.dirname(path))
+
+
+class SnapshotReader:
+    """Iterates the CSV rows of a snapshot (header included) and checks the
+    trailer once the last row has been read. Files without a trailer predate
+    checksums and are accepted as they are."""
+
+    def __init__(self, path):
+        self.path = path
+        self.gen = 0
+
+    def __iter__(self):
+        digest = hashlib.sha256()
+        trailer = None
+
+        def lines(f):
+            nonlocal trailer
+            for line in f:
+                if line.startswith(TRAILER):
+                    trailer = line
+                    return
+                digest.update(line)
+                yield line.decode("utf-8")
+
+        with open(self.path, "rb") as f:
+            yield from csv.reader(lines(f))
+
+        if trailer is not None:
+            gen, _, expected = trailer[len(TRAILER):].decode("ascii").strip().partition(" sha256=")
+            if digest.hexdigest() != expected:
+                raise ChecksumError(f"{self.path}: checksum mismatch")
+            self.gen = int(gen)
+
+
+def load_latest(path, consume):
+    """Feed the newest intact generation of path to consume(rows); returns its
+    gen number, or None if there is no snapshot at all. Raises NoIntactSnapshot
+    when there are snapshots but every one of them is damaged."""
+    damaged = []
+    for name in generations(path):
+        reader = SnapshotReader(name)
+        try:
+            consume(reader)
+            return reader.gen
+        except (ChecksumError, ValueError, KeyError, IndexError, TypeError) as e:
+            print(f"Skipping damaged snapshot {name}: {e}")
+            damaged.append(name)
+    if damaged:
+        raise NoIntactSnapshot(f"No intact snapshot of {path}: {', '.join(damaged)} are all damaged.")
+    return None
@@ -0,0 +1,1004 @@
+# sqlite_store.py
+# SQLite-backed versions of LinkedList, PatientTree and AppointmentQueue with
+# the same methods, so app.py can swap them in (PMS_STORAGE=sqlite).
+# The roster lives on disk in WAL mode; the working set no longer has to fit in
+# RAM and readers in other threads/processes don't block the writer.
+#
+# With cache=True (multi-worker mode) each process keeps read caches of
+# patients by ID and by doctor. They are dropped whenever PRAGMA data_version
+# shows another connection has committed, and entries this process writes are
+# evicted on commit, so every worker sees the shared database's state.
+import sqlite3
+import threading
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from decimal import Decimal
+from typing import Optional, List, Tuple
+from patient import Patient, FIELDS, TIME_FORMAT, registered_time
+from data_structures.queue import Appointment, AGING_STEP, clamp_priority
+from data_structures.calendar import Booking, SlotConflict, SLOTS_PER_DAY, MAX_LENGTH, day_start
+from data_structures.search_index import SearchIndex, INDEXED
+from reports import RosterColumns
+from data_structures.generations import Generations
+from billing import Ledger, Invoice, Visit, PARTS, SCOPES, price_batch, from_cents
+
+COLUMNS = ", ".join(FIELDS)
+APPT_COLUMNS = "seq, patient_id, priority, doctor"
+BOOKING_COLUMNS = "booking_id, patient_id, doctor, start, length"
+VISIT_COLUMNS = "visit_id, handle, patient_id, doctor, served_at"
+INVOICE_COLUMNS = "invoice_id, patient_id, doctor, visit_id, handle, " + ", ".join(PARTS) + ", issued_at"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS patients (
+    patient_id    INTEGER PRIMARY KEY,
+    seq           INTEGER NOT NULL,
+    name          TEXT NOT NULL,
+    age           INTEGER NOT NULL,
+    disease       TEXT NOT NULL,
+    doctor        TEXT NOT NULL,
+    registered_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS patients_seq ON patients(seq);
+CREATE INDEX IF NOT EXISTS patients_doctor ON patients(doctor, patient_id);
+CREATE INDEX IF NOT EXISTS patients_age ON patients(age, patient_id);
+CREATE INDEX IF NOT EXISTS patients_registered ON patients(registered_at, patient_id);
+CREATE TABLE IF NOT EXISTS appointments (
+    seq        INTEGER PRIMARY KEY AUTOINCREMENT,
+    patient_id INTEGER NOT NULL,
+    priority   INTEGER NOT NULL DEFAULT 0,
+    doctor     TEXT,
+    key        INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS appointments_patient ON appointments(patient_id, seq);
+CREATE INDEX IF NOT EXISTS appointments_order ON appointments(key, seq);
+CREATE INDEX IF NOT EXISTS appointments_doctor ON appointments(doctor, key, seq);
+CREATE TABLE IF NOT EXISTS bookings (
+    booking_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    patient_id INTEGER NOT NULL,
+    doctor     TEXT NOT NULL,
+    start      INTEGER NOT NULL,
+    length     INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS bookings_doctor ON bookings(doctor, start);
+CREATE INDEX IF NOT EXISTS bookings_patient ON bookings(patient_id, start);
+CREATE TABLE IF NOT EXISTS patient_changes (
+    seq        INTEGER PRIMARY KEY AUTOINCREMENT,
+    patient_id INTEGER NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS patients_changed_ins AFTER INSERT ON patients
+BEGIN INSERT INTO patient_changes (patient_id) VALUES (NEW.patient_id); END;
+CREATE TRIGGER IF NOT EXISTS patients_changed_upd AFTER UPDATE ON patients
+BEGIN INSERT INTO patient_changes (patient_id) VALUES (NEW.patient_id); END;
+CREATE TRIGGER IF NOT EXISTS patients_changed_del AFTER DELETE ON patients
+BEGIN INSERT INTO patient_changes (patient_id) VALUES (OLD.patient_id); END;
+CREATE TABLE IF NOT EXISTS generations (
+    bucket TEXT PRIMARY KEY,
+    value  INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS patients_gen_ins AFTER INSERT ON patients BEGIN
+    INSERT INTO generations VALUES ('patients', 1), ('doctor:' || NEW.doctor, 1)
+        ON CONFLICT (bucket) DO UPDATE SET value = value + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS patients_gen_upd AFTER UPDATE ON patients BEGIN
+    INSERT INTO generations VALUES ('patients', 1), ('doctor:' || NEW.doctor, 1)
+        ON CONFLICT (bucket) DO UPDATE SET value = value + 1;
+    INSERT INTO generations SELECT 'doctor:' || OLD.doctor, 1 WHERE OLD.doctor IS NOT NEW.doctor
+        ON CONFLICT (bucket) DO UPDATE SET value = value + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS patients_gen_del AFTER DELETE ON patients BEGIN
+    INSERT INTO generations VALUES ('patients', 1), ('doctor:' || OLD.doctor, 1)
+        ON CONFLICT (bucket) DO UPDATE SET value = value + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS appointments_gen_ins AFTER INSERT ON appointments BEGIN
+    INSERT INTO generations VALUES ('appointments', 1), ('queue:' || COALESCE(NEW.doctor, ''), 1)
+        ON CONFLICT (bucket) DO UPDATE SET value = value + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS appointments_gen_upd AFTER UPDATE ON appointments BEGIN
+    INSERT INTO generations VALUES ('appointments', 1), ('queue:' || COALESCE(NEW.doctor, ''), 1)
+        ON CONFLICT (bucket) DO UPDATE SET value = value + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS appointments_gen_del AFTER DELETE ON appointments BEGIN
+    INSERT INTO generations VALUES ('appointments', 1), ('queue:' || COALESCE(OLD.doctor, ''), 1)
+        ON CONFLICT (bucket) DO UPDATE SET value = value + 1;
+END;
+CREATE TABLE IF NOT EXISTS visits (
+    visit_id   INTEGER PRIMARY KEY AUTOINCREMENT,
+    handle     INTEGER,
+    patient_id INTEGER NOT NULL,
+    doctor     TEXT NOT NULL,
+    served_at  TEXT NOT NULL,
+    invoice_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS visits_unbilled ON visits(visit_id) WHERE invoice_id IS NULL;
+CREATE TABLE IF NOT EXISTS invoices (
+    invoice_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    patient_id INTEGER NOT NULL,
+    doctor     TEXT NOT NULL,
+    visit_id   INTEGER UNIQUE,
+    handle     INTEGER,
+    base       INTEGER NOT NULL,
+    tests      INTEGER NOT NULL,
+    meds       INTEGER NOT NULL,
+    other      INTEGER NOT NULL,
+    issued_at  TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS invoices_patient ON invoices(patient_id, invoice_id);
+CREATE TABLE IF NOT EXISTS billing_totals (
+    scope    TEXT NOT NULL,
+    key      TEXT NOT NULL,
+    invoices INTEGER NOT NULL,
+    cents    INTEGER NOT NULL,
+    PRIMARY KEY (scope, key)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta VALUES ('last_id', 0);
+INSERT OR IGNORE INTO meta VALUES ('imported', 0);
+INSERT OR IGNORE INTO meta VALUES ('epoch', abs(random() % 1000000000));
+"""
+
+
+class SQLiteDB:
+    """One connection per thread onto a shared database file."""
+
+    def __init__(self, path: str, cache: bool = False):
+        self.path = path
+        self.local = threading.local()
+        self.caching = cache
+        self.patients = {}  # patient_id -> Patient
+        self.doctors = {}   # doctor -> [Patient]
+        self.generation = 0  # bumped on each local commit
+        conn = self.conn
+        columns = {r[1] for r in conn.execute("PRAGMA table_info(appointments)")}
+        if columns and "key" not in columns:
+            # database created before triage priorities: every appointment is routine
+            conn.executescript("""
+                ALTER TABLE appointments ADD COLUMN priority INTEGER NOT NULL DEFAULT 0;
+                ALTER TABLE appointments ADD COLUMN doctor TEXT;
+                ALTER TABLE appointments ADD COLUMN key INTEGER NOT NULL DEFAULT 0;
+                UPDATE appointments SET key = seq;
+            """)
+        conn.executescript(SCHEMA)
+
+    def _thread(self):
+        # this thread's connection and transaction state, set up on first use;
+        # Flask may serve every request on a new thread
+        local = self.local
+        if getattr(local, "conn", None) is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            local.conn = conn
+            local.depth = 0
+            local.dirty = set()
+            local.version = None
+        return local
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        return self._thread().conn
+
+    def fresh(self) -> bool:
+        # True when the caches may be used; clears them first if any other
+        # connection (another worker, or another thread here) has committed
+        if not self.caching:
+            return False
+        version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if version != self.local.version:
+            self.patients.clear()
+            self.doctors.clear()
+            self.local.version = version
+        return True
+
+    def touch(self, patient_id: int):
+        # remember a row written in the current transaction, evicted on commit
+        self._thread().dirty.add(patient_id)
+
+    def _evict(self):
+        self.generation += 1
+        local = self._thread()
+        for pid in local.dirty:
+            self.patients.pop(pid, None)
+        local.dirty.clear()
+        self.doctors.clear()
+
+    @contextmanager
+    def batch(self):
+        # group many writes into a single transaction; nested batches join the outer one
+        conn = self.conn
+        if self.local.depth == 0:
+            conn.execute("BEGIN IMMEDIATE")
+        self.local.depth += 1
+        try:
+            yield conn
+        except BaseException:
+            self.local.depth -= 1
+            if self.local.depth == 0:
+                conn.execute("ROLLBACK")
+                self._evict()
+            raise
+        self.local.depth -= 1
+        if self.local.depth == 0:
+            conn.execute("COMMIT")
+            self._evict()
+
+    def sync(self):
+        # the WAL is already durable per commit; fold it back into the main file
+        self.conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+
+def _patient(row) -> Patient:
+    return Patient(*row)
+
+
+class SQLitePatientStore:
+    def __init__(self, db: SQLiteDB):
+        self.db = db
+        self.listeners = []
+        # save_all() syncs whatever journal the store has; here that is SQLite's WAL
+        self.journal = db
+
+    def _notify(self, event, patient, old=None):
+        for fn in self.listeners:
+            fn(event, patient, old)
+
+    def __len__(self):
+        return self.db.conn.execute("SELECT COUNT(*) FROM patients").fetchone()[0]
+
+    def __iter__(self):
+        for row in self.db.conn.execute(f"SELECT {COLUMNS} FROM patients ORDER BY seq"):
+            yield _patient(row)
+
+    @property
+    def last_id(self) -> int:
+        return self.db.conn.execute("SELECT value FROM meta WHERE key = 'last_id'").fetchone()[0]
+
+    @last_id.setter
+    def last_id(self, value: int):
+        # never lowered, like LinkedList.last_id
+        with self.db.batch() as conn:
+            conn.execute("UPDATE meta SET value = MAX(value, ?) WHERE key = 'last_id'", (value,))
+
+    def insert_end(self, patient: Patient):
+        self.db.touch(patient.patient_id)
+        old = None
+        with self.db.batch() as conn:
+            if self.listeners:
+                # replacing a patient with the same ID reads as delete + insert, like LinkedList
+                old = conn.execute(f"SELECT {COLUMNS} FROM patients WHERE patient_id = ?",
+                                   (patient.patient_id,)).fetchone()
+            conn.execute(
+                f"INSERT OR REPLACE INTO patients (seq, {COLUMNS}) "
+                f"VALUES ((SELECT COALESCE(MAX(seq), 0) + 1 FROM patients), ?, ?, ?, ?, ?, ?)",
+                (patient.patient_id, patient.name, patient.age, patient.disease,
+                 patient.doctor, patient.registered_at))
+            conn.execute("UPDATE meta SET value = MAX(value, ?) WHERE key = 'last_id'", (patient.patient_id,))
+        if old:
+            self._notify("delete", _patient(old))
+        if self.listeners:
+            self._notify("insert", patient)
+
+    def restore(self, patient: Patient):
+        # LinkedList.restore: back before the first patient (in seq order) with
+        # a higher ID, taking the free seq just below it, which is normally the
+        # patient's own old one; later rows shift up only when there is none
+        with self.db.batch() as conn:
+            exists = conn.execute("SELECT 1 FROM patients WHERE patient_id = ?", (patient.patient_id,)).fetchone()
+            nxt = conn.execute("SELECT MIN(seq) FROM patients WHERE patient_id > ?",
+                               (patient.patient_id,)).fetchone()[0]
+            if exists or nxt is None:
+                seq = None
+            else:
+                prev = conn.execute("SELECT MAX(seq) FROM patients WHERE seq < ?", (nxt,)).fetchone()[0]
+                seq = nxt - 1
+                if prev is not None and prev >= seq:
+                    conn.execute("UPDATE patients SET seq = seq + 1 WHERE seq >= ?", (nxt,))
+                    seq = nxt
+                self.db.touch(patient.patient_id)
+                conn.execute(f"INSERT INTO patients (seq, {COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (seq, patient.patient_id, patient.name, patient.age, patient.disease,
+                              patient.doctor, patient.registered_at))
+        if seq is None:
+            self.insert_end(patient)
+        elif self.listeners:
+            self._notify("insert", patient)
+
+    def insert_many(self, patients):
+        # one statement per chunk instead of one transaction per patient
+        patients = list(patients)
+        for p in patients:
+            self.db.touch(p.patient_id)
+        with self.db.batch() as conn:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO patients (seq, {COLUMNS}) "
+                f"VALUES ((SELECT COALESCE(MAX(seq), 0) + 1 FROM patients), ?, ?, ?, ?, ?, ?)",
+                ((p.patient_id, p.name, p.age, p.disease, p.doctor, p.registered_at) for p in patients))
+            conn.execute("UPDATE meta SET value = MAX(value, ?) WHERE key = 'last_id'",
+                         (max((p.patient_id for p in patients), default=0),))
+        if self.listeners:
+            for p in patients:
+                self._notify("insert", p)
+
+    def display(self):
+        if not len(self):
+            print("No patients registered.")
+            return
+        print("\nAll Patients:")
+        print("-" * 60)
+        for p in self:
+            print(f"ID: {p.patient_id} | Name: {p.name} | Age: {p.age} | Disease: {p.disease} | Doctor: {p.doctor} | Registered: {p.registered_at}")
+        print("-" * 60)
+
+    def find_by_id(self, pid: int) -> Optional[Patient]:
+        cached = self.db.fresh()
+        if cached and pid in self.db.patients:
+            return self.db.patients[pid]
+        generation = self.db.generation
+        row = self.db.conn.execute(f"SELECT {COLUMNS} FROM patients WHERE patient_id = ?", (pid,)).fetchone()
+        patient = _patient(row) if row else None
+        # don't cache a row read while a local commit was evicting it
+        if cached and patient and generation == self.db.generation:
+            self.db.patients[pid] = patient
+        return patient
+
+    def delete_by_id(self, pid: int) -> Optional[Patient]:
+        self.db.touch(pid)
+        with self.db.batch() as conn:
+            row = conn.execute(f"SELECT {COLUMNS} FROM patients WHERE patient_id = ?", (pid,)).fetchone()
+            if not row:
+                return None
+            conn.execute("DELETE FROM patients WHERE patient_id = ?", (pid,))
+        patient = _patient(row)
+        self._notify("delete", patient)
+        return patient
+
+    def update_by_id(self, pid: int, **kwargs) -> bool:
+        self.db.touch(pid)
+        with self.db.batch() as conn:
+            row = conn.execute(f"SELECT {COLUMNS} FROM patients WHERE patient_id = ?", (pid,)).fetchone()
+            if not row:
+                return False
+            patient = _patient(row)
+            old = {}
+            for k, v in kwargs.items():
+                if k in FIELDS and k != "patient_id" and getattr(patient, k) != v:
+                    old[k] = getattr(patient, k)
+                    setattr(patient, k, v)
+            if old:
+                assignments = ", ".join(f"{k} = ?" for k in old)
+                conn.execute(f"UPDATE patients SET {assignments} WHERE patient_id = ?",
+                             [getattr(patient, k) for k in old] + [pid])
+        if old:
+            self._notify("update", patient, old)
+        return True
+
+    def page(self, after: Optional[int] = None, limit: int = 50) -> List[Patient]:
+        if after is None:
+            rows = self.db.conn.execute(f"SELECT {COLUMNS} FROM patients ORDER BY seq LIMIT ?", (limit,))
+        else:
+            # a deleted `after` resumes at the first patient with a higher ID, like LinkedList.page
+            rows = self.db.conn.execute(
+                f"SELECT {COLUMNS} FROM patients WHERE seq > COALESCE("
+                f"(SELECT seq FROM patients WHERE patient_id = ?), "
+                f"(SELECT MIN(seq) FROM patients WHERE patient_id > ?) - 1) ORDER BY seq LIMIT ?",
+                (after, after, limit))
+        return [_patient(r) for r in rows]
+
+    def walk(self, chunk: int = 500, lock=nullcontext):
+        # LinkedList.walk: the cursor is the last row's seq, which stays valid
+        # whether or not that patient is still there
+        seq = -1
+        while True:
+            with lock():
+                rows = self.db.conn.execute(f"SELECT seq, {COLUMNS} FROM patients WHERE seq > ? ORDER BY seq LIMIT ?",
+                                            (seq, chunk)).fetchall()
+            yield from (_patient(r[1:]) for r in rows)
+            if len(rows) < chunk:
+                return
+            seq = rows[-1][0]
+
+    def sorted_page(self, field: str, descending: bool = False, offset: int = 0, limit: int = 50) -> List[Patient]:
+        if field not in FIELDS:
+            raise ValueError(f"cannot sort by {field!r}")
+        direction = "DESC" if descending else "ASC"
+        rows = self.db.conn.execute(
+            f"SELECT {COLUMNS} FROM patients ORDER BY {field} {direction}, patient_id {direction} "
+            f"LIMIT ? OFFSET ?", (limit, offset))
+        return [_patient(r) for r in rows]
+
+    def to_list(self) -> List[dict]:
+        return [p.to_dict() for p in self]
+
+    def clear(self):
+        with self.db.batch() as conn:
+            conn.execute("DELETE FROM patients")
+            conn.execute("UPDATE meta SET value = 0 WHERE key = 'last_id'")
+        self.db.patients.clear()
+
+    def load_from_list(self, patients: List[dict]):
+        with self.db.batch():
+            self.clear()
+            for d in patients:
+                self.insert_end(Patient(**d))
+
+    def get_max_id(self) -> int:
+        return self.last_id
+
+    def allocate_id(self) -> int:
+        # the counter lives in the database, so concurrent writers never share an ID
+        with self.db.batch() as conn:
+            conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'last_id'")
+            return conn.execute("SELECT value FROM meta WHERE key = 'last_id'").fetchone()[0]
+
+    def allocate_ids(self, count: int) -> int:
+        with self.db.batch() as conn:
+            conn.execute("UPDATE meta SET value = value + ? WHERE key = 'last_id'", (count,))
+            return conn.execute("SELECT value FROM meta WHERE key = 'last_id'").fetchone()[0] - count + 1
+
+
+class SQLitePatientTree:
+    """Doctor index over the patients table. The (doctor, patient_id) index is
+    kept by SQLite itself, so the maintenance calls are no-ops."""
+
+    def __init__(self, db: SQLiteDB):
+        self.db = db
+
+    def insert(self, doctor: str, patient):
+        pass
+
+    def remove(self, doctor: str, patient_id: int):
+        return self.contains(doctor, patient_id)
+
+    def refresh(self, doctor: str, patient):
+        return self.contains(doctor, patient.patient_id)
+
+    def move(self, old_doctor: str, new_doctor: str, patient):
+        pass
+
+    def clear(self):
+        pass
+
+    def rebuild_from_list(self, patient_list):
+        pass
+
+    def contains(self, doctor: str, patient_id: int) -> bool:
+        return self.db.conn.execute("SELECT 1 FROM patients WHERE doctor = ? AND patient_id = ?",
+                                    (doctor, patient_id)).fetchone() is not None
+
+    def search(self, doctor: str):
+        cached = self.db.fresh()
+        if cached and doctor in self.db.doctors:
+            return list(self.db.doctors[doctor])
+        generation = self.db.generation
+        rows = self.db.conn.execute(
+            f"SELECT {COLUMNS} FROM patients WHERE doctor = ? ORDER BY patient_id", (doctor,))
+        res = [_patient(r) for r in rows]
+        if cached and generation == self.db.generation:
+            self.db.doctors[doctor] = res
+        return list(res)
+
+    def _groups(self, where, params):
+        res = []
+        rows = self.db.conn.execute(
+            f"SELECT {COLUMNS} FROM patients {where} ORDER BY doctor, patient_id", params)
+        for row in rows:
+            p = _patient(row)
+            if not res or res[-1][0] != p.doctor:
+                res.append((p.doctor, []))
+            res[-1][1].append(p)
+        return res
+
+    def inorder(self):
+        return self._groups("", ())
+
+    def doctors(self):
+        return [r[0] for r in self.db.conn.execute("SELECT DISTINCT doctor FROM patients ORDER BY doctor")]
+
+    def range_search(self, low: str, high: str):
+        return self._groups("WHERE doctor >= ? AND doctor <= ?", (low, high + "\uffff"))
+
+    def prefix_search(self, prefix: str):
+        return self.range_search(prefix, prefix)
+
+    def depth(self):
+        return 0
+
+
+class SQLiteAppointmentQueue:
+    """Triage queue with the same ordering as AppointmentQueue:
+    key = seq - priority * AGING_STEP, ties broken by seq."""
+
+    def __init__(self, db: SQLiteDB):
+        self.db = db
+        self.listeners = []
+
+    def _notify(self, event, appt):
+        for fn in self.listeners:
+            fn(event, appt)
+
+    def __len__(self):
+        return self.db.conn.execute("SELECT COUNT(*) FROM appointments").fetchone()[0]
+
+    def _front(self, conn, doctor=None):
+        if doctor is None:
+            row = conn.execute(f"SELECT {APPT_COLUMNS} FROM appointments ORDER BY key, seq LIMIT 1").fetchone()
+        else:
+            row = conn.execute(f"SELECT {APPT_COLUMNS} FROM appointments WHERE doctor = ? "
+                               f"ORDER BY key, seq LIMIT 1", (doctor,)).fetchone()
+        return Appointment(*row) if row else None
+
+    def _get(self, conn, handle):
+        row = conn.execute(f"SELECT {APPT_COLUMNS} FROM appointments WHERE seq = ?", (handle,)).fetchone()
+        return Appointment(*row) if row else None
+
+    def enqueue(self, patient_id: int, priority: int = 0, doctor: str = None, handle: int = None) -> int:
+        priority = clamp_priority(priority)
+        with self.db.batch() as conn:
+            if handle is None:
+                cur = conn.execute("INSERT INTO appointments (patient_id, priority, doctor, key) VALUES (?, ?, ?, 0)",
+                                   (patient_id, priority, doctor))
+                handle = cur.lastrowid
+            else:
+                conn.execute("INSERT INTO appointments (seq, patient_id, priority, doctor, key) VALUES (?, ?, ?, ?, 0)",
+                             (handle, patient_id, priority, doctor))
+            conn.execute("UPDATE appointments SET key = seq - priority * ? WHERE seq = ?", (AGING_STEP, handle))
+        self._notify("enqueue", Appointment(handle, patient_id, priority, doctor))
+        return handle
+
+    def _remove(self, event, appt):
+        with self.db.batch() as conn:
+            conn.execute("DELETE FROM appointments WHERE seq = ?", (appt.handle,))
+        self._notify(event, appt)
+        return appt.patient_id
+
+    def dequeue(self, doctor: str = None) -> Optional[int]:
+        with self.db.batch() as conn:
+            appt = self._front(conn, doctor)
+            return self._remove("dequeue", appt) if appt else None
+
+    def serve(self, handle: int) -> Optional[int]:
+        with self.db.batch() as conn:
+            appt = self._get(conn, handle)
+            return self._remove("dequeue", appt) if appt else None
+
+    def cancel(self, handle: int) -> Optional[Appointment]:
+        with self.db.batch() as conn:
+            appt = self._get(conn, handle)
+            if appt:
+                self._remove("cancel", appt)
+            return appt
+
+    def reschedule(self, handle: int, priority: int) -> bool:
+        priority = clamp_priority(priority)
+        with self.db.batch() as conn:
+            cur = conn.execute("UPDATE appointments SET priority = ?, key = seq - ? * ? WHERE seq = ?",
+                               (priority, priority, AGING_STEP, handle))
+            if not cur.rowcount:
+                return False
+            appt = self._get(conn, handle)
+        self._notify("reschedule", appt)
+        return True
+
+    def position(self, handle: int, per_doctor: bool = False) -> Optional[int]:
+        # counted on the (key, seq) / (doctor, key, seq) indexes
+        conn = self.db.conn
+        appt = self._get(conn, handle)
+        if appt is None:
+            return None
+        if per_doctor and appt.doctor is not None:
+            row = conn.execute("SELECT COUNT(*) FROM appointments WHERE doctor = ? AND (key < ? OR (key = ? AND seq < ?))",
+                               (appt.doctor, appt.key, appt.key, handle)).fetchone()
+        else:
+            row = conn.execute("SELECT COUNT(*) FROM appointments WHERE key < ? OR (key = ? AND seq < ?)",
+                               (appt.key, appt.key, handle)).fetchone()
+        return row[0] + 1
+
+    def remove_last(self, patient_id: int) -> Optional[Appointment]:
+        row = self.db.conn.execute("SELECT MAX(seq) FROM appointments WHERE patient_id = ?", (patient_id,)).fetchone()
+        return self.cancel(row[0]) if row[0] is not None else None
+
+    def peek(self, doctor: str = None) -> Optional[int]:
+        appt = self._front(self.db.conn, doctor)
+        return appt.patient_id if appt else None
+
+    def front(self, doctor: str = None) -> Optional[Appointment]:
+        return self._front(self.db.conn, doctor)
+
+    def is_empty(self) -> bool:
+        return self.peek() is None
+
+    def appointments(self, doctor: str = None) -> List[Appointment]:
+        if doctor is None:
+            rows = self.db.conn.execute(f"SELECT {APPT_COLUMNS} FROM appointments ORDER BY key, seq")
+        else:
+            rows = self.db.conn.execute(f"SELECT {APPT_COLUMNS} FROM appointments WHERE doctor = ? "
+                                        f"ORDER BY key, seq", (doctor,))
+        return [Appointment(*r) for r in rows]
+
+    def to_list(self) -> List[int]:
+        return [a.patient_id for a in self.appointments()]
+
+    def load_from_list(self, arr: List):
+        # arr: patient IDs (FIFO) or (patient_id, priority, doctor, handle) tuples
+        listeners, self.listeners = self.listeners, []
+        with self.db.batch() as conn:
+            conn.execute("DELETE FROM appointments")
+            for item in arr:
+                if isinstance(item, int):
+                    self.enqueue(item)
+                else:
+                    self.enqueue(*item)
+        self.listeners = listeners
+
+
+class SQLiteScheduler:
+    """Slot bookings with the same checks as Scheduler. A booking is at most
+    MAX_LENGTH slots long, so overlap queries are short range scans on the
+    (doctor, start) and (patient_id, start) indexes."""
+
+    def __init__(self, db: SQLiteDB):
+        self.db = db
+        self.listeners = []
+
+    def _notify(self, event, booking):
+        for fn in self.listeners:
+            fn(event, booking)
+
+    def __len__(self):
+        return self.db.conn.execute("SELECT COUNT(*) FROM bookings").fetchone()[0]
+
+    def _overlapping(self, conn, column, value, start, length):
+        rows = conn.execute(f"SELECT {BOOKING_COLUMNS} FROM bookings WHERE {column} = ? "
+                            f"AND start > ? AND start < ? AND start + length > ? ORDER BY start",
+                            (value, start - MAX_LENGTH, start + length, start))
+        return [Booking(*r) for r in rows]
+
+    def conflicts(self, patient_id: int, doctor: str, start: int, length: int = 1) -> List[Booking]:
+        conn = self.db.conn
+        res = self._overlapping(conn, "doctor", doctor, start, length)
+        seen = {b.booking_id for b in res}
+        res += [b for b in self._overlapping(conn, "patient_id", patient_id, start, length)
+                if b.booking_id not in seen]
+        return res
+
+    def book(self, patient_id: int, doctor: str, start: int, length: int = 1,
+             booking_id: int = None) -> Booking:
+        if not 1 <= length <= MAX_LENGTH or start % SLOTS_PER_DAY + length > SLOTS_PER_DAY:
+            raise SlotConflict("Booking must fit inside one working day.")
+        with self.db.batch() as conn:
+            clash = self.conflicts(patient_id, doctor, start, length)
+            if clash:
+                b = clash[0]
+                raise SlotConflict(f"Overlaps booking #{b.booking_id} (patient {b.patient_id} with "
+                                   f"{b.doctor}, {b.starts_at:%Y-%m-%d %H:%M}-{b.ends_at:%H:%M}).")
+            cur = conn.execute("INSERT INTO bookings (booking_id, patient_id, doctor, start, length) "
+                               "VALUES (?, ?, ?, ?, ?)", (booking_id, patient_id, doctor, start, length))
+            b = Booking(cur.lastrowid, patient_id, doctor, start, length)
+        self._notify("book", b)
+        return b
+
+    def cancel(self, booking_id: int) -> Optional[Booking]:
+        with self.db.batch() as conn:
+            row = conn.execute(f"SELECT {BOOKING_COLUMNS} FROM bookings WHERE booking_id = ?",
+                               (booking_id,)).fetchone()
+            if not row:
+                return None
+            conn.execute("DELETE FROM bookings WHERE booking_id = ?", (booking_id,))
+        b = Booking(*row)
+        self._notify("cancel", b)
+        return b
+
+    def next_free(self, doctor: str, start: int, length: int = 1) -> int:
+        conn = self.db.conn
+        slot = start
+        while True:
+            if slot % SLOTS_PER_DAY + length > SLOTS_PER_DAY:
+                slot = day_start(slot) + SLOTS_PER_DAY
+            busy = self._overlapping(conn, "doctor", doctor, slot, length)
+            if not busy:
+                return slot
+            slot = max(b.end for b in busy)
+
+    def day(self, doctor: str, slot: int) -> List[Booking]:
+        lo = day_start(slot)
+        rows = self.db.conn.execute(f"SELECT {BOOKING_COLUMNS} FROM bookings WHERE doctor = ? "
+                                    f"AND start >= ? AND start < ? ORDER BY start",
+                                    (doctor, lo, lo + SLOTS_PER_DAY))
+        return [Booking(*r) for r in rows]
+
+    def for_patient(self, patient_id: int) -> List[Booking]:
+        rows = self.db.conn.execute(f"SELECT {BOOKING_COLUMNS} FROM bookings WHERE patient_id = ? "
+                                    f"ORDER BY start", (patient_id,))
+        return [Booking(*r) for r in rows]
+
+    def to_list(self) -> List[Booking]:
+        rows = self.db.conn.execute(f"SELECT {BOOKING_COLUMNS} FROM bookings ORDER BY booking_id")
+        return [Booking(*r) for r in rows]
+
+    def load_from_list(self, arr: List):
+        # arr: (booking_id, patient_id, doctor, start, length) tuples
+        listeners, self.listeners = self.listeners, []
+        with self.db.batch() as conn:
+            conn.execute("DELETE FROM bookings")
+            for booking_id, patient_id, doctor, start, length in arr:
+                self.book(patient_id, doctor, start, length, booking_id=booking_id)
+        self.listeners = listeners
+
+
+class ChangeFollower:
+    """Base for per-process copies of data derived from the patients table.
+    Triggers log the ID of every inserted, updated or deleted patient in
+    patient_changes, whichever worker made the change; before each read the
+    copy applies the rows logged since it last looked. A copy that has fallen
+    behind the pruned part of the log rebuilds from the table."""
+
+    KEEP_CHANGES = 100000  # change-log rows kept for workers that are behind
+    FOLLOWED = ()          # patients columns the copy is built from
+
+    def __init__(self, db: SQLiteDB):
+        self.db = db
+        self.seen = 0  # last patient_changes.seq applied
+        self.lock = threading.Lock()
+
+    def load_rows(self, rows):
+        # rows: (patient_id, *FOLLOWED) for the whole table
+        raise NotImplementedError
+
+    def apply(self, pid: int, row):
+        # row: FOLLOWED values of the patient now, or None when deleted
+        raise NotImplementedError
+
+    def rebuild(self):
+        conn = self.db.conn
+        self.seen = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM patient_changes").fetchone()[0]
+        self.load_rows(conn.execute(f"SELECT patient_id, {', '.join(self.FOLLOWED)} FROM patients"))
+
+    def catch_up(self):
+        conn = self.db.conn
+        oldest = conn.execute("SELECT MIN(seq) FROM patient_changes").fetchone()[0]
+        if oldest is not None and oldest > self.seen + 1:
+            self.rebuild()  # the changes we missed were pruned
+            return
+        changed = set()
+        for seq, pid in conn.execute("SELECT seq, patient_id FROM patient_changes WHERE seq > ? ORDER BY seq",
+                                     (self.seen,)):
+            changed.add(pid)
+            self.seen = seq
+        for pid in changed:
+            row = conn.execute(f"SELECT {', '.join(self.FOLLOWED)} FROM patients WHERE patient_id = ?",
+                               (pid,)).fetchone()
+            self.apply(pid, tuple(row) if row else None)
+        if oldest is not None and self.seen - oldest > 2 * self.KEEP_CHANGES:
+            with self.db.batch() as conn:
+                conn.execute("DELETE FROM patient_changes WHERE seq <= ?", (self.seen - self.KEEP_CHANGES,))
+
+
+class SQLiteSearchIndex(ChangeFollower, SearchIndex):
+    """SearchIndex over the patients table, one copy per process."""
+
+    FOLLOWED = INDEXED
+
+    def __init__(self, db: SQLiteDB):
+        SearchIndex.__init__(self)
+        ChangeFollower.__init__(self, db)
+        self.indexed = {}  # patient_id -> indexed field values, to unindex on change
+
+    def attach(self, linked_list, tree):
+        self.linked_list = linked_list
+        self.tree = tree
+        with self.lock:
+            self.rebuild()
+
+    def load_rows(self, rows):
+        self.clear()
+        self.indexed = {}
+        for row in rows:
+            self._index(row[0], row[1:])
+
+    def apply(self, pid, row):
+        self._unindex(pid)
+        if row:
+            self._index(pid, row)
+
+    def _index(self, pid, values):
+        for f, v in zip(INDEXED, values):
+            self._add_field(f, v, pid)
+        self.indexed[pid] = values
+
+    def _unindex(self, pid):
+        values = self.indexed.pop(pid, None)
+        if values is not None:
+            for f, v in zip(INDEXED, values):
+                self._remove_field(f, v, pid)
+
+    def search(self, *args, **kwargs):
+        with self.lock:
+            self.catch_up()
+            return super().search(*args, **kwargs)
+
+
+class SQLiteRangeIndex:
+    """RangeIndex over the patients table: the patients_age and
+    patients_registered B-tree indexes answer the range scans. registered_at
+    is stored as fixed-width TIME_FORMAT text, whose order is time order."""
+
+    def __init__(self, db: SQLiteDB):
+        self.db = db
+
+    def attach(self, linked_list):
+        pass  # the SQL indexes are maintained by SQLite itself
+
+    @staticmethod
+    def _where(age, registered):
+        clauses, params = [], []
+        for column, (lo, hi) in (("age", age), ("registered_at", registered)):
+            if column == "registered_at":
+                lo, hi = (v.strftime(TIME_FORMAT) if v is not None else None for v in (lo, hi))
+            if lo is not None:
+                clauses.append(f"{column} >= ?")
+                params.append(lo)
+            if hi is not None:
+                clauses.append(f"{column} <= ?")
+                params.append(hi)
+        return ("WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def count(self, field: str, lo=None, hi=None) -> int:
+        ranges = {"age": (None, None), "registered_at": (None, None), field: (lo, hi)}
+        where, params = self._where(ranges["age"], ranges["registered_at"])
+        return self.db.conn.execute(f"SELECT COUNT(*) FROM patients {where}", params).fetchone()[0]
+
+    def sorted_page(self, field: str, descending: bool = False, offset: int = 0, limit: int = 50) -> List[Patient]:
+        return SQLitePatientStore(self.db).sorted_page(field, descending, offset, limit)
+
+    def filter(self, age=(None, None), registered=(None, None), sort: Optional[str] = None,
+               descending: bool = False, offset: int = 0, limit: int = 50):
+        where, params = self._where(age, registered)
+        if sort not in FIELDS:
+            sort = "registered_at" if registered != (None, None) and age == (None, None) else "age"
+        direction = "DESC" if descending else "ASC"
+        conn = self.db.conn
+        total = conn.execute(f"SELECT COUNT(*) FROM patients {where}", params).fetchone()[0]
+        rows = conn.execute(f"SELECT {COLUMNS} FROM patients {where} "
+                            f"ORDER BY {sort} {direction}, patient_id {direction} LIMIT ? OFFSET ?",
+                            params + [limit, offset])
+        return [_patient(r) for r in rows], total
+
+
+class SQLiteRosterColumns(ChangeFollower, RosterColumns):
+    """Report columns over the patients table, one copy per process."""
+
+    FOLLOWED = ("age", "doctor", "disease", "registered_at")
+
+    def __init__(self, db: SQLiteDB):
+        RosterColumns.__init__(self)
+        ChangeFollower.__init__(self, db)
+
+    def attach(self, linked_list):
+        with self.lock:
+            self.rebuild()
+
+    def load_rows(self, rows):
+        self.load((pid, age, doctor, disease, registered_time(registered_at))
+                  for pid, age, doctor, disease, registered_at in rows)
+
+    def apply(self, pid, row):
+        if row:
+            age, doctor, disease, registered_at = row
+            self.put(pid, age, doctor, disease, registered_time(registered_at))
+        else:
+            self.drop(pid)
+
+    def report(self, *args, **kwargs):
+        with self.lock:
+            self.catch_up()
+            return super().report(*args, **kwargs)
+
+
+class SQLiteLedger(Ledger):
+    """Ledger in the shared database. Invoices are only ever inserted; a visit
+    gets its invoice_id once billed, and billing_totals holds the running
+    totals, updated in the same transaction as the invoices they count."""
+
+    def __init__(self, db: SQLiteDB):
+        super().__init__()
+        self.db = db
+
+    def __len__(self):
+        return self.db.conn.execute("SELECT COUNT(*) FROM invoices").fetchone()[0]
+
+    def load(self):
+        pass
+
+    def sync(self):
+        pass
+
+    def served(self, handle: int, patient_id: int, doctor: str, served_at: str = None) -> Visit:
+        served_at = served_at or datetime.now().strftime(TIME_FORMAT)
+        with self.db.batch() as conn:
+            cur = conn.execute("INSERT INTO visits (handle, patient_id, doctor, served_at) VALUES (?, ?, ?, ?)",
+                               (handle, patient_id, doctor or "", served_at))
+        return Visit(cur.lastrowid, handle, patient_id, doctor or "", served_at)
+
+    def pending(self, day: str = None, patient_id: int = None) -> List[Visit]:
+        where, params = ["invoice_id IS NULL"], []
+        if day is not None:
+            where.append("served_at >= ? AND served_at < ?")
+            params += [day, day + "~"]  # "~" sorts after every time of day
+        if patient_id is not None:
+            where.append("patient_id = ?")
+            params.append(patient_id)
+        rows = self.db.conn.execute(f"SELECT {VISIT_COLUMNS} FROM visits WHERE {' AND '.join(where)} "
+                                    f"ORDER BY visit_id", params)
+        return [Visit(*r) for r in rows]
+
+    def _issue(self, visits, columns) -> List[Invoice]:
+        totals = price_batch(*columns)
+        stamp = datetime.now().strftime(TIME_FORMAT)
+        issued, sums = [], {}
+        with self.db.batch() as conn:
+            for (pid, doctor, visit_id), amounts, total in zip(visits, zip(*columns), totals):
+                handle = None
+                if visit_id is not None:
+                    row = conn.execute("SELECT handle, doctor FROM visits WHERE visit_id = ? AND invoice_id IS NULL",
+                                       (visit_id,)).fetchone()
+                    if row is None:
+                        raise ValueError("A visit in this batch is unknown or already billed.")
+                    handle, doctor = row[0], doctor or row[1]
+                inv = Invoice(None, pid, doctor or "", visit_id, handle, *amounts, issued_at=stamp)
+                cur = conn.execute(f"INSERT INTO invoices ({INVOICE_COLUMNS}) VALUES ({', '.join('?' * 10)})",
+                                   [getattr(inv, f) for f in Invoice.__slots__])
+                inv.invoice_id = cur.lastrowid
+                if visit_id is not None:
+                    conn.execute("UPDATE visits SET invoice_id = ? WHERE visit_id = ?", (inv.invoice_id, visit_id))
+                for key in zip(SCOPES, (str(pid), inv.doctor, stamp[:10])):
+                    t = sums.setdefault(key, [0, 0])
+                    t[0] += 1
+                    t[1] += total
+                issued.append(inv)
+            conn.executemany("INSERT INTO billing_totals VALUES (?, ?, ?, ?) ON CONFLICT (scope, key) DO UPDATE "
+                             "SET invoices = invoices + excluded.invoices, cents = cents + excluded.cents",
+                             [(scope, key, n, cents) for (scope, key), (n, cents) in sums.items()])
+        return issued
+
+    def total(self, scope: str, key) -> Tuple[int, Decimal]:
+        row = self.db.conn.execute("SELECT invoices, cents FROM billing_totals WHERE scope = ? AND key = ?",
+                                   (scope, str(key))).fetchone()
+        count, cents = row or (0, 0)
+        return count, from_cents(cents)
+
+    def top(self, scope: str, limit: int = 20) -> List[Tuple[str, int, Decimal]]:
+        rows = self.db.conn.execute("SELECT key, invoices, cents FROM billing_totals WHERE scope = ? "
+                                    "ORDER BY cents DESC LIMIT ?", (scope, limit))
+        return [(key, count, from_cents(cents)) for key, count, cents in rows]
+
+    def for_patient(self, patient_id: int) -> List[Invoice]:
+        rows = self.db.conn.execute(f"SELECT {INVOICE_COLUMNS} FROM invoices WHERE patient_id = ? "
+                                    f"ORDER BY invoice_id", (patient_id,))
+        return [Invoice(*r) for r in rows]
+
+    def recent(self, limit: int = 50) -> List[Invoice]:
+        rows = self.db.conn.execute(f"SELECT {INVOICE_COLUMNS} FROM invoices ORDER BY invoice_id DESC LIMIT ?",
+                                    (limit,))
+        return [Invoice(*r) for r in rows]
+
+
+class SQLiteGenerations(Generations):
+    """Generations kept in the shared database. Triggers on the patients and
+    appointments tables bump the counters in the transaction that makes the
+    change, so every worker hands out the same tag for the same state."""
+
+    def __init__(self, db: SQLiteDB):
+        super().__init__()
+        self.db = db
+        self.epoch = db.conn.execute("SELECT value FROM meta WHERE key = 'epoch'").fetchone()[0]
+
+    def bump(self, *buckets: str):
+        self._changed(buckets)  # already counted by the triggers; only tell this process's cache
+
+    def get(self, buckets) -> Tuple[int, ...]:
+        buckets = tuple(buckets)
+        rows = dict(self.db.conn.execute(f"SELECT bucket, value FROM generations WHERE bucket IN "
+                                         f"({', '.join('?' * len(buckets))})", buckets))
+        return tuple(rows.get(b, 0) for b in buckets)
@@ -0,0 +1,16 @@
+# tests/conftest.py
+# The app imports its modules relative to dsapro/, and keeps its files under
+# ./data, so every test runs from its own temporary directory.
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(autouse=True)
+def in_tmp_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("data", exist_ok=True)
+    return tmp_path
@@ -0,0 +1,146 @@
+# tests/test_api.py
+# The /api/v1 blueprint on its own Flask app over fresh structures.
+import threading
+
+import pytest
+from flask import Flask
+
+import api
+import bulk
+from concurrency import RWLock
+from patient import Patient
+from data_structures.generations import Generations, ResponseCache, doctor_bucket
+from data_structures.linked_list import LinkedList
+from data_structures.queue import AppointmentQueue, TRIAGE_LEVELS
+from data_structures.stack import UndoStack
+from data_structures.tree import PatientTree
+
+
+class Service:
+    def __init__(self, patients=6, cache_size=16):
+        self.ll, self.tree, self.q = LinkedList(), PatientTree(), AppointmentQueue()
+        self.generations, self.cache = Generations(), ResponseCache(cache_size)
+        self.generations.attach(self.ll, self.q)
+        self.cache.attach(self.generations)
+        self.undo = UndoStack()
+        for i in range(1, patients + 1):
+            self.add(Patient(i, f"P{i}", 30, "Flu", "Dr A" if i % 2 else "Dr B"))
+        app = Flask(__name__)
+        app.register_blueprint(api.create_api(self.ll, self.tree, self.q, RWLock(), threading.Lock(),
+                                              self.generations, self.cache))
+        self.client = app.test_client()
+
+    def add(self, p):
+        self.ll.insert_end(p)
+        self.tree.insert(p.doctor, p)
+
+    def get(self, path, etag=None):
+        return self.client.get(api.API_PREFIX + path, headers={"If-None-Match": etag} if etag else {})
+
+
+@pytest.fixture
+def svc():
+    return Service()
+
+
+def test_unchanged_data_gets_304_and_a_cached_body(svc):
+    first = svc.get("/patients")
+    assert first.status_code == 200 and first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "no-cache"
+    again = svc.get("/patients", first.headers["ETag"])
+    assert again.status_code == 304 and again.data == b"" and again.headers["ETag"] == first.headers["ETag"]
+    assert svc.get("/patients").data == first.data
+    assert (svc.cache.hits, svc.cache.misses) == (1, 1)
+
+
+def test_an_edit_changes_the_tag_of_what_it_touches_only(svc):
+    roster, a, b = (svc.get(p) for p in ("/patients", "/doctors/Dr A/patients", "/doctors/Dr B/patients"))
+    svc.ll.update_by_id(1, name="Renamed")
+    assert svc.get("/patients", roster.headers["ETag"]).status_code == 200
+    fresh = svc.get("/doctors/Dr A/patients", a.headers["ETag"])
+    assert fresh.status_code == 200 and "Renamed" in fresh.get_data(as_text=True)
+    assert svc.get("/doctors/Dr B/patients", b.headers["ETag"]).status_code == 304
+
+
+def test_moving_a_patient_changes_both_doctors(svc):
+    a, b = svc.get("/doctors/Dr A/patients"), svc.get("/doctors/Dr B/patients")
+    p = svc.ll.find_by_id(1)
+    svc.ll.update_by_id(1, doctor="Dr B")
+    svc.tree.move("Dr A", "Dr B", p)
+    assert svc.get("/doctors/Dr A/patients").get_json()["total"] == 2
+    assert svc.get("/doctors/Dr B/patients").get_json()["total"] == 4
+    assert svc.get("/doctors/Dr A/patients", a.headers["ETag"]).status_code == 200
+    assert svc.get("/doctors/Dr B/patients", b.headers["ETag"]).status_code == 200
+
+
+def test_undo_and_bulk_import_invalidate(svc):
+    before = svc.get("/patients?limit=500")
+    p = svc.ll.delete_by_id(3)
+    svc.tree.remove(p.doctor, 3)
+    svc.undo.push(("delete", p))
+    deleted = svc.get("/patients?limit=500")
+    assert deleted.headers["ETag"] != before.headers["ETag"] and deleted.get_json()["total"] == 5
+    svc.undo.undo(svc.ll, svc.tree, svc.q)
+    restored = svc.get("/patients?limit=500", deleted.headers["ETag"])
+    assert restored.status_code == 200 and restored.get_json() == before.get_json()
+
+    a = svc.get("/doctors/Dr A/patients")
+    rows = [{"name": "New", "age": "20", "disease": "Flu", "doctor": "Dr A"}]
+    bulk.import_patients(rows, svc.ll, svc.tree, svc.undo)
+    assert svc.get("/doctors/Dr A/patients", a.headers["ETag"]).get_json()["total"] == 4
+    svc.undo.undo(svc.ll, svc.tree, svc.q)
+    assert svc.get("/doctors/Dr A/patients").get_json()["total"] == 3
+
+
+def test_appointments_tagged_per_doctor_queue(svc):
+    all_q, a, b = (svc.get(p) for p in ("/appointments", "/appointments?doctor=Dr A", "/appointments?doctor=Dr B"))
+    handle = svc.q.enqueue(1, TRIAGE_LEVELS["urgent"], "Dr A")
+    body = svc.get("/appointments?doctor=Dr A", a.headers["ETag"]).get_json()
+    assert body["appointments"] == [{"handle": handle, "patient_id": 1, "doctor": "Dr A",
+                                     "triage": "urgent", "position": 1}]
+    assert svc.get("/appointments", all_q.headers["ETag"]).status_code == 200
+    assert svc.get("/appointments?doctor=Dr B", b.headers["ETag"]).status_code == 304
+
+
+@pytest.mark.parametrize("limit, size", [("0", 1), ("-3", 1), ("2", 2), ("999999", api.MAX_PAGE_SIZE), ("x", api.PAGE_SIZE)])
+def test_page_size_is_clamped(limit, size):
+    svc = Service(patients=api.MAX_PAGE_SIZE + 1)
+    assert len(svc.get(f"/patients?limit={limit}").get_json()["patients"]) == size
+
+
+def test_cursor_pages_cover_the_roster(svc):
+    seen, after = [], None
+    while True:
+        body = svc.get("/patients?limit=4" + (f"&after={after}" if after else "")).get_json()
+        seen += [p["patient_id"] for p in body["patients"]]
+        after = body["next"]
+        if after is None:
+            break
+    assert seen == [1, 2, 3, 4, 5, 6]
+    svc.ll.delete_by_id(4)  # a client still holding after=4 goes on at 5
+    assert [p["patient_id"] for p in svc.get("/patients?after=4&limit=4").get_json()["patients"]] == [5, 6]
+
+
+def test_single_patient_and_status(svc):
+    assert svc.get("/patients/2").get_json()["name"] == "P2"
+    assert svc.get("/patients/99").status_code == 404
+    assert svc.get("/doctors").get_json() == {"doctors": ["Dr A", "Dr B"]}
+    status = svc.get("/").get_json()
+    assert (status["version"], status["patients"], status["appointments"]) == (1, 6, 0)
+
+
+def test_tags_from_another_process_never_match():
+    assert Generations().etag(["patients"]) != Generations().etag(["patients"])
+
+
+def test_cache_is_lru_and_dropped_with_its_bucket():
+    cache = ResponseCache(2)
+    cache.put(("a",), "t1", (doctor_bucket("A"),), b"a")
+    cache.put(("b",), "t1", ("patients",), b"b")
+    assert cache.get(("a",), "t1") == b"a"
+    cache.put(("c",), "t1", ("patients",), b"c")  # evicts b, the least recently used
+    assert cache.get(("b",), "t1") is None and len(cache) == 2
+    assert cache.get(("a",), "t2") is None  # built under another tag
+    cache.invalidate("patients")
+    assert len(cache) == 1 and cache.get(("a",), "t1") == b"a"
+    assert cache.keys_of == {doctor_bucket("A"): {("a",)}}
@@ -0,0 +1,210 @@
+# tests/test_app.py
+# Requests through the Flask app in memory mode. The app keeps its structures
+# in module globals and its files under ./data, so it is imported once, in its
+# own directory, and every test runs from there.
+import importlib
+import os
+import random
+import threading
+from datetime import datetime
+
+import pytest
+
+# mixed operations in the concurrency test; PMS_STRESS_OPS=100000 for the full run
+STRESS_OPS = int(os.environ.get("PMS_STRESS_OPS", 900))
+THREADS = 6
+DOCTORS = max(4, STRESS_OPS // 500)  # keeps each doctor's list short at any scale
+
+
+@pytest.fixture(scope="module")
+def app_dir(tmp_path_factory):
+    return tmp_path_factory.mktemp("app")
+
+
+@pytest.fixture
+def web(app_dir, monkeypatch):
+    monkeypatch.chdir(app_dir)
+    monkeypatch.delenv("PMS_STORAGE", raising=False)
+    monkeypatch.delenv("PMS_MODE", raising=False)
+    return importlib.import_module("app")  # the first import loads from app_dir/data
+
+
+@pytest.fixture
+def client(web):
+    return web.app.test_client()
+
+
+def register(client, web, name, doctor="Dr Next", age="40"):
+    client.post("/register", data=dict(name=name, age=age, disease="Flu", doctor=doctor))
+    return web.patients_ll.get_max_id()
+
+
+def enqueue(web, pid, triage="routine", doctor="Dr Next"):
+    with web.queue_lock:
+        return web.appointments_q.enqueue(pid, web.TRIAGE_LEVELS[triage], doctor)
+
+
+def assert_consistent(web):
+    # the doctor tree and every index hold exactly the patients of the list
+    patients = list(web.patients_ll)
+    ids = sorted(p.patient_id for p in patients)
+    assert sorted(p.patient_id for _, ps in web.patient_tree.inorder() for p in ps) == ids
+    assert sorted(web.range_index.values) == ids
+    assert sorted({pid for words in web.search_index.postings["name"].values() for pid in words}) == ids
+    if web.roster_columns is not None:
+        assert sorted(web.roster_columns.row_of) == ids
+
+
+def test_serve_bills_the_appointment_shown_not_the_new_front(client, web):
+    first = register(client, web, "First")
+    urgent = register(client, web, "Urgent")
+    handle = enqueue(web, first)
+    page = client.post("/next?doctor=Dr Next", data=dict(base="20", tests="5", meds=""))
+    assert f'name="handle" value="{handle}"'.encode() in page.data
+
+    enqueue(web, urgent, "emergency")  # jumps ahead before the serve button is pressed
+    resp = client.post("/next/serve", data=dict(handle=handle, doctor="Dr Next", base="20", tests="5", meds="0"))
+    assert resp.status_code == 302
+    assert web.appointments_q.peek("Dr Next") == urgent
+    inv = web.ledger.for_patient(first)[-1]
+    assert inv.handle == handle and str(inv.amount()) == "25.00"
+    assert web.ledger.for_patient(urgent) == []
+
+
+def test_serve_is_post_only_and_not_replayed(client, web):
+    pid = register(client, web, "Once")
+    handle = enqueue(web, pid)
+    assert client.get(f"/next/serve?handle={handle}&base=1").status_code == 405
+    form = dict(handle=handle, base="1", tests="0", meds="0")
+    client.post("/next/serve", data=form)
+    client.post("/next/serve", data=form)  # a resubmitted form serves nothing more
+    assert len(web.ledger.for_patient(pid)) == 1
+
+
+@pytest.mark.parametrize("fee", ["-5", "1e30", "NaN", "1000000.01"])
+def test_serve_rejects_bad_fees_without_dequeuing(client, web, fee):
+    pid = register(client, web, "Bad Fee")
+    handle = enqueue(web, pid)
+    assert client.post("/next?doctor=Dr Next", data=dict(base=fee)).status_code == 200
+    assert client.post("/next/serve", data=dict(handle=handle, base=fee)).status_code == 302
+    assert handle in {a.handle for a in web.appointments_q.appointments("Dr Next")}
+    assert web.ledger.for_patient(pid) == []
+
+
+@pytest.mark.parametrize("age", ["3000000000", "151"])
+def test_register_rejects_out_of_range_age(client, web, age):
+    before = len(web.patients_ll)
+    resp = client.post("/register", data=dict(name="Too Old", age=age, disease="Flu", doctor="Dr Old"),
+                       follow_redirects=True)
+    assert b"Age must be at most 150." in resp.data
+    assert len(web.patients_ll) == before
+    assert web.patient_tree.search("Dr Old") == []
+    assert_consistent(web)
+
+
+def test_filter_by_time_with_utc_offset(client, web):
+    register(client, web, "Offset")
+    resp = client.get("/patients?from=2024-01-01T00:00:00%2B05:00")
+    assert resp.status_code == 200
+    assert b"Offset" in resp.data
+
+
+def test_import_time_with_utc_offset(client, web):
+    body = "name,age,disease,doctor,registered_at\nZoned,30,Flu,Dr Zone,2024-01-01T05:00:00+05:00\n"
+    resp = client.post("/import/patients?format=csv", data=body, content_type="text/csv")
+    assert resp.get_json()["imported"] == 1
+    (p,) = web.patient_tree.search("Dr Zone")
+    assert p.registered.tzinfo is None
+    assert list(web.range_index.ids("registered_at", datetime(2023, 12, 31), datetime(2024, 1, 2))) == [p.patient_id]
+    assert_consistent(web)
+
+
+@pytest.mark.parametrize("age", ["-1", "abc", "0", "3000000000"])
+def test_update_validates_like_register(client, web, age):
+    pid = register(client, web, "Valid", age="40")
+    resp = client.post(f"/update/{pid}", data=dict(name="", age=age, disease="", doctor=""))
+    assert resp.status_code == 302
+    assert web.patients_ll.find_by_id(pid).age == 40
+
+
+def test_page_after_a_deleted_patient(client, web):
+    _, gone, _ = (register(client, web, name) for name in ("Before", "Gone", "After"))
+    client.post(f"/delete/{gone}")
+    resp = client.get(f"/patients?after={gone}&limit=1")
+    assert b"After" in resp.data and b"Before" not in resp.data
+
+
+@pytest.mark.parametrize("path", ["/schedule", "/calendar?doctor=Dr%20Next"])
+def test_patient_pickers_do_not_read_the_whole_roster(client, web, monkeypatch, path):
+    who = "Findable" + path[1:4]  # the app is shared by both runs
+    for name in (who, "Other", "Another"):
+        register(client, web, name)
+    monkeypatch.setattr(web.patients_ll, "to_list", None)
+    monkeypatch.setattr(web, "PAGE_SIZE", 2)
+
+    def picks(url):
+        page = client.get(url).data.decode()
+        return page[page.index('<datalist'):page.index('</datalist>')]
+    found = picks(f"{path}{'&' if '?' in path else '?'}patient={who}")
+    assert found.count("<option") == 1 and who in found
+    assert picks(path).count("<option") == 2
+
+
+def test_update_keeps_blank_fields(client, web):
+    pid = register(client, web, "Keep", age="40")
+    client.post(f"/update/{pid}", data=dict(name="", age="41", disease="", doctor=""))
+    p = web.patients_ll.find_by_id(pid)
+    assert (p.name, p.age, p.doctor) == ("Keep", 41, "Dr Next")
+
+
+def test_concurrent_requests_keep_structures_consistent(web):
+    # readers and writers on several threads at once, through every path that
+    # takes store_lock and queue_lock; afterwards the list, doctor tree and
+    # queue must still agree and no request may have failed
+    errors = []
+
+    def worker(seed):
+        rnd = random.Random(seed)
+        c = web.app.test_client()
+        try:
+            for i in range(STRESS_OPS // THREADS):
+                r = rnd.random()
+                pid = rnd.randint(1, max(web.patients_ll.last_id, 1))
+                if r < .3:
+                    resp = c.post("/register", data=dict(name=f"S{seed}-{i}", age="30", disease="Flu",
+                                                         doctor=f"Dr S{rnd.randrange(DOCTORS)}"))
+                elif r < .45:
+                    resp = c.post(f"/update/{pid}", data=dict(doctor=f"Dr S{rnd.randrange(DOCTORS)}"))
+                elif r < .55:
+                    resp = c.post(f"/delete/{pid}")
+                elif r < .65:
+                    resp = c.post("/schedule", data=dict(patient_id=str(pid)))
+                elif r < .72:
+                    with web.queue_lock:
+                        appt = web.appointments_q.front()
+                    resp = c.post("/next/serve", data=dict(handle=appt.handle if appt else "", base="10"))
+                elif r < .8:
+                    resp = c.get("/patients?limit=20")
+                elif r < .88:
+                    resp = c.post("/search", data=dict(doctor=f"Dr S{rnd.randrange(DOCTORS)}", mode="prefix"))
+                elif r < .95:
+                    resp = c.get(f"/api/v1/doctors/Dr%20S{rnd.randrange(DOCTORS)}/patients")
+                else:
+                    resp = c.get("/undo")
+                assert resp.status_code < 500, (resp.status_code, resp.request.path)
+        except BaseException as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(THREADS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=120 + STRESS_OPS / 50)
+    assert not any(t.is_alive() for t in threads), "deadlock"
+    assert not errors, errors
+
+    ids = [p.patient_id for p in web.patients_ll]
+    assert len(ids) == len(set(ids)) == len(web.patients_ll)
+    in_tree = {p.patient_id: d for d, ps in web.patient_tree.inorder() for p in ps}
+    assert in_tree == {p.patient_id: p.doctor for p in web.patients_ll}
+    assert len(web.appointments_q) == len(web.appointments_q.appointments())
@@ -0,0 +1,23 @@
+# tests/test_billing.py
+from decimal import Decimal
+
+import pytest
+
+from billing import to_cents, from_cents, calculate_bill, MAX_AMOUNT
+
+
+@pytest.mark.parametrize("value, cents", [("12.5", 1250), (12.5, 1250), (Decimal("0.005"), 1), ("", 0),
+                                          (None, 0), ("1e-30", 0), (str(MAX_AMOUNT), 100000000)])
+def test_to_cents(value, cents):
+    assert to_cents(value) == cents
+
+
+@pytest.mark.parametrize("value", ["1e30", "1e999999", "NaN", "Infinity", "-1", "abc", "1000000.01"])
+def test_to_cents_rejects_with_value_error(value):
+    with pytest.raises(ValueError):
+        to_cents(value)
+
+
+def test_calculate_bill_is_exact():
+    assert calculate_bill("0.1", "0.2") == 0.3
+    assert from_cents(to_cents("0.1") + to_cents("0.2")) == Decimal("0.30")
@@ -0,0 +1,102 @@
+# tests/test_bulk.py
+import io
+import json
+
+import pytest
+
+import bulk
+from patient import parse_time
+from data_structures.linked_list import LinkedList
+from data_structures.stack import UndoStack
+from data_structures.tree import PatientTree
+from sqlite_store import SQLiteDB, SQLitePatientStore, SQLitePatientTree
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def roster(request):
+    if request.param == "memory":
+        return LinkedList(), PatientTree()
+    db = SQLiteDB("data/patients.db")
+    return SQLitePatientStore(db), SQLitePatientTree(db)
+
+
+def rows(n, start=0):
+    return [{"name": f"P{i}", "age": str(i % 90 + 1), "disease": "flu", "doctor": f"Dr {i % 3}"}
+            for i in range(start, start + n)]
+
+
+def fields(patients):
+    return [(p.name, p.age, p.disease, p.doctor, p.registered_at) for p in patients]
+
+
+@pytest.mark.parametrize("fmt", bulk.FORMATS)
+def test_export_then_import_round_trip(roster, fmt):
+    ll, tree = roster
+    source = rows(7) + [{"name": "Timed", "age": 5, "disease": "cold", "doctor": "Dr 0",
+                         "registered_at": "2024-03-01 08:30:00"}]
+    assert bulk.import_patients(source, ll, tree, chunk=3).imported == 8
+    text = "".join(bulk.export_patients(ll, fmt, chunk=3))
+
+    copy, copy_tree = LinkedList(), PatientTree()
+    result = bulk.import_patients(bulk.read_rows(io.StringIO(text, newline=""), fmt), copy, copy_tree)
+    assert (result.imported, result.rejected) == (8, 0)
+    assert fields(copy) == fields(ll)
+    assert [p.patient_id for p in copy] == list(range(1, 9))
+    assert len(copy_tree.search("Dr 0")) == 4
+
+
+def test_empty_export_is_just_the_header():
+    assert "".join(bulk.export_patients([], "csv")).strip() == ",".join(bulk.FIELDS)
+    assert "".join(bulk.export_patients([], "ndjson")) == ""
+
+
+def test_bad_rows_are_rejected_before_anything_is_applied(roster):
+    ll, tree = roster
+    source = [
+        {"name": "Good", "age": "30", "disease": "flu", "doctor": "Dr A"},
+        {"name": "Old", "age": "151", "disease": "flu", "doctor": "Dr A"},
+        {"name": "Time", "age": "30", "disease": "flu", "doctor": "Dr A", "registered_at": "yesterday"},
+        {"name": "Far", "age": "30", "disease": "flu", "doctor": "Dr A", "registered_at": "0001-01-01T00:00:00+05:00"},
+        {"name": "Number", "age": "30", "disease": "flu", "doctor": "Dr A", "registered_at": 1700000000},
+        ["not", "a", "record"],
+        {"name": "Zoned", "age": "30", "disease": "flu", "doctor": "Dr A", "registered_at": "2024-01-01T05:00:00+05:00"},
+    ]
+    result = bulk.import_patients(source, ll, tree)
+    assert (result.imported, result.rejected) == (2, 5)
+    assert [n for n, _ in result.errors] == [2, 3, 4, 5, 6]
+    assert "at most 150" in result.errors[0][1] and "out of range" in result.errors[2][1]
+    good, zoned = ll
+    assert zoned.registered == parse_time("2024-01-01T05:00:00+05:00")
+    assert [p.patient_id for p in tree.search("Dr A")] == [good.patient_id, zoned.patient_id]
+
+
+def test_a_failing_listener_leaves_no_half_applied_chunk(roster):
+    ll, tree = roster
+    seen = []
+
+    def flaky(event, patient, old=None):
+        if event == "insert":
+            seen.append(patient.patient_id)
+            if len(seen) == 5:
+                raise OSError("disk full")
+    ll.listeners.append(flaky)
+    undo = UndoStack()
+    with pytest.raises(OSError):
+        bulk.import_patients(rows(9), ll, tree, undo, chunk=3)
+    # the first chunk went in and can be undone; the second is gone entirely
+    assert [p.name for p in ll] == ["P0", "P1", "P2"]
+    assert sorted(p.patient_id for _, ps in tree.inorder() for p in ps) == [1, 2, 3]
+    assert list(undo.stack) == [("group", "bulk import of patients", [("add", 1), ("add", 2), ("add", 3)])]
+
+
+def test_appointment_rows_need_a_known_patient_and_triage(roster):
+    from data_structures.queue import AppointmentQueue
+    ll, tree = roster
+    bulk.import_patients(rows(2), ll, tree)
+    q = AppointmentQueue()
+    source = [{"patient_id": "1", "triage": "urgent"}, {"patient_id": "2"}, {"patient_id": "9"},
+              {"patient_id": "1", "triage": "bogus"}, {"patient_id": "x"}]
+    result = bulk.import_appointments(source, ll, q)
+    assert (result.imported, result.rejected) == (2, 3)
+    lines = "".join(bulk.export_appointments(q.appointments(), "ndjson")).splitlines()
+    assert [json.loads(line)["patient_id"] for line in lines] == [1, 2]
@@ -0,0 +1,158 @@
+# tests/test_columnar.py
+import hashlib
+import struct
+from array import array
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import columnar
+import main
+from columnar import ColumnarSnapshot, write_columnar
+from patient import Patient, UNKNOWN_TIME
+from snapshot import ChecksumError, SnapshotReader, write_snapshot
+
+PATH = "data/patients.bin"
+
+
+def edge_patients():
+    aware = Patient(4, "Zoned", 40, "Flu", "Dr A")
+    aware.registered = datetime(2024, 1, 1, 5, tzinfo=timezone(timedelta(hours=5)))  # set past the setter
+    return [
+        Patient(1, "Ünïcode 名前", 30, "Flu", "Dr A", "2024-01-01 10:00:00"),
+        Patient(2, "Legacy", 50, "Cold", "Dr B", "07/11/2025"),
+        Patient(3, "Old", 90, "Cold", "Dr B", "1955-03-04 01:02:03"),
+        aware,
+        Patient(5, "Huge Age", 3 * 10 ** 9, "Flu", "Dr A", "0001-01-01 00:00:00"),
+        Patient(9, "", 1, "", "", "2024-02-29 23:59:59"),
+    ]
+
+
+def expected(p):
+    d = p.to_dict()
+    if p.registered.tzinfo is not None:
+        d["registered_at"] = p.registered.astimezone().replace(tzinfo=None).isoformat(" ", "seconds")
+    return d
+
+
+def test_round_trip_edge_values():
+    patients = edge_patients()
+    write_columnar(PATH, patients, gen=7)
+    snap = ColumnarSnapshot(PATH, verify=True)
+    try:
+        assert snap.gen == 7 and len(snap) == len(patients)
+        got = list(snap)
+        assert [p.to_dict() for p in got] == [expected(p) for p in patients]
+        assert [snap.find(p.patient_id).to_dict() for p in patients] == [expected(p) for p in patients]
+        assert snap.row(2).to_dict() == expected(patients[2])
+        assert snap.find(6) is None and snap.find(100) is None
+        legacy, old = got[1], got[2]
+        assert legacy.registered == UNKNOWN_TIME and legacy.registered_at == "07/11/2025"
+        assert old.registered == datetime(1955, 3, 4, 1, 2, 3)
+        assert got[4].registered == datetime(1, 1, 1) and got[4].registered is not UNKNOWN_TIME
+    finally:
+        snap.close()
+
+
+def test_empty_roster():
+    write_columnar(PATH, [])
+    snap = ColumnarSnapshot(PATH, verify=True)
+    assert list(snap) == [] and snap.find(1) is None
+    snap.close()
+
+
+def test_csv_round_trip_keeps_legacy_text(tmp_path):
+    rows = [[p.patient_id, p.name, p.age, p.disease, p.doctor, p.registered_at] for p in edge_patients()[:3]]
+    write_snapshot("data/in.csv", main.PATIENT_FIELDS, rows, gen=0, keep=0)
+    columnar.csv_to_columnar("data/in.csv", PATH)
+    columnar.columnar_to_csv(PATH, "data/out.csv")
+    out = list(SnapshotReader("data/out.csv"))
+    assert out[1:] == [[str(v) for v in row] for row in rows]
+
+
+@pytest.fixture
+def small_blocks(monkeypatch):
+    monkeypatch.setattr(columnar, "BLOCK_ROWS", 4)
+
+
+def roster(n):
+    return [Patient(i, f"P{i}", 30, "Flu", "Dr A", "2024-01-01 10:00:00") for i in range(1, n + 1)]
+
+
+def corrupt_row(path, row):
+    # flip a byte of the ids column in `row`
+    with open(path, "r+b") as f:
+        f.seek(columnar.HEADER.size + 8 * row)
+        byte = f.read(1)
+        f.seek(-1, 1)
+        f.write(bytes([byte[0] ^ 0xff]))
+
+
+def test_blocks_are_checked_as_they_are_read(small_blocks):
+    write_columnar(PATH, roster(10))
+    corrupt_row(PATH, 5)  # second block: rows 4..7
+    snap = ColumnarSnapshot(PATH)
+    try:
+        assert not any(snap._checked)  # opening hashed no rows
+        assert snap.find(2).name == "P2"
+        assert list(snap._checked) == [1, 0, 0]
+        assert snap.row(9).name == "P10"
+        with pytest.raises(ChecksumError):
+            snap.row(4)
+        with pytest.raises(ChecksumError):
+            list(snap)
+    finally:
+        snap.close()
+    with pytest.raises(ChecksumError):
+        ColumnarSnapshot(PATH, verify=True)
+
+
+def test_damaged_block_falls_back_to_older_generation(small_blocks, monkeypatch):
+    monkeypatch.setattr(main, "SNAPSHOT_FORMAT", "binary")
+    write_columnar(main.PATIENTS_BIN, roster(9), gen=1)
+    write_columnar(main.PATIENTS_BIN, roster(10), gen=2)
+    corrupt_row(main.PATIENTS_BIN, 9)
+    ll, tree = main.LinkedList(), main.PatientTree()
+    assert main.load_patients(ll, tree) == 1
+    assert len(ll) == 9 and len(tree.search("Dr A")) == 9
+
+
+def write_v1(path, patients):
+    # the version 1 layout, as written before version 2
+    ids, ages, doctors, diseases, reg = array("q"), array("i"), array("i"), array("i"), array("q")
+    name_off, names, strings = array("Q", [0]), bytearray(), {}
+    for p in patients:
+        ids.append(p.patient_id)
+        ages.append(p.age)
+        doctors.append(strings.setdefault(p.doctor, len(strings)))
+        diseases.append(strings.setdefault(p.disease, len(strings)))
+        reg.append(max((p.registered - datetime(1970, 1, 1)) // timedelta(seconds=1), -1))
+        names += p.name.encode()
+        name_off.append(len(names))
+    order = sorted(range(len(ids)), key=ids.__getitem__)
+    str_off, blob = array("Q", [0]), bytearray()
+    for s in strings:
+        blob += s.encode()
+        str_off.append(len(blob))
+    body = b""
+    for chunk in (ids, ages, doctors, diseases, reg, name_off, array("q", (ids[i] for i in order)),
+                  array("q", order), str_off, names, blob):
+        data = chunk.tobytes() if isinstance(chunk, array) else bytes(chunk)
+        body += data + b"\0" * ((-len(data)) % 8)
+    with open(path, "wb") as f:
+        f.write(struct.pack("<8sIIQQ32s", b"PMSCOL1\0", 1, 3, len(ids), len(strings),
+                            hashlib.sha256(body).digest()) + body)
+
+
+def test_reads_version_1():
+    patients = [Patient(2, "B", 40, "Flu", "Dr B", "2024-01-01 10:00:00"),
+                Patient(1, "A", 30, "Cold", "Dr A", "1955-03-04 01:02:03")]
+    write_v1(PATH, patients)
+    snap = ColumnarSnapshot(PATH)
+    try:
+        assert snap.gen == 3
+        assert snap.find(2).to_dict() == patients[0].to_dict()
+        got = list(snap)
+        assert got[1].registered == UNKNOWN_TIME  # version 1 couldn't store times before 1970
+    finally:
+        snap.close()
@@ -0,0 +1,77 @@
+# tests/test_concurrency.py
+import threading
+import time
+
+from concurrency import RWLock
+
+
+def run(*targets):
+    errors = []
+
+    def guard(fn):
+        try:
+            fn()
+        except BaseException as e:  # surfaced by the assert below
+            errors.append(e)
+    threads = [threading.Thread(target=guard, args=(fn,)) for fn in targets]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=30)
+    assert not any(t.is_alive() for t in threads), "deadlock"
+    assert not errors, errors
+
+
+def test_readers_never_see_a_write_in_progress():
+    lock = RWLock()
+    pair = [0, 0]  # a writer changes both; readers must always find them equal
+    inside = {"readers": 0, "writers": 0, "max_readers": 0}
+    count = threading.Lock()
+
+    def writer():
+        for _ in range(300):
+            with lock.write():
+                with count:
+                    inside["writers"] += 1
+                    assert inside["writers"] == 1 and inside["readers"] == 0
+                pair[0] += 1
+                time.sleep(0)
+                pair[1] += 1
+                with count:
+                    inside["writers"] -= 1
+
+    def reader():
+        for _ in range(1000):
+            with lock.read():
+                with count:
+                    inside["readers"] += 1
+                    inside["max_readers"] = max(inside["max_readers"], inside["readers"])
+                    assert inside["writers"] == 0
+                assert pair[0] == pair[1]
+                time.sleep(0)
+                with count:
+                    inside["readers"] -= 1
+
+    run(writer, writer, reader, reader, reader, reader)
+    assert pair == [600, 600]
+    assert inside["max_readers"] > 1  # reads did overlap
+
+
+def test_writer_not_starved_by_steady_readers():
+    lock = RWLock()
+    stop = threading.Event()
+    wrote = threading.Event()
+
+    def reader():
+        while not stop.is_set():
+            with lock.read():
+                time.sleep(0.001)
+
+    def writer():
+        time.sleep(0.01)  # let the readers get going first
+        with lock.write():
+            wrote.set()
+        stop.set()
+
+    run(reader, reader, reader, writer)
+    assert wrote.is_set()
@@ -0,0 +1,132 @@
+# tests/test_consistency.py
+# The doctor tree, search index and range index are kept in step with the
+# linked list incrementally (tree.move / listeners), never rebuilt. After
+# every kind of change, including undo and redo of it, they must agree with
+# the list exactly.
+import random
+
+import pytest
+
+import main
+from data_structures.search_index import SearchIndex, INDEXED, words
+from data_structures.range_index import RangeIndex, RANGE_FIELDS
+from data_structures.stack import UndoStack, changed_fields
+from patient import Patient
+
+DOCTORS = ["Dr Adams", "Dr Baker", "Dr Chen", "Dr Diaz"]
+
+
+class Roster:
+    # the structures as app.py wires them, changed the way its routes change them
+    def __init__(self):
+        self.ll, self.tree, self.q = main.LinkedList(), main.PatientTree(), main.AppointmentQueue()
+        self.search, self.ranges = SearchIndex(), RangeIndex()
+        self.search.attach(self.ll, self.tree)
+        self.ranges.attach(self.ll)
+        self.undo = UndoStack()
+
+    def register(self, name, age, disease, doctor):
+        p = Patient(self.ll.allocate_id(), name, age, disease, doctor)
+        self.ll.insert_end(p)
+        self.tree.insert(doctor, p)
+        self.undo.push(("add", p.patient_id))
+        return p
+
+    def update(self, pid, **fields):
+        p = self.ll.find_by_id(pid)
+        old = changed_fields(p, **fields)
+        self.ll.update_by_id(pid, **fields)
+        self.tree.move(old.get("doctor", p.doctor), p.doctor, p)
+        if old:
+            self.undo.push(("update", pid, old))
+
+    def delete(self, pid):
+        p = self.ll.delete_by_id(pid)
+        self.tree.remove(p.doctor, pid)
+        self.undo.push(("delete", p))
+
+    def reassign(self, old, new):
+        main.reassign_doctor(self.ll, self.tree, self.undo, old, new)
+
+    def check(self):
+        patients = list(self.ll)
+        ids = [p.patient_id for p in patients]
+        assert len(ids) == len(set(ids)) == len(self.ll)
+        assert all(self.ll.find_by_id(p.patient_id) is p for p in patients)
+
+        # doctor tree: the same Patient objects, by doctor, in ID order
+        assert self.tree.doctors() == sorted({p.doctor for p in patients})
+        for d in self.tree.doctors():
+            mine = sorted((p for p in patients if p.doctor == d), key=lambda p: p.patient_id)
+            found = self.tree.search(d)
+            assert len(found) == len(mine) and all(a is b for a, b in zip(found, mine)), d
+        assert self.tree.depth() <= 2 * len(DOCTORS)
+
+        # search index: every word of every indexed field, and nothing else
+        for f in INDEXED:
+            expected = {}
+            for p in patients:
+                for w in words(getattr(p, f)):
+                    expected.setdefault(w, set()).add(p.patient_id)
+            assert self.search.postings[f] == expected, f
+            assert sorted(self.search.tries[f].with_prefix("")) == sorted(expected), f
+
+        # range index: each field in (value, id) order
+        for f, attr in RANGE_FIELDS.items():
+            assert list(self.ranges.ids(f)) == [p.patient_id for p in
+                                                sorted(patients, key=lambda p: (getattr(p, attr), p.patient_id))]
+            assert self.ranges.count(f) == len(patients)
+
+
+@pytest.fixture
+def roster():
+    r = Roster()
+    for i, doctor in enumerate(DOCTORS * 3):
+        r.register(f"Patient {i}", 20 + i, "Flu" if i % 2 else "Cold", doctor)
+    r.check()
+    return r
+
+
+def test_each_change_and_its_undo(roster):
+    steps = [
+        lambda: roster.register("New Person", 33, "Migraine", "Dr Evans"),
+        lambda: roster.update(2, name="Renamed Person", age=71),
+        lambda: roster.update(3, doctor="Dr Adams"),
+        lambda: roster.update(5, doctor="Dr Evans", disease="Broken Arm"),
+        lambda: roster.update(6, name="Patient 5"),  # no real change to the tree
+        lambda: roster.delete(4),
+        lambda: roster.reassign("Dr Baker", "Dr Chen"),
+    ]
+    for step in steps:
+        step()
+        roster.check()
+    for _ in steps:
+        roster.undo.undo(roster.ll, roster.tree, roster.q)
+        roster.check()
+    for _ in steps:
+        roster.undo.redo(roster.ll, roster.tree, roster.q)
+        roster.check()
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_changes(roster, seed):
+    rnd = random.Random(seed)
+    for _ in range(300):
+        pids = [p.patient_id for p in roster.ll]
+        r = rnd.random()
+        if r < .25 or not pids:
+            roster.register(f"P{rnd.randrange(50)} X{rnd.randrange(5)}", rnd.randrange(100),
+                            rnd.choice(["Flu", "Cold", "Flu Cold"]), rnd.choice(DOCTORS))
+        elif r < .5:
+            roster.update(rnd.choice(pids), doctor=rnd.choice(DOCTORS), age=rnd.randrange(100))
+        elif r < .6:
+            roster.update(rnd.choice(pids), name=f"P{rnd.randrange(50)}", disease=rnd.choice(["Flu", "Asthma"]))
+        elif r < .7:
+            roster.delete(rnd.choice(pids))
+        elif r < .75:
+            roster.reassign(*rnd.sample(DOCTORS, 2))
+        elif r < .9:
+            roster.undo.undo(roster.ll, roster.tree, roster.q)
+        else:
+            roster.undo.redo(roster.ll, roster.tree, roster.q)
+        roster.check()
@@ -0,0 +1,113 @@
+# tests/test_crash.py
+# Fault injection: the process "dies" (an exception nothing catches) at a
+# point inside a snapshot or journal write, and a fresh load must come back
+# with every change that was logged before the crash.
+import os
+
+import pytest
+
+import main
+import snapshot
+from patient import Patient
+
+
+class Killed(Exception):
+    pass
+
+
+def load():
+    ll, tree, q, sched = main.LinkedList(), main.PatientTree(), main.AppointmentQueue(), main.Scheduler()
+    main.load_all(ll, tree, q, sched)
+    return ll, tree, q, sched
+
+
+def register(ll, tree, q, n):
+    for _ in range(n):
+        p = Patient(ll.allocate_id(), "P", 30, "Flu", f"Dr {ll.last_id % 3}")
+        ll.insert_end(p)
+        tree.insert(p.doctor, p)
+        q.enqueue(p.patient_id)
+
+
+def state(ll, q):
+    return [p.to_dict() for p in ll], q.to_list()
+
+
+def reloaded():
+    ll, tree, q, sched = load()
+    for d in tree.doctors():
+        assert [p.patient_id for p in tree.search(d)] == [p.patient_id for p in ll if p.doctor == d]
+    return state(ll, q)
+
+
+def die(ll):
+    # what a killed process leaves: no close, no flush of anything buffered
+    ll.journal.f = None
+
+
+def kill_after(monkeypatch, module, name, calls):
+    # let `calls` calls of module.name through, then kill the process
+    real = getattr(module, name)
+    seen = [0]
+
+    def fn(*args, **kwargs):
+        seen[0] += 1
+        if seen[0] > calls:
+            raise Killed()
+        return real(*args, **kwargs)
+    monkeypatch.setattr(module, name, fn)
+
+
+@pytest.fixture
+def session():
+    ll, tree, q, sched = load()
+    register(ll, tree, q, 20)
+    ll.journal.compact()
+    register(ll, tree, q, 5)
+    ll.delete_by_id(4)
+    ll.update_by_id(7, doctor="Dr 9")
+    q.dequeue()
+    return ll, tree, q
+
+
+@pytest.mark.parametrize("replaces", range(6))
+def test_crash_while_installing_snapshots(monkeypatch, session, replaces):
+    ll, tree, q = session
+    expected = state(ll, q)
+    with monkeypatch.context() as m, pytest.raises(Killed):
+        kill_after(m, os, "replace", replaces)
+        ll.journal.compact()
+    die(ll)
+    assert reloaded() == expected
+
+
+@pytest.mark.parametrize("flushes", range(3))
+def test_crash_while_writing_snapshot(monkeypatch, session, flushes):
+    ll, tree, q = session
+    expected = state(ll, q)
+    with monkeypatch.context() as m, pytest.raises(Killed):
+        kill_after(m, snapshot, "_flush", flushes)
+        ll.journal.compact()
+    die(ll)
+    assert any(name.endswith(".tmp") for name in os.listdir(main.DATA_DIR))  # the half-written file is left behind
+    assert reloaded() == expected
+
+
+def test_torn_journal_record(session):
+    ll, tree, q = session
+    ll.insert_end(Patient(ll.allocate_id(), "P", 30, "Flu", "Dr 1"))
+    ll.journal.sync()
+    die(ll)
+    with open(main.JOURNAL_FILE, "rb+") as f:
+        f.seek(-5, os.SEEK_END)  # the last record, cut off mid-write
+        f.truncate()
+
+    ll, tree, q, sched = load()
+    assert ll.find_by_id(26) is None
+    assert ll.find_by_id(25) is not None
+    # the torn tail must not swallow what is logged after it
+    register(ll, tree, q, 1)
+    expected = state(ll, q)
+    ll.journal.sync()
+    die(ll)
+    assert reloaded() == expected
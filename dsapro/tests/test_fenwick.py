@@ -0,0 +1,30 @@
+# tests/test_fenwick.py
+import random
+
+from data_structures.fenwick import CountTree, SIZE
+
+
+def test_counts_match_a_plain_list():
+    rnd = random.Random(11)
+    tree, items = CountTree(), []
+    for _ in range(2000):
+        if items and rnd.random() < .4:
+            slot = items.pop(rnd.randrange(len(items)))
+            tree.add(slot, -1)
+        else:
+            slot = rnd.choice([rnd.randrange(100), rnd.randrange(SIZE)])
+            items.append(slot)
+            tree.add(slot)
+        probe = rnd.choice(items) if items and rnd.random() < .5 else rnd.randrange(SIZE)
+        assert tree.count_below(probe) == sum(s < probe for s in items)
+    assert len(tree) == len(items)
+
+
+def test_only_live_slots_are_stored():
+    tree = CountTree()
+    for slot in (5, 9, 5, SIZE - 1):
+        tree.add(slot)
+    assert tree.count_below(6) == 2 and tree.count_below(SIZE) == 4
+    for slot in (5, 9, 5, SIZE - 1):
+        tree.add(slot, -1)
+    assert tree.tree == {} and len(tree) == 0
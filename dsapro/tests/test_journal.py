@@ -0,0 +1,51 @@
+# tests/test_journal.py
+import main
+from patient import Patient
+
+
+def load():
+    ll, tree, q, sched = main.LinkedList(), main.PatientTree(), main.AppointmentQueue(), main.Scheduler()
+    main.load_all(ll, tree, q, sched)
+    return ll, tree, q, sched
+
+
+def register(ll, tree, n):
+    for _ in range(n):
+        p = Patient(ll.allocate_id(), "P", 30, "Flu", "Dr A")
+        ll.insert_end(p)
+        tree.insert(p.doctor, p)
+
+
+def test_deleted_id_not_reused_after_compaction():
+    ll, tree, q, sched = load()
+    register(ll, tree, 3)
+    ll.delete_by_id(3)
+    ll.journal.compact()
+
+    ll, tree, q, sched = load()
+    assert [p.patient_id for p in ll] == [1, 2]
+    assert ll.allocate_id() == 4
+
+
+def test_deleted_id_not_reused_from_journal_tail():
+    ll, tree, q, sched = load()
+    register(ll, tree, 3)
+    ll.delete_by_id(3)
+    ll.journal.sync()
+
+    ll, tree, q, sched = load()
+    assert ll.allocate_id() == 4
+
+
+def test_undone_delete_keeps_its_place_after_restart():
+    ll, tree, q, sched = load()
+    register(ll, tree, 4)
+    undo = main.UndoStack()
+    p = ll.delete_by_id(2)
+    tree.remove(p.doctor, 2)
+    undo.push(("delete", p))
+    undo.undo(ll, tree, q)
+    ll.journal.sync()
+
+    ll, tree, q, sched = load()
+    assert [p.patient_id for p in ll] == [1, 2, 3, 4]
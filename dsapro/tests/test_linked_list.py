@@ -0,0 +1,93 @@
+# tests/test_linked_list.py
+import pytest
+
+from patient import Patient
+from data_structures.linked_list import LinkedList
+from sqlite_store import SQLiteDB, SQLitePatientStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request):
+    store = LinkedList() if request.param == "memory" else SQLitePatientStore(SQLiteDB("data/patients.db"))
+    for i in range(1, 11):
+        store.insert_end(Patient(i, f"P{i}", 30, "Flu", "Dr A"))
+    return store
+
+
+def ids(patients):
+    return [p.patient_id for p in patients]
+
+
+def record(store):
+    events = []
+    store.listeners.append(lambda event, p, old=None: events.append((event, p.patient_id, p.name, old)))
+    return events
+
+
+def test_find_update_delete(store):
+    events = record(store)
+    assert store.find_by_id(4).name == "P4" and store.find_by_id(99) is None
+    assert store.update_by_id(4, name="Four", age=30)
+    assert store.find_by_id(4).name == "Four"
+    assert not store.update_by_id(99, name="x")
+    assert store.delete_by_id(4).name == "Four"
+    assert store.delete_by_id(4) is None
+    assert len(store) == 9 and 4 not in ids(store)
+    assert events == [("update", 4, "Four", {"name": "P4"}), ("delete", 4, "Four", None)]
+
+
+def test_insert_with_an_existing_id_replaces_and_reports_the_old_one(store):
+    events = record(store)
+    store.insert_end(Patient(3, "Again", 40, "Cold", "Dr B"))
+    assert events == [("delete", 3, "P3", None), ("insert", 3, "Again", None)]
+    assert ids(store) == [1, 2, 4, 5, 6, 7, 8, 9, 10, 3]
+    assert len(store) == 10 and store.find_by_id(3).name == "Again"
+
+
+def test_ids_are_never_reused(store):
+    store.delete_by_id(10)
+    assert store.get_max_id() == 10
+    assert store.allocate_id() == 11
+    assert store.allocate_ids(5) == 12
+    assert store.allocate_id() == 17
+
+
+def test_page_and_sorted_page(store):
+    assert ids(store.page(None, 4)) == [1, 2, 3, 4]
+    assert ids(store.page(4, 4)) == [5, 6, 7, 8]
+    assert ids(store.page(8, 4)) == [9, 10]
+    store.update_by_id(2, name="A first")
+    assert ids(store.sorted_page("name", limit=3)) == [2, 1, 10]
+    assert ids(store.sorted_page("patient_id", descending=True, offset=2, limit=3)) == [8, 7, 6]
+
+
+def test_restore_puts_a_patient_back_in_id_order(store):
+    for pid in (1, 5, 10):
+        p = store.delete_by_id(pid)
+        store.restore(p)
+    assert ids(store) == list(range(1, 11))
+
+
+def test_walk_sees_every_patient_once(store):
+    assert ids(store.walk(4)) == list(range(1, 11))
+    assert ids(store.walk(10)) == list(range(1, 11))
+    empty = LinkedList()
+    assert list(empty.walk(3)) == []
+
+
+@pytest.mark.parametrize("deleted", [[3], [2, 3], [1, 2, 3]])
+def test_walk_goes_on_after_its_cursor_is_deleted(store, deleted):
+    walk = store.walk(3)
+    seen = [next(walk).patient_id for _ in range(3)]  # the first chunk ends on patient 3
+    for pid in deleted:
+        store.delete_by_id(pid)
+    store.insert_end(Patient(11, "P11", 30, "Flu", "Dr A"))
+    assert seen + ids(walk) == list(range(1, 12))
+
+
+def test_page_after_a_deleted_cursor_starts_at_the_next_id(store):
+    store.delete_by_id(4)
+    assert ids(store.page(4, 3)) == [5, 6, 7]
+    store.delete_by_id(10)
+    assert store.page(10, 3) == []
+    assert ids(store.page(None, 3)) == [1, 2, 3]
@@ -0,0 +1,40 @@
+# tests/test_patient.py
+import time
+from datetime import datetime
+
+import pytest
+
+from patient import Patient, parse_time, validate, MAX_AGE
+
+
+@pytest.fixture
+def utc(monkeypatch):
+    monkeypatch.setenv("TZ", "UTC")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_parse_time_makes_offsets_local(utc):
+    assert parse_time("2024-01-01T05:00:00+05:00") == datetime(2024, 1, 1, 0, 0)
+    assert parse_time(datetime.fromisoformat("2024-01-01 00:30:00-01:00")) == datetime(2024, 1, 1, 1, 30)
+    assert parse_time("2024-01-01").tzinfo is None
+
+
+def test_patient_with_offset_time_compares_with_naive_ones(utc):
+    p = Patient(1, "A", 30, "Flu", "Dr A", "2024-01-01T05:00:00+05:00")
+    assert p.registered_at == "2024-01-01 00:00:00"
+    assert p.registered < datetime(2024, 1, 2)
+
+
+@pytest.mark.parametrize("value", ["", "yesterday", "2024-13-01"])
+def test_parse_time_rejects_non_times(value):
+    with pytest.raises(ValueError):
+        parse_time(value)
+
+
+def test_validate_bounds_age():
+    assert validate(" A ", str(MAX_AGE), "Flu", "Dr A") == ("A", MAX_AGE, "Flu", "Dr A")
+    with pytest.raises(ValueError):
+        validate("A", str(MAX_AGE + 1), "Flu", "Dr A")
@@ -0,0 +1,160 @@
+# tests/test_queue.py
+# The triage scheduler, in memory and on SQLite, plus its IndexedHeap.
+import random
+
+import pytest
+
+from data_structures.heap import IndexedHeap
+from data_structures.linked_list import LinkedList
+from data_structures.queue import AppointmentQueue, TRIAGE_LEVELS, AGING_STEP
+from data_structures.stack import UndoStack
+from data_structures.tree import PatientTree
+from sqlite_store import SQLiteDB, SQLiteAppointmentQueue
+
+ROUTINE, URGENT, EMERGENCY = (TRIAGE_LEVELS[k] for k in ("routine", "urgent", "emergency"))
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def queue(request):
+    return AppointmentQueue() if request.param == "memory" else SQLiteAppointmentQueue(SQLiteDB("data/patients.db"))
+
+
+def drain(q, doctor=None):
+    out = []
+    while not q.is_empty() if doctor is None else q.peek(doctor) is not None:
+        out.append(q.dequeue(doctor))
+    return out
+
+
+def test_equal_priorities_are_fifo(queue):
+    for pid in range(1, 8):
+        queue.enqueue(pid)
+    assert queue.to_list() == list(range(1, 8))
+    assert drain(queue) == list(range(1, 8))
+    assert queue.dequeue() is None and queue.peek() is None
+
+
+def test_higher_triage_goes_first(queue):
+    queue.enqueue(1, ROUTINE)
+    queue.enqueue(2, URGENT)
+    queue.enqueue(3, EMERGENCY)
+    queue.enqueue(4, URGENT)
+    assert drain(queue) == [3, 2, 4, 1]
+
+
+def test_routine_patients_age_past_later_urgent_ones(queue):
+    queue.enqueue(1, ROUTINE)
+    for pid in range(2, AGING_STEP + 1):
+        queue.enqueue(pid, ROUTINE)
+    queue.enqueue(100, URGENT)  # arrives AGING_STEP after patient 1: it no longer jumps ahead of 1
+    order = drain(queue)
+    assert order[0] == 1 and order[1] == 100
+
+
+def test_out_of_range_priorities_are_clamped(queue):
+    queue.enqueue(1, 99)
+    queue.enqueue(2, -5)
+    assert [a.priority for a in queue.appointments()] == [EMERGENCY, ROUTINE]
+
+
+def test_each_doctor_has_a_sub_queue(queue):
+    queue.enqueue(1, ROUTINE, "Dr A")
+    queue.enqueue(2, EMERGENCY, "Dr B")
+    queue.enqueue(3, URGENT, "Dr A")
+    queue.enqueue(4, ROUTINE)
+    assert [a.patient_id for a in queue.appointments("Dr A")] == [3, 1]
+    assert queue.peek("Dr B") == 2 and queue.peek("Dr C") is None
+    assert queue.dequeue("Dr A") == 3
+    assert queue.to_list() == [2, 1, 4]
+    assert queue.dequeue("Dr B") == 2 and queue.appointments("Dr B") == []
+
+
+def test_cancel_and_reschedule(queue):
+    handles = [queue.enqueue(pid, ROUTINE, "Dr A") for pid in (1, 2, 3)]
+    seen = []
+    queue.listeners.append(lambda event, a: seen.append((event, a.handle)))
+    assert queue.cancel(handles[1]).patient_id == 2
+    assert queue.cancel(handles[1]) is None
+    assert queue.reschedule(handles[2], EMERGENCY)
+    assert not queue.reschedule(999, URGENT)
+    assert queue.to_list() == [3, 1]
+    assert queue.dequeue("Dr A") == 3
+    assert seen == [("cancel", handles[1]), ("reschedule", handles[2]), ("dequeue", handles[2])]
+
+
+def test_serve_takes_the_named_appointment(queue):
+    first = queue.enqueue(1, ROUTINE, "Dr A")
+    second = queue.enqueue(2, ROUTINE, "Dr A")
+    assert queue.serve(second) == 2 and queue.serve(second) is None
+    assert queue.front("Dr A").handle == first
+
+
+def test_handles_survive_a_reload(queue):
+    queue.enqueue(1, URGENT, "Dr A")
+    h = queue.enqueue(2, ROUTINE, "Dr B")
+    saved = [(a.patient_id, a.priority, a.doctor, a.handle) for a in queue.appointments()]
+    queue.load_from_list(saved)
+    assert [(a.patient_id, a.priority, a.doctor, a.handle) for a in queue.appointments()] == saved
+    assert queue.enqueue(3) == h + 1
+    queue.load_from_list([5, 6])  # plain FIFO list of patient IDs from old files
+    assert queue.to_list() == [5, 6]
+
+
+class Item:
+    def __init__(self, handle, key):
+        self.handle, self.key = handle, key
+
+
+def test_indexed_heap_matches_a_sorted_reference():
+    rnd = random.Random(7)
+    heap, live, handle = IndexedHeap(), {}, 0
+    for _ in range(3000):
+        r = rnd.random()
+        if r < .5 or not live:
+            handle += 1
+            live[handle] = Item(handle, rnd.randrange(100))
+            heap.push(live[handle])
+        elif r < .7:
+            assert heap.remove(live.pop(rnd.choice(list(live))))
+        elif r < .85:
+            item = live[rnd.choice(list(live))]
+            item.key = rnd.randrange(100)
+            heap.update(item)
+        else:
+            top = heap.pop()
+            assert top is min(live.values(), key=lambda a: (a.key, a.handle))
+            del live[top.handle]
+        assert len(heap) == len(live)
+    assert heap.ordered() == sorted(live.values(), key=lambda a: (a.key, a.handle))
+    assert not heap.remove(Item(-1, 0)) and Item(-1, 0) not in heap
+
+
+def test_position_follows_the_service_order(queue):
+    rnd = random.Random(3)
+    handles = [queue.enqueue(pid, rnd.choice([ROUTINE, URGENT, EMERGENCY]), rnd.choice(["Dr A", "Dr B"]))
+               for pid in range(1, 60)]
+    for h in rnd.sample(handles, 15):
+        queue.cancel(h)
+    for h in rnd.sample(handles, 15):
+        queue.reschedule(h, rnd.choice([ROUTINE, EMERGENCY]))
+    order = [a.handle for a in queue.appointments()]
+    assert [queue.position(h) for h in order] == list(range(1, len(order) + 1))
+    for doctor in ("Dr A", "Dr B"):
+        mine = [a.handle for a in queue.appointments(doctor)]
+        assert [queue.position(h, per_doctor=True) for h in mine] == list(range(1, len(mine) + 1))
+    assert queue.position(10 ** 6) is None
+
+
+def test_undo_cancels_the_booked_appointment_and_restores_a_cancelled_one(queue):
+    undo, ll, tree = UndoStack(), LinkedList(), PatientTree()
+    first = queue.enqueue(7, ROUTINE, "Dr A")
+    second = queue.enqueue(7, ROUTINE, "Dr A")
+    queue.enqueue(8, ROUTINE, "Dr A")
+    undo.push(("appointment_add", 7, first))
+    undo.undo(ll, tree, queue)  # the first booking goes, not the patient's latest one
+    assert [a.handle for a in queue.appointments()] == [second, second + 1]
+    undo.redo(ll, tree, queue)
+    assert [a.handle for a in queue.appointments()] == [first, second, second + 1]
+    assert queue.position(first) == 1
+    assert queue.remove_last(7).handle == second
+    assert queue.remove_last(99) is None
@@ -0,0 +1,45 @@
+# tests/test_reports.py
+from datetime import date
+
+import pytest
+
+import reports
+from data_structures.linked_list import LinkedList
+from patient import Patient
+
+pytestmark = pytest.mark.skipif(not reports.available(), reason="reports need NumPy")
+
+
+def roster(*ages):
+    ll = LinkedList()
+    for i, age in enumerate(ages, 1):
+        ll.insert_end(Patient(i, f"P{i}", age, "Flu", "Dr A", "2024-03-01 09:00:00"))
+    cols = reports.RosterColumns()
+    cols.attach(ll)
+    return ll, cols
+
+
+def test_report_counts():
+    ll, cols = roster(5, 15, 17)
+    r = cols.report(days=1, end=date(2024, 3, 1))
+    assert r["patients"] == 3
+    assert r["by_age"] == [("0-9", 1), ("10-19", 2)]
+    assert r["by_doctor"] == [("Dr A", 3)]
+    assert r["per_day"] == [(date(2024, 3, 1), 3)]
+
+
+def test_out_of_range_ages_are_unknown():
+    ll, cols = roster(30, -1, 10 ** 9, 3 * 10 ** 9)  # the last one doesn't fit the int32 column
+    ll.update_by_id(1, age=-3 * 10 ** 9)
+    ll.insert_end(Patient(5, "P5", 30, "Flu", "Dr A", "2024-03-01 09:00:00"))
+    r = cols.report()
+    assert r["patients"] == 5
+    assert r["by_age"] == [("30-39", 1), ("unknown", 4)]
+    assert r["mean_age"] == 30.0
+
+
+def test_report_follows_updates_and_deletes():
+    ll, cols = roster(30, 40)
+    ll.update_by_id(1, age=-5)
+    ll.delete_by_id(2)
+    assert cols.report()["by_age"] == [("unknown", 1)]
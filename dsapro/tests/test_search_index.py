@@ -0,0 +1,130 @@
+# tests/test_search_index.py
+import random
+
+import pytest
+
+from patient import Patient
+from data_structures import search_index
+from data_structures.linked_list import LinkedList
+from data_structures.queue import AppointmentQueue
+from data_structures.search_index import SearchIndex, Trie, edit_distance, words
+from data_structures.stack import UndoStack
+from data_structures.tree import PatientTree
+
+PEOPLE = [
+    ("John Smith", 40, "Flu", "Dr A"),
+    ("Johanna Smythe", 25, "Broken arm", "Dr B"),
+    ("Mary Jones", 61, "Flu", "Dr A"),
+    ("Al Brown", 33, "Asthma", "Dr B"),
+    ("Alan Flute", 70, "Arm pain", "Dr A"),
+]
+
+
+@pytest.fixture
+def idx():
+    ll, tree, index = LinkedList(), PatientTree(), SearchIndex()
+    index.attach(ll, tree)
+    for pid, fields in enumerate(PEOPLE, 1):
+        p = Patient(pid, *fields)
+        ll.insert_end(p)
+        tree.insert(p.doctor, p)
+    return index
+
+
+def found(index, **query):
+    res, total = index.search(**query)
+    assert total == len(res)
+    return [p.patient_id for p in res]
+
+
+def test_words_match_by_prefix_in_either_field(idx):
+    assert found(idx, text="joh") == [1, 2]
+    assert found(idx, text="flu") == [1, 3, 5]  # the disease Flu and the name Flute
+    assert found(idx, disease="flu") == [1, 3]
+    assert found(idx, name="flu") == [5]
+    assert found(idx, text="nobody") == []
+
+
+def test_words_and_filters_combine_with_and(idx):
+    assert found(idx, text="arm", doctor="Dr A") == [5]
+    assert found(idx, text="smith flu") == [1]
+    assert found(idx, disease="flu", age_min=50) == [3]
+    assert found(idx, doctor="Dr B", age_max=30) == [2]
+    assert found(idx, age_min=60, age_max=65) == [3]
+
+
+def test_fuzzy_allows_edits_except_for_short_words(idx):
+    assert found(idx, name="jahn") == []
+    assert found(idx, name="jahn", fuzzy=2) == [1]
+    assert found(idx, name="smyth", fuzzy=2) == [1, 2]  # Smith one edit away, Smythe by prefix
+    assert found(idx, name="smiht", fuzzy=2) == []  # two edits is too many for five letters
+    assert found(idx, name="jhoanna", fuzzy=2) == [2]  # seven letters may take two
+    assert found(idx, name="ak", fuzzy=2) == []  # under three letters: exact only
+
+
+def test_limit_and_capped_total(idx, monkeypatch):
+    monkeypatch.setattr(search_index, "COUNT_CAP", 2)
+    res, total = idx.search(text="a", limit=1)
+    assert [p.patient_id for p in res] == [2] and total == 3  # more than COUNT_CAP
+    res, total = idx.search(doctor="Dr A", limit=1)
+    assert [p.patient_id for p in res] == [1] and total == 3
+
+
+def test_index_follows_updates_deletes_and_undo(idx):
+    ll, tree, undo = idx.linked_list, idx.tree, UndoStack()
+    ll.update_by_id(1, name="Jack Smith")
+    assert found(idx, name="john") == [] and found(idx, name="jack") == [1]
+    p = ll.delete_by_id(3)
+    tree.remove(p.doctor, 3)
+    undo.push(("delete", p))
+    assert found(idx, name="mary") == [] and "mary" not in idx.postings["name"]
+    assert idx.tries["name"].with_prefix("mar") == []
+    undo.undo(ll, tree, AppointmentQueue())
+    assert found(idx, name="mary") == [3]
+
+
+def test_search_agrees_with_a_plain_scan():
+    rnd = random.Random(5)
+    syllables = ["an", "ber", "co", "da", "el", "fi", "go", "ha"]
+    ll, tree, index = LinkedList(), PatientTree(), SearchIndex()
+    index.attach(ll, tree)
+    for pid in range(1, 400):
+        name = " ".join("".join(rnd.choices(syllables, k=rnd.randint(1, 3))) for _ in range(2))
+        p = Patient(pid, name, rnd.randint(1, 90), rnd.choice(["flu", "cold", "fever"]), f"Dr {rnd.randrange(5)}")
+        ll.insert_end(p)
+        tree.insert(p.doctor, p)
+    for pid in rnd.sample(range(1, 400), 50):
+        p = ll.delete_by_id(pid)
+        tree.remove(p.doctor, pid)
+    for _ in range(200):
+        q = rnd.choice(syllables) + rnd.choice(["", rnd.choice(syllables)])
+        doctor = rnd.choice(["", f"Dr {rnd.randrange(5)}"])
+        age_min = rnd.choice([None, 30])
+        expected = [p.patient_id for p in ll
+                    if any(w.startswith(q) for w in words(p.name))
+                    and (not doctor or p.doctor == doctor) and (age_min is None or p.age >= age_min)]
+        res, total = index.search(name=q, doctor=doctor, age_min=age_min, limit=1000)
+        assert [p.patient_id for p in res] == sorted(expected) and total == len(expected)
+
+
+def test_trie_within_matches_edit_distance():
+    rnd = random.Random(9)
+    vocab = {"".join(rnd.choices("abcd", k=rnd.randint(1, 6))) for _ in range(300)}
+    trie = Trie()
+    for w in vocab:
+        trie.add(w)
+    for _ in range(50):
+        q = "".join(rnd.choices("abcd", k=rnd.randint(1, 6)))
+        for k in (0, 1, 2):
+            assert sorted(trie.within(q, k)) == sorted(w for w in vocab if edit_distance(w, q, k) <= k)
+    for w in vocab:
+        trie.remove(w)
+    assert trie.root == {}
+
+
+@pytest.mark.parametrize("a, b, d", [("", "", 0), ("flu", "flu", 0), ("kitten", "sitting", 3),
+                                     ("smith", "smiht", 2), ("abc", "", 3)])
+def test_edit_distance(a, b, d):
+    assert edit_distance(a, b, 5) == d
+    if d:
+        assert edit_distance(a, b, d - 1) == d  # cut off at limit + 1
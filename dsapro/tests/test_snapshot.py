@@ -0,0 +1,67 @@
+# tests/test_snapshot.py
+import pytest
+
+import columnar
+import main
+from patient import Patient, UNKNOWN_TIME
+from snapshot import write_snapshot, NoIntactSnapshot
+
+ROW = ["2024-01-01 10:00:00"]
+
+
+def roster(*ids):
+    ll, tree = main.LinkedList(), main.PatientTree()
+    for i in ids:
+        p = Patient(i, f"P{i}", 30, "Flu", "Dr A")
+        ll.insert_end(p)
+        tree.insert(p.doctor, p)
+    return ll, tree
+
+
+def test_bad_row_falls_back_to_older_generation():
+    write_snapshot(main.PATIENTS_FILE, main.PATIENT_FIELDS, [[1, "A", 30, "Flu", "Dr A"] + ROW], gen=1)
+    write_snapshot(main.PATIENTS_FILE, main.PATIENT_FIELDS,
+                   [[1, "A", 30, "Flu", "Dr A"] + ROW, [2, "B", "abc", "Flu", "Dr A"] + ROW], gen=2)
+    ll, tree = roster(7)
+    assert main.load_patients(ll, tree) == 1
+    assert [p.patient_id for p in ll] == [1]
+    assert [p.patient_id for p in tree.search("Dr A")] == [1]
+
+
+def test_no_intact_generation_fails_and_keeps_state():
+    write_snapshot(main.PATIENTS_FILE, main.PATIENT_FIELDS,
+                   [[1, "A", 30, "Flu", "Dr A"] + ROW, [2, "B", "abc", "Flu", "Dr A"] + ROW], gen=1)
+    ll, tree = roster(7, 8)
+    with pytest.raises(NoIntactSnapshot):
+        main.load_patients(ll, tree)
+    assert [p.patient_id for p in ll] == [7, 8]
+    assert len(tree.search("Dr A")) == 2
+
+
+def test_missing_snapshot_loads_nothing():
+    ll, tree = roster()
+    assert main.load_patients(ll, tree) is None
+    assert len(ll) == 0
+
+
+def test_legacy_registered_at_text_loads():
+    write_snapshot(main.PATIENTS_FILE, main.PATIENT_FIELDS,
+                   [[1, "A", 30, "Flu", "Dr A"] + ROW, [2, "B", 40, "Flu", "Dr A", "07/11/2025"]], gen=1)
+    ll, tree = roster()
+    assert main.load_patients(ll, tree) == 1
+    legacy = ll.find_by_id(2)
+    assert legacy.registered_at == "07/11/2025"
+    assert legacy.registered == UNKNOWN_TIME
+    assert sorted(ll, key=lambda p: p.registered)[0] is legacy
+
+
+def test_damaged_columnar_generation_falls_back(monkeypatch):
+    monkeypatch.setattr(main, "SNAPSHOT_FORMAT", "binary")
+    columnar.write_columnar(main.PATIENTS_BIN, roster(1)[0], gen=1)
+    columnar.write_columnar(main.PATIENTS_BIN, roster(1, 2)[0], gen=2)
+    with open(main.PATIENTS_BIN, "r+b") as f:
+        f.seek(columnar.HEADER.size)  # the first patient's ID
+        f.write(b"\xff")
+    ll, tree = roster(7)
+    assert main.load_patients(ll, tree) == 1
+    assert [p.patient_id for p in ll] == [1]
@@ -0,0 +1,45 @@
+# tests/test_sqlite_store.py
+import threading
+
+from patient import Patient
+from sqlite_store import SQLiteDB, SQLitePatientStore
+
+
+def in_new_thread(fn):
+    result, errors = [], []
+
+    def run():
+        try:
+            result.append(fn())
+        except Exception as e:  # re-raised in the test thread
+            errors.append(e)
+    t = threading.Thread(target=run)
+    t.start()
+    t.join()
+    if errors:
+        raise errors[0]
+    return result[0]
+
+
+def make_store(cache=False):
+    store = SQLitePatientStore(SQLiteDB("data/patients.db", cache=cache))
+    for i in (1, 2, 3):
+        store.insert_end(Patient(i, f"P{i}", 30 + i, "Flu", "Dr A"))
+    return store
+
+
+def test_delete_from_new_thread():
+    # the first call on a fresh thread must not need an open connection already
+    store = make_store()
+    assert in_new_thread(lambda: store.delete_by_id(2)) is not None
+    assert store.find_by_id(2) is None
+    assert [p.patient_id for p in store] == [1, 3]
+
+
+def test_writes_from_new_threads_with_cache():
+    store = make_store(cache=True)
+    assert in_new_thread(lambda: store.update_by_id(1, age=50))
+    assert in_new_thread(lambda: store.insert_end(Patient(4, "P4", 40, "Flu", "Dr B"))) is None
+    assert in_new_thread(lambda: store.delete_by_id(3)) is not None
+    assert store.find_by_id(1).age == 50
+    assert [p.patient_id for p in store] == [1, 2, 4]
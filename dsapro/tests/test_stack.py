@@ -0,0 +1,86 @@
+# tests/test_stack.py
+import pytest
+
+from patient import Patient
+from data_structures import stack
+from data_structures.linked_list import LinkedList
+from data_structures.queue import AppointmentQueue
+from data_structures.stack import UndoStack
+from data_structures.tree import PatientTree
+from sqlite_store import SQLiteDB, SQLitePatientStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def roster(request):
+    store = LinkedList() if request.param == "memory" else SQLitePatientStore(SQLiteDB("data/patients.db"))
+    tree = PatientTree()
+    for i in range(1, 6):
+        p = Patient(i, f"P{i}", 30, "Flu", "Dr A")
+        store.insert_end(p)
+        tree.insert(p.doctor, p)
+    return store, tree
+
+
+def ids(store):
+    return [p.patient_id for p in store]
+
+
+def delete(store, tree, undo, pid):
+    p = store.delete_by_id(pid)
+    tree.remove(p.doctor, pid)
+    undo.push(("delete", p))
+
+
+@pytest.mark.parametrize("pid", [1, 3, 5])
+def test_undo_delete_puts_the_patient_back_in_place(roster, pid):
+    store, tree = roster
+    undo = UndoStack()
+    delete(store, tree, undo, pid)
+    undo.undo(store, tree, AppointmentQueue())
+    assert ids(store) == [1, 2, 3, 4, 5]
+    undo.redo(store, tree, AppointmentQueue())
+    undo.undo(store, tree, AppointmentQueue())
+    assert ids(store) == [1, 2, 3, 4, 5]
+    assert [p.patient_id for p in store.page(2, 2)] == [3, 4]
+
+
+def test_undo_of_several_deletes_restores_the_order(roster):
+    store, tree = roster
+    undo = UndoStack()
+    with undo.group("clean up"):
+        for pid in (2, 3, 4):
+            delete(store, tree, undo, pid)
+    assert ids(store) == [1, 5]
+    undo.undo(store, tree, AppointmentQueue())
+    assert ids(store) == [1, 2, 3, 4, 5]
+    assert sorted(p.patient_id for p in tree.search("Dr A")) == [1, 2, 3, 4, 5]
+
+
+def test_oversized_group_is_dropped_with_the_history_before_it(monkeypatch):
+    monkeypatch.setattr(stack, "MAX_GROUP_ACTIONS", 3)
+    undo = UndoStack()
+    undo.push(("add", 1))
+    with undo.group("small"):
+        undo.push(("add", 2))
+        undo.push(("add", 3))
+    assert len(undo.stack) == 2
+    with undo.group("big"):
+        for pid in range(4, 10):
+            undo.push(("add", pid))
+        assert undo.open_groups == [None]
+    assert undo.is_empty() and not undo.can_redo()
+    undo.push(("add", 10))  # recording goes on afterwards
+    assert list(undo.stack) == [("add", 10)]
+
+
+def test_nested_groups_count_against_the_outer_limit(monkeypatch):
+    monkeypatch.setattr(stack, "MAX_GROUP_ACTIONS", 3)
+    undo = UndoStack()
+    with undo.group("outer"):
+        undo.push(("add", 1))
+        with undo.group("inner"):
+            undo.push(("add", 2))
+            undo.push(("add", 3))
+        with undo.group("inner"):
+            undo.push(("add", 4))
+    assert undo.is_empty()
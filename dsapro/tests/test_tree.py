@@ -0,0 +1,98 @@
+# tests/test_tree.py
+import math
+import random
+
+from patient import Patient
+from data_structures.tree import PatientTree
+
+
+def patient(pid, doctor):
+    return Patient(pid, f"P{pid}", 30, "Flu", doctor)
+
+
+def ids(patients):
+    return [p.patient_id for p in patients]
+
+
+def check_avl(node):
+    # height of a subtree whose keys are ordered and whose balance is within one
+    if node is None:
+        return 0
+    left, right = check_avl(node.left), check_avl(node.right)
+    assert node.left is None or node.left.doctor < node.doctor
+    assert node.right is None or node.right.doctor > node.doctor
+    assert abs(left - right) <= 1 and node.height == 1 + max(left, right)
+    assert node.patients, "empty doctor node left in the tree"
+    return node.height
+
+
+def test_bucket_keeps_registration_order_after_an_old_patient_returns():
+    tree = PatientTree()
+    for pid in (1, 2, 3, 4):
+        tree.insert("Dr A", patient(pid, "Dr A"))
+    assert tree.remove("Dr A", 2) and not tree.remove("Dr A", 2)
+    assert not tree.contains("Dr A", 2) and tree.contains("Dr A", 3)
+    tree.insert("Dr A", patient(2, "Dr A"))  # undo of the delete
+    assert ids(tree.search("Dr A")) == [1, 2, 3, 4]
+    assert ids(tree.inorder()[0][1]) == [1, 2, 3, 4]
+
+
+def test_removing_the_last_patient_prunes_the_doctor():
+    tree = PatientTree()
+    for pid, doctor in enumerate(["Dr B", "Dr A", "Dr C", "Dr A"], 1):
+        tree.insert(doctor, patient(pid, doctor))
+    tree.remove("Dr B", 1)
+    assert tree.doctors() == ["Dr A", "Dr C"] and tree.search("Dr B") == []
+    assert not tree.remove("Dr Nobody", 1)
+    check_avl(tree.root)
+
+
+def test_move_and_refresh():
+    tree = PatientTree()
+    p = patient(1, "Dr A")
+    tree.insert("Dr A", p)
+    tree.move("Dr A", "Dr B", p)
+    assert tree.doctors() == ["Dr B"] and tree.search("Dr B") == [p]
+    newer = patient(1, "Dr B")
+    assert tree.refresh("Dr B", newer) and tree.search("Dr B")[0] is newer
+    assert not tree.refresh("Dr A", newer)
+    tree.move("Dr C", "Dr C", patient(2, "Dr C"))  # not there yet: inserted
+    assert tree.doctors() == ["Dr B", "Dr C"]
+
+
+def test_range_and_prefix_search():
+    tree = PatientTree()
+    for pid, doctor in enumerate(["Adams", "Baker", "Bakshi", "Fatima", "Gray"], 1):
+        tree.insert(doctor, patient(pid, doctor))
+    assert [d for d, _ in tree.prefix_search("Bak")] == ["Baker", "Bakshi"]
+    assert [d for d, _ in tree.range_search("A", "F")] == ["Adams", "Baker", "Bakshi", "Fatima"]
+    assert tree.range_search("H", "Z") == []
+
+
+def test_sorted_arrivals_stay_balanced():
+    tree = PatientTree()
+    n = 1000
+    for i in range(n):
+        tree.insert(f"Dr {i:04d}", patient(i, f"Dr {i:04d}"))
+    assert check_avl(tree.root) <= 1.45 * math.log2(n + 2)
+
+
+def test_random_inserts_and_removes_match_a_dict():
+    rnd = random.Random(4)
+    tree, reference, pid = PatientTree(), {}, 0
+    for _ in range(3000):
+        if reference and rnd.random() < .45:
+            doctor = rnd.choice(list(reference))
+            victim = rnd.choice(list(reference[doctor]))
+            assert tree.remove(doctor, victim)
+            del reference[doctor][victim]
+            if not reference[doctor]:
+                del reference[doctor]
+        else:
+            pid += 1
+            doctor = f"Dr {rnd.randrange(40)}"
+            tree.insert(doctor, patient(pid, doctor))
+            reference.setdefault(doctor, {})[pid] = True
+    check_avl(tree.root)
+    assert tree.doctors() == sorted(reference)
+    assert [(d, ids(ps)) for d, ps in tree.inorder()] == [(d, sorted(reference[d])) for d in sorted(reference)]